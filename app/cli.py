@@ -0,0 +1,162 @@
+"""Operational commands: ``python -m app.cli <command>``."""
+import argparse
+import logging
+import os
+
+# Commands are one-off processes that never serve /metrics. A
+# PROMETHEUS_MULTIPROC_DIR meant for gunicorn (e.g. set pod-wide) would make
+# them write metric files into a directory that may not exist.
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+
+def _migrate(args):
+    from .migrations import migrate
+
+    migrate()
+    print("Schema is up to date")
+
+
+def _reconcile(args):
+    import asyncio
+    from .workers.reconciler import Reconciler
+
+    asyncio.run(Reconciler(batch_size=args.batch_size, rate=args.rate).run_pass())
+    print("Reconciliation pass finished")
+
+
+def _reindex_comments(args):
+    from .database import SessionLocal
+    from .search import backend
+
+    db = SessionLocal()
+    try:
+        indexed = backend.reindex(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Reindexed {indexed} comments into the {backend.name} search index")
+
+
+def _purge_user(args):
+    from .database import SessionLocal
+    from .workers import purge
+
+    db = SessionLocal()
+    try:
+        job = purge.create_job(db, args.user_id)
+    finally:
+        db.close()
+    print(f"Purge job {job.job_id} for user {args.user_id}")
+    counts = purge.run_job(
+        job.job_id,
+        chunk_size=args.chunk_size,
+        on_progress=lambda counts: print("  " + ", ".join(f"{t}={n}" for t, n in counts.items()), flush=True),
+    )
+    print(f"Purge finished: {counts}")
+
+
+def _resume_purges(args):
+    from .workers import purge
+
+    resumed = purge.resume_stale_jobs(lease_seconds=args.lease_seconds)
+    print(f"Resumed {len(resumed)} purge jobs" + (f": {', '.join(resumed)}" if resumed else ""))
+
+
+def _outbox_relay(args):
+    import asyncio
+    from .workers.outbox import Relay
+
+    relay = Relay(batch_size=args.batch_size)
+    if args.once:
+        print(f"Delivered {relay.drain()} outbox events to the {relay.sink.name} sink")
+    else:
+        asyncio.run(relay.run_forever())
+
+
+def _outbox_compact(args):
+    from .workers.outbox import compact
+
+    print(f"Removed {compact(retention_seconds=args.older_than)} published outbox events")
+
+
+def _backfill_rollups(args):
+    from .crud.rollups import backfill
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        written = backfill(
+            db, chunk_size=args.chunk_size,
+            on_progress=lambda last, rows: print(f"  up to recipe {last}: {rows} rollup rows", flush=True),
+        )
+    finally:
+        db.close()
+    print(f"Rebuilt {written} engagement rollup rows")
+
+
+def _build_recommendations(args):
+    import time
+    from .recommendations import build_from_database
+
+    started = time.perf_counter()
+    model = build_from_database(top_n=args.top_n)
+    model.save(args.output)
+    print(
+        f"Wrote neighbours of {len(model.recipe_ids)} recipes from {model.interactions} interactions "
+        f"to {args.output} in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Social service operations")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="create missing tables, columns and indexes")
+    migrate.set_defaults(func=_migrate)
+
+    reconcile = commands.add_parser("reconcile", help="run one orphan-sweeper pass over all social tables")
+    reconcile.add_argument("--batch-size", type=int, default=200)
+    reconcile.add_argument("--rate", type=float, default=20.0, help="upstream checks per second")
+    reconcile.set_defaults(func=_reconcile)
+
+    reindex = commands.add_parser("reindex-comments", help="rebuild the comment full-text search index")
+    reindex.add_argument("--batch-size", type=int, default=1000)
+    reindex.set_defaults(func=_reindex_comments)
+
+    purge_user = commands.add_parser("purge-user", help="delete all social rows of a deleted user in chunks")
+    purge_user.add_argument("user_id", type=int)
+    purge_user.add_argument("--chunk-size", type=int, default=None, help="rows per transaction (default CASCADE_CHUNK_SIZE)")
+    purge_user.set_defaults(func=_purge_user)
+
+    resume_purges = commands.add_parser("resume-purges", help="finish purge jobs abandoned by a restarted worker")
+    resume_purges.add_argument(
+        "--lease-seconds", type=float, default=300, help="idle time after which a pending/running job counts as abandoned"
+    )
+    resume_purges.set_defaults(func=_resume_purges)
+
+    outbox_relay = commands.add_parser("outbox-relay", help="deliver outbox events to OUTBOX_SINK")
+    outbox_relay.add_argument("--batch-size", type=int, default=200)
+    outbox_relay.add_argument("--once", action="store_true", help="drain the outbox and exit instead of polling")
+    outbox_relay.set_defaults(func=_outbox_relay)
+
+    outbox_compact = commands.add_parser("outbox-compact", help="delete published outbox events past retention")
+    outbox_compact.add_argument("--older-than", type=float, default=7 * 24 * 3600, help="seconds since publication")
+    outbox_compact.set_defaults(func=_outbox_compact)
+
+    rollups = commands.add_parser("backfill-rollups", help="recompute hourly engagement rollups from likes, comments and saves")
+    rollups.add_argument("--chunk-size", type=int, default=1000, help="recipes per transaction")
+    rollups.set_defaults(func=_backfill_rollups)
+
+    recommendations = commands.add_parser(
+        "build-recommendations", help="build the similar-recipes model into a file served with RECOMMEND_MODEL_PATH"
+    )
+    recommendations.add_argument("--output", required=True, help="path of the .npz file workers load")
+    recommendations.add_argument("--top-n", type=int, default=50, help="neighbours kept per recipe")
+    recommendations.set_defaults(func=_build_recommendations)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+from datetime import datetime, timezone
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import and_, delete, exists, func, or_, select, tuple_, update
+from sqlalchemy.orm import Session, aliased
+from .. import models
+from ..recommendations import recommender
+from ..search import backend as search_backend
+from ..utils import membership
+from .outbox import add_event, RECIPE_PURGED, USER_PURGED
+from .rollups import lock_recipes, record as record_rollup, COMMENTS, LIKES, SAVES
+from .versions import bump_version, RECIPE_COMMENTS, RECIPE_LIKES, USER_FOLLOWERS, USER_FOLLOWING
+
+# Rows removed per DELETE statement / transaction. Each chunk commits on its
+# own, so row locks are held for one chunk rather than the whole cascade.
+CASCADE_CHUNK_SIZE = int(os.getenv("CASCADE_CHUNK_SIZE", "1000"))
+
+
+def delete_in_chunks(
+    db: Session,
+    model,
+    key_columns: Sequence,
+    condition,
+    returning: Sequence = (),
+    on_chunk: Optional[Callable[[list], None]] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Delete rows matching ``condition`` with ``DELETE ... WHERE key IN (SELECT key ... LIMIT n)``.
+
+    ``on_chunk`` receives the RETURNING rows of each chunk and runs inside the
+    chunk's transaction, so derived data (watermarks) commits with the delete.
+    ``on_progress`` gets the row count of each chunk after it has committed.
+    """
+    chunk_size = chunk_size or CASCADE_CHUNK_SIZE
+    key = key_columns[0] if len(key_columns) == 1 else tuple_(*key_columns)
+    total = 0
+    while True:
+        keys = select(*key_columns).where(condition).limit(chunk_size)
+        stmt = delete(model).where(key.in_(keys))
+        if returning:
+            stmt = stmt.returning(*returning)
+        result = db.execute(stmt)
+        rows = result.fetchall() if returning else []
+        count = len(rows) if returning else result.rowcount
+        if on_chunk is not None and rows:
+            on_chunk(rows)
+        db.commit()
+        total += count
+        if on_progress is not None and count:
+            on_progress(count)
+        if count < chunk_size:
+            return total
+
+
+def _bump_each(db: Session, scope: str, column: int = 0):
+    def _bump(rows):
+        for resource_id in {row[column] for row in rows}:
+            bump_version(db, scope, resource_id)
+
+    return _bump
+
+
+def _then_unroll(db: Session, metric: str, then: Optional[Callable[[list], None]] = None):
+    """Take the deleted ``(recipe_id, created_at)`` rows out of the rollups, then run ``then``.
+
+    Comment tombstones (rows with a ``deleted_at``) were taken out when they were deleted.
+    """
+    def _unroll(rows):
+        counted = [row for row in rows if getattr(row, "deleted_at", None) is None]
+        record_rollup(db, metric, [(row.recipe_id, row.created_at) for row in counted], delta=-1)
+        if then is not None:
+            then(rows)
+
+    return _unroll
+
+
+def _replied_to_by_others(user_id: int):
+    """Condition on ``Comment``: the comment has a descendant written by someone other than ``user_id``."""
+    Comment = models.Comment
+    reply = aliased(models.Comment)
+    return exists().where(
+        reply.root_id == func.coalesce(Comment.root_id, Comment.comment_id),
+        reply.user_id != user_id,
+        # A root's descendants are its whole thread; otherwise the path range (see crud.comments._subtree).
+        or_(Comment.root_id.is_(None), and_(reply.path > Comment.path + "/", reply.path < Comment.path + "0")),
+    )
+
+
+def tombstone_in_chunks(
+    db: Session,
+    condition,
+    on_chunk: Optional[Callable[[list], None]] = None,
+    chunk_size: Optional[int] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Clear the content and set ``deleted_at`` of live comments matching ``condition``, chunk by chunk.
+
+    Same contract as ``delete_in_chunks``; the RETURNING rows are
+    ``(recipe_id, created_at)`` of the comments that stopped counting.
+    """
+    Comment = models.Comment
+    chunk_size = chunk_size or CASCADE_CHUNK_SIZE
+    total = 0
+    while True:
+        keys = select(Comment.comment_id).where(condition, Comment.deleted_at.is_(None)).limit(chunk_size)
+        rows = db.execute(
+            update(Comment)
+            .where(Comment.comment_id.in_(keys))
+            .values(content="", deleted_at=datetime.now(timezone.utc))
+            .returning(Comment.recipe_id, Comment.created_at)
+            .execution_options(synchronize_session=False)
+        ).fetchall()
+        if on_chunk is not None and rows:
+            on_chunk(rows)
+        db.commit()
+        total += len(rows)
+        if on_progress is not None and rows:
+            on_progress(len(rows))
+        if len(rows) < chunk_size:
+            return total
+
+
+def delete_recipe_rows(db: Session, recipe_id: int) -> dict:
+    """Remove all social rows that point at a recipe that no longer exists."""
+    counts = {
+        "likes": delete_in_chunks(db, models.Like, [models.Like.like_id], models.Like.recipe_id == recipe_id),
+        "comments": delete_in_chunks(db, models.Comment, [models.Comment.comment_id], models.Comment.recipe_id == recipe_id),
+        "saved": delete_in_chunks(db, models.SavedRecipe, [models.SavedRecipe.saved_id], models.SavedRecipe.recipe_id == recipe_id),
+    }
+    # Waits for a backfill that counted the recipe before its rows were gone.
+    lock_recipes(db, [recipe_id])
+    db.execute(delete(models.EngagementRollup).where(models.EngagementRollup.recipe_id == recipe_id))
+    bump_version(db, RECIPE_LIKES, recipe_id)
+    bump_version(db, RECIPE_COMMENTS, recipe_id)
+    # One summary event rather than one per row: cascades can remove millions.
+    add_event(db, RECIPE_PURGED, f"recipe:{recipe_id}", recipe_id=recipe_id, deleted=counts)
+    db.commit()
+    membership.liked.forget_recipe(recipe_id)
+    membership.saved.forget_recipe(recipe_id)
+    recommender.forget_recipe(recipe_id)
+    search_backend.delete_for_recipe(recipe_id)
+    return counts
+
+
+def delete_user_rows(
+    db: Session,
+    user_id: int,
+    chunk_size: Optional[int] = None,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> dict:
+    """Remove all social rows owned by, or pointing at, a user that no longer exists.
+
+    Like ``crud.comments.delete_comment``, comments that other users replied
+    to become tombstones so those replies keep their thread; the rest of the
+    user's comments are deleted. ``progress(table, rows)`` is called after
+    every committed chunk.
+    """
+    def _report(table):
+        return (lambda count: progress(table, count)) if progress else None
+
+    counts = {
+        "likes": delete_in_chunks(
+            db, models.Like, [models.Like.like_id], models.Like.user_id == user_id,
+            returning=[models.Like.recipe_id, models.Like.created_at],
+            on_chunk=_then_unroll(db, LIKES, _bump_each(db, RECIPE_LIKES)),
+            chunk_size=chunk_size, on_progress=_report("likes"),
+        ),
+        "comments": tombstone_in_chunks(
+            db, and_(models.Comment.user_id == user_id, _replied_to_by_others(user_id)),
+            on_chunk=_then_unroll(db, COMMENTS, _bump_each(db, RECIPE_COMMENTS)),
+            chunk_size=chunk_size, on_progress=_report("comments"),
+        ) + delete_in_chunks(
+            db, models.Comment, [models.Comment.comment_id],
+            and_(models.Comment.user_id == user_id, ~_replied_to_by_others(user_id)),
+            returning=[models.Comment.recipe_id, models.Comment.created_at, models.Comment.deleted_at],
+            on_chunk=_then_unroll(db, COMMENTS, _bump_each(db, RECIPE_COMMENTS)),
+            chunk_size=chunk_size, on_progress=_report("comments"),
+        ),
+        "saved": delete_in_chunks(
+            db, models.SavedRecipe, [models.SavedRecipe.saved_id], models.SavedRecipe.user_id == user_id,
+            returning=[models.SavedRecipe.recipe_id, models.SavedRecipe.created_at],
+            on_chunk=_then_unroll(db, SAVES), chunk_size=chunk_size, on_progress=_report("saved"),
+        ),
+    }
+
+    def _bump_follow_edges(rows):
+        for follower_id, following_id in rows:
+            if follower_id != user_id:
+                bump_version(db, USER_FOLLOWING, follower_id)
+            if following_id != user_id:
+                bump_version(db, USER_FOLLOWERS, following_id)
+
+    counts["follows"] = delete_in_chunks(
+        db, models.Follow, [models.Follow.follower_id, models.Follow.following_id],
+        or_(models.Follow.follower_id == user_id, models.Follow.following_id == user_id),
+        returning=[models.Follow.follower_id, models.Follow.following_id], on_chunk=_bump_follow_edges,
+        chunk_size=chunk_size, on_progress=_report("follows"),
+    )
+    bump_version(db, USER_FOLLOWERS, user_id)
+    bump_version(db, USER_FOLLOWING, user_id)
+    add_event(db, USER_PURGED, f"user:{user_id}", user_id=user_id, deleted=counts)
+    db.commit()
+    membership.liked.forget_user(user_id)
+    membership.saved.forget_user(user_id)
+    search_backend.delete_for_user(user_id)
+    return counts
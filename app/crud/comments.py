@@ -1,18 +1,62 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, delete, func, or_, select
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from typing import Optional
+from .outbox import add_event, COMMENT_CREATED, COMMENT_DELETED
+from .rollups import record as record_rollup, COMMENTS
+from .versions import bump_version, RECIPE_COMMENTS
+from ..search import backend as search_backend
+
+
+# Path segments are zero-padded so string order matches id order; 21 segments
+# of 11 characters fit the 255-character ``path`` column.
+PATH_SEGMENT_WIDTH = 10
+MAX_COMMENT_DEPTH = 20
+
+
+def _segment(comment_id: int) -> str:
+    return str(comment_id).zfill(PATH_SEGMENT_WIDTH)
+
 
+def comment_path(comment) -> str:
+    # Comments created before threading have no path; they are all top-level.
+    return comment.path or _segment(comment.comment_id)
 
-def create_comment(db: Session, comment: schemas.CommentCreate, user_id: int, recipe_id: int) -> dict:
+
+def _subtree(comment):
+    """Condition matching every descendant of ``comment`` (not the comment itself)."""
+    prefix = comment_path(comment)
+    # '/' sorts right before '0', so [prefix + '/', prefix + '0') is exactly the
+    # set of paths that start with prefix + '/'.
+    return and_(
+        models.Comment.root_id == (comment.root_id or comment.comment_id),
+        models.Comment.path > prefix + "/",
+        models.Comment.path < prefix + "0",
+    )
+
+
+def create_comment(db: Session, comment: schemas.CommentCreate, user_id: int, recipe_id: int, parent=None) -> dict:
     db_comment = models.Comment(
         content=comment.content,
         user_id=user_id,
-        recipe_id=recipe_id
+        recipe_id=recipe_id,
+        parent_id=parent.comment_id if parent else None,
+        root_id=(parent.root_id or parent.comment_id) if parent else None,
+        depth=parent.depth + 1 if parent else 0,
     )
 
     db.add(db_comment)
+    db.flush()
+    db_comment.path = (comment_path(parent) + "/" if parent else "") + _segment(db_comment.comment_id)
+    bump_version(db, RECIPE_COMMENTS, recipe_id)
+    add_event(db, COMMENT_CREATED, f"recipe:{recipe_id}", comment_id=db_comment.comment_id, user_id=user_id,
+              recipe_id=recipe_id, parent_id=db_comment.parent_id, content=db_comment.content)
+    record_rollup(db, COMMENTS, [(recipe_id, db_comment.created_at)])
     db.commit()
     db.refresh(db_comment)
+    search_backend.index_comment(db_comment)
     return db_comment
 
 
@@ -28,14 +72,109 @@ def get_comments_for_recipe(db: Session, recipe_id: int):
         .all()
     )
 
+def get_comment_threads(db: Session, recipe_id: int, after: int = 0, limit: int = 20, replies: int = 3):
+    """One page of top-level comments, each with its first ``replies`` replies in thread order.
+
+    Runs as a single statement: the page of roots, the per-root reply counts
+    and the ``ROW_NUMBER()``-ranked replies are all resolved by the database
+    from the (recipe_id, parent_id, comment_id) and (root_id, path) indexes.
+    Returns ``[(comment, reply_count, [reply, ...]), ...]``.
+    """
+    C = models.Comment
+    top = (
+        select(C.comment_id)
+        .where(C.recipe_id == recipe_id, C.parent_id.is_(None), C.comment_id > after)
+        .order_by(C.comment_id)
+        .limit(limit)
+        .cte("top")
+    )
+    in_page = C.root_id.in_(select(top.c.comment_id))
+    ranked = (
+        select(C.comment_id, func.row_number().over(partition_by=C.root_id, order_by=C.path).label("rn"))
+        .where(in_page)
+        .subquery("ranked")
+    )
+    counts = (
+        select(C.root_id, func.count().label("reply_count"))
+        .where(in_page)
+        .group_by(C.root_id)
+        .subquery("counts")
+    )
+    stmt = (
+        select(C, counts.c.reply_count)
+        .outerjoin(ranked, ranked.c.comment_id == C.comment_id)
+        .outerjoin(counts, counts.c.root_id == C.comment_id)
+        .where(or_(C.comment_id.in_(select(top.c.comment_id)), ranked.c.rn <= replies))
+        .order_by(C.comment_id)
+    )
+
+    threads = {}
+    children = []
+    for comment, reply_count in db.execute(stmt):
+        if comment.parent_id is None:
+            threads[comment.comment_id] = (comment, reply_count or 0, [])
+        else:
+            children.append(comment)
+    for reply in sorted(children, key=lambda c: c.path):
+        threads[reply.root_id][2].append(reply)
+    return list(threads.values())
+
+
+def get_replies(db: Session, comment, after: Optional[str] = None, limit: int = 50):
+    """All descendants of ``comment`` in thread order, keyset-paginated by path."""
+    query = db.query(models.Comment).filter(_subtree(comment))
+    if after:
+        query = query.filter(models.Comment.path > after)
+    return query.order_by(models.Comment.path).limit(limit).all()
+
+
 def delete_comment(db: Session, comment_id:int):
+    """Delete a comment together with its replies; returns the ids that stopped counting, or None if it doesn't exist.
+
+    Replies written by other users are never removed with it: when the subtree
+    has any, the comment becomes a tombstone instead (content cleared,
+    ``deleted_at`` set) and the thread stays intact.
+    """
     comment = db.query(models.Comment).filter(models.Comment.comment_id == comment_id).first()
     if not comment:
         return None
-    db.delete(comment)
+    if comment.deleted_at is not None:
+        return []
+
+    others_replied = db.query(
+        select(models.Comment.comment_id).where(_subtree(comment), models.Comment.user_id != comment.user_id).exists()
+    ).scalar()
+    if others_replied:
+        comment.content = ""
+        comment.deleted_at = datetime.now(timezone.utc)
+        rows = [(comment.comment_id, comment.created_at)]
+    else:
+        stmt = (
+            delete(models.Comment)
+            .where(or_(models.Comment.comment_id == comment_id, _subtree(comment)))
+            .returning(models.Comment.comment_id, models.Comment.created_at, models.Comment.deleted_at)
+        )
+        # Tombstones in the subtree already left the counts when they were deleted.
+        rows = [(row.comment_id, row.created_at) for row in db.execute(stmt) if row.deleted_at is None]
+    deleted = [comment_id for comment_id, _ in rows]
+    record_rollup(db, COMMENTS, [(comment.recipe_id, created_at) for _, created_at in rows], delta=-1)
+    bump_version(db, RECIPE_COMMENTS, comment.recipe_id)
+    add_event(db, COMMENT_DELETED, f"recipe:{comment.recipe_id}", comment_ids=deleted, recipe_id=comment.recipe_id)
     db.commit()
-    return True
+    for deleted_id in deleted:
+        search_backend.delete_comment(deleted_id)
+    return deleted
     
 def count_comments(db: Session, recipe_id: int):
-    return db.query(models.Comment).filter(models.Comment.recipe_id == recipe_id).count()
+    return db.query(models.Comment).filter(models.Comment.recipe_id == recipe_id, models.Comment.deleted_at.is_(None)).count()
+
 
+def search_comments(db: Session, query: str, recipe_id: Optional[int] = None, page: int = 1, size: int = 20):
+    """Ranked full-text search; returns ``(total, [(comment, score), ...])`` in rank order."""
+    total, hits = search_backend.search(db, query, recipe_id, offset=(page - 1) * size, limit=size)
+    if not hits:
+        return total, []
+    ids = [comment_id for comment_id, _ in hits]
+    rows = {c.comment_id: c for c in db.query(models.Comment).filter(models.Comment.comment_id.in_(ids))}
+    # An external index can briefly lag a delete; drop hits whose row is gone.
+    return total, [(rows[comment_id], score) for comment_id, score in hits if comment_id in rows]
@@ -1,6 +1,8 @@
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from typing import Optional
+from .outbox import add_event, FOLLOW_CREATED, FOLLOW_DELETED
+from .versions import bump_version, USER_FOLLOWERS, USER_FOLLOWING
 
 
 def follow_user(db:Session, follower_id:int, following_id:int):
@@ -10,6 +12,9 @@ def follow_user(db:Session, follower_id:int, following_id:int):
         following_id=following_id
     )
     db.add(db_follow)
+    bump_version(db, USER_FOLLOWERS, following_id)
+    bump_version(db, USER_FOLLOWING, follower_id)
+    add_event(db, FOLLOW_CREATED, f"user:{following_id}", follower_id=follower_id, following_id=following_id)
     db.commit()
     db.refresh(db_follow)
 
@@ -31,6 +36,9 @@ def unfollow_user(db:Session, follower_id:int, following_id:int):
     if not follow:
         return None
     db.delete(follow)
+    bump_version(db, USER_FOLLOWERS, following_id)
+    bump_version(db, USER_FOLLOWING, follower_id)
+    add_event(db, FOLLOW_DELETED, f"user:{following_id}", follower_id=follower_id, following_id=following_id)
     db.commit()
     return True
 
@@ -1,20 +1,53 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, null, select, tuple_
+from sqlalchemy.orm import Session, aliased
 from .. import models, schemas
-from typing import Optional
+from typing import List, Optional, Tuple
+from ..database import insert_for
+from ..utils.membership import liked as liked_index
+from .outbox import add_event, LIKE_CREATED, LIKE_DELETED
+from .rollups import record as record_rollup, LIKES
+from .versions import bump_version, RECIPE_LIKES
 
 
-def create_like(db: Session, user_id: int, recipe_id: int):
-    db_like = models.Like(
-        recipe_id=recipe_id,
-        user_id=user_id
+def create_like(db: Session, user_id: int, recipe_id: int) -> Optional[models.Like]:
+    """``INSERT ... ON CONFLICT DO NOTHING RETURNING``; None if the user already likes the recipe."""
+    stmt = (
+        insert_for(db, models.Like)
+        .values(recipe_id=recipe_id, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "recipe_id"])
+        .returning(models.Like)
     )
-
-    db.add(db_like)
+    db_like = db.scalars(stmt).first()
+    if db_like is None:
+        db.rollback()
+        return None
+    bump_version(db, RECIPE_LIKES, recipe_id)
+    add_event(db, LIKE_CREATED, f"recipe:{recipe_id}", like_id=db_like.like_id, user_id=user_id,
+              recipe_id=recipe_id, created_at=db_like.created_at)
+    record_rollup(db, LIKES, [(recipe_id, db_like.created_at)])
+    # RETURNING already loaded every column; detach so commit doesn't expire them.
+    db.expunge(db_like)
     db.commit()
-    db.refresh(db_like)
+    liked_index.add(user_id, recipe_id)
     return db_like
 
 
+def put_like(db: Session, user_id: int, recipe_id: int) -> Tuple[models.Like, bool]:
+    """Idempotent like. Returns ``(like, created)``; only a repeated PUT reads the existing row.
+
+    If the conflicting row is deleted before it can be read, the insert is
+    tried once more. ``(None, False)`` means it raced a delete twice.
+    """
+    for _ in range(2):
+        db_like = create_like(db, user_id=user_id, recipe_id=recipe_id)
+        if db_like is not None:
+            return db_like, True
+        existing = get_like_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
+        if existing is not None:
+            return existing, False
+    return None, False
+
+
 def get_like(db: Session, like_id: int):
     like = db.query(models.Like).filter(models.Like.like_id == like_id).first() 
     return like if like else None
@@ -34,13 +67,79 @@ def get_likes_for_recipe(db: Session, recipe_id: int):
         .all()
     )
 
-def delete_like(db: Session, like_id:int):
-    like = db.query(models.Like).filter(models.Like.like_id == like_id).first()
-    if not like:
+def _delete_likes(db: Session, *conditions) -> Optional[int]:
+    stmt = delete(models.Like).where(*conditions).returning(
+        models.Like.like_id, models.Like.user_id, models.Like.recipe_id, models.Like.created_at
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        db.rollback()
         return None
-    db.delete(like)
+    bump_version(db, RECIPE_LIKES, row.recipe_id)
+    add_event(db, LIKE_DELETED, f"recipe:{row.recipe_id}", like_id=row.like_id, user_id=row.user_id, recipe_id=row.recipe_id)
+    record_rollup(db, LIKES, [(row.recipe_id, row.created_at)], delta=-1)
     db.commit()
-    return True
+    liked_index.remove(row.user_id, row.recipe_id)
+    return row.recipe_id
+
+
+def delete_like(db: Session, like_id: int, user_id: int) -> Optional[int]:
+    """``DELETE ... WHERE like_id AND owner RETURNING``; the like's recipe id, or None if no such like is owned by the user."""
+    return _delete_likes(db, models.Like.like_id == like_id, models.Like.user_id == user_id)
+
+
+def delete_like_for_recipe(db: Session, user_id: int, recipe_id: int) -> bool:
+    return _delete_likes(db, models.Like.user_id == user_id, models.Like.recipe_id == recipe_id) is not None
+
+
+def get_likes_for_user(
+    db: Session, user_id: int, before: Optional[int] = None, limit: int = 20, with_counts: bool = False
+) -> List[Tuple[models.Like, Optional[int]]]:
+    """The user's likes newest first, as ``(like, like_count)`` rows.
+
+    Keyset-paginated on ``ix_likes_user_created``: ``before`` is the last
+    ``like_id`` of the previous page. Its timestamp is looked up in the same
+    statement (among the user's own likes only), so the cursor never has to
+    round-trip a datetime and the page is one row-value range scan of the
+    index. Only when that finds nothing is the cursor checked: if its like
+    was removed meanwhile, a second query resumes by id. With ``with_counts``
+    each row also carries the recipe's like count from a correlated
+    subquery; otherwise ``like_count`` is None.
+    """
+    Like = models.Like
+    if with_counts:
+        others = aliased(models.Like)
+        count = select(func.count()).where(others.recipe_id == Like.recipe_id).correlate(Like).scalar_subquery()
+    else:
+        count = null()
+    stmt = select(Like, count.label("like_count")).where(Like.user_id == user_id)
+    order = (Like.created_at.desc(), Like.like_id.desc())
+    if before is None:
+        return [(like, like_count) for like, like_count in db.execute(stmt.order_by(*order).limit(limit))]
+
+    anchor = aliased(models.Like)
+    is_cursor = (anchor.like_id == before, anchor.user_id == user_id)
+    anchor_created = select(anchor.created_at).where(*is_cursor).scalar_subquery()
+    page = stmt.where(tuple_(Like.created_at, Like.like_id) < tuple_(anchor_created, before))
+    rows = [(like, like_count) for like, like_count in db.execute(page.order_by(*order).limit(limit))]
+    if rows or db.scalar(select(select(anchor.like_id).where(*is_cursor).exists())):
+        return rows
+    # The cursor's like was removed meanwhile: ids follow insertion order.
+    fallback = stmt.where(Like.like_id < before)
+    return [(like, like_count) for like, like_count in db.execute(fallback.order_by(*order).limit(limit))]
+
+
+def liked_recipe_ids(db: Session, user_id: int, recipe_ids: List[int]) -> List[int]:
+    """Which of ``recipe_ids`` the user likes, ascending; from the membership index when enabled."""
+    found = liked_index.filter(user_id, recipe_ids)
+    if found is not None:
+        return found
+    rows = db.scalars(
+        select(models.Like.recipe_id)
+        .where(models.Like.user_id == user_id, models.Like.recipe_id.in_(set(recipe_ids)))
+        .order_by(models.Like.recipe_id)
+    )
+    return list(rows)
 
 
 def count_likes(db: Session, recipe_id: int):
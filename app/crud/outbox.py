@@ -0,0 +1,22 @@
+import json
+
+from sqlalchemy.orm import Session
+from .. import models
+
+# Event types. Payloads carry the ids of the row(s) involved; consumers
+# deduplicate by ``event_id`` (delivery is at least once).
+LIKE_CREATED = "like.created"
+LIKE_DELETED = "like.deleted"
+COMMENT_CREATED = "comment.created"
+COMMENT_DELETED = "comment.deleted"
+FOLLOW_CREATED = "follow.created"
+FOLLOW_DELETED = "follow.deleted"
+SAVED_CREATED = "saved.created"
+SAVED_DELETED = "saved.deleted"
+RECIPE_PURGED = "recipe.social_purged"
+USER_PURGED = "user.social_purged"
+
+
+def add_event(db: Session, event_type: str, key: str, **payload):
+    """Queue an event in the current transaction. Does not commit."""
+    db.add(models.OutboxEvent(event_type=event_type, key=key, payload=json.dumps(payload, default=str)))
@@ -0,0 +1,175 @@
+"""Hourly engagement counters per recipe (``engagement_rollups``).
+
+Every like, comment and save adds 1 to the row of its recipe and the UTC
+hour it was created in, in the transaction that writes it; deleting it
+subtracts 1 from that same hour. Once those transactions have committed, a
+rollup row equals a ``GROUP BY recipe_id, hour`` over the rows that exist,
+which is what ``backfill`` recomputes from the base tables. Rows written
+before rollups existed, or changed behind the application's back, are only
+counted after a backfill.
+
+``backfill`` counts and then replaces, so a +1 committed in between would be
+overwritten. On PostgreSQL writers therefore hold a shared transaction-level
+advisory lock on each recipe they count, and ``backfill`` takes exclusive
+ones on a chunk's recipes before counting: a write either commits before
+the chunk is counted or waits and applies its +1 on top of the new totals.
+Locks are taken in ascending recipe order on both sides. SQLite admits one
+writer at a time, so it needs no locks.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text, union
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import insert_for
+
+LIKES = "likes"
+COMMENTS = "comments"
+SAVES = "saves"
+METRICS = (LIKES, COMMENTS, SAVES)
+
+SOURCES = {LIKES: models.Like, COMMENTS: models.Comment, SAVES: models.SavedRecipe}
+STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+# First key of the two-key advisory locks on recipe ids, so they can't collide with other users of advisory locks.
+_LOCK_SPACE = 4101
+
+
+def _utc(moment) -> datetime:
+    if moment is None:
+        return datetime.now(timezone.utc)
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    if moment.tzinfo is None:
+        # SQLite hands back naive timestamps; they are UTC.
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def hour_bucket(created_at: Optional[datetime]) -> datetime:
+    """Start of the UTC hour of ``created_at`` (now when missing)."""
+    return _utc(created_at).replace(minute=0, second=0, microsecond=0)
+
+
+def align(moment: datetime, granularity: str, up: bool = False) -> datetime:
+    """Start of the hour or UTC day containing ``moment``; with ``up``, the first boundary at or after it."""
+    moment = _utc(moment)
+    bucket = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        bucket = bucket.replace(hour=0)
+    if up and bucket < moment:
+        bucket += STEPS[granularity]
+    return bucket
+
+
+def _upsert(db: Session, rows: List[dict], replace: bool = False):
+    table = models.EngagementRollup.__table__
+    stmt = insert_for(db, table)
+    if replace:
+        set_ = {metric: stmt.excluded[metric] for metric in METRICS}
+    else:
+        set_ = {metric: table.c[metric] + stmt.excluded[metric] for metric in METRICS}
+    db.execute(stmt.on_conflict_do_update(index_elements=[table.c.recipe_id, table.c.bucket], set_=set_), rows)
+
+
+def lock_recipes(db: Session, recipe_ids: Iterable[int], exclusive: bool = False):
+    """Hold advisory locks on ``recipe_ids`` until the transaction ends (PostgreSQL only)."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    function = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+    # unnest keeps the array order, so the locks are taken in ascending order.
+    db.execute(
+        text(f"SELECT {function}(:space, id) FROM unnest(CAST(:ids AS integer[])) AS id"),
+        {"space": _LOCK_SPACE, "ids": sorted(set(recipe_ids))},
+    )
+
+
+def record(db: Session, metric: str, rows: Iterable[Tuple[int, Optional[datetime]]], delta: int = 1):
+    """Add ``delta`` to ``metric`` for every ``(recipe_id, created_at)``. Does not commit."""
+    changes = Counter((recipe_id, hour_bucket(created_at)) for recipe_id, created_at in rows)
+    if not changes:
+        return
+    lock_recipes(db, (recipe_id for recipe_id, _ in changes))
+    # Sorted, so concurrent writers lock rollup rows in the same order.
+    _upsert(db, [
+        {"recipe_id": recipe_id, "bucket": bucket, **{m: 0 for m in METRICS}, metric: count * delta}
+        for (recipe_id, bucket), count in sorted(changes.items())
+    ])
+
+
+def _hour_expression(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", func.timezone("UTC", column))
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+
+def backfill(db: Session, chunk_size: int = 1000, on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Recompute the rollups of every recipe from the base tables; returns the rollup rows written.
+
+    Works through ``chunk_size`` recipe ids per transaction: each chunk's
+    recipes are locked against writers, then its rollups are replaced by one
+    ``GROUP BY`` per table. Recipes that only have rollups left are cleared.
+    Writes to a chunk's recipes wait for its commit, so keep chunks small
+    while the service takes traffic. ``on_progress(last_recipe_id, rows)`` is
+    called after every committed chunk.
+    """
+    Rollup = models.EngagementRollup
+    recipe_ids = union(*(select(model.recipe_id) for model in (*SOURCES.values(), Rollup))).subquery()
+    written = 0
+    last = None
+    while True:
+        query = select(recipe_ids.c.recipe_id).order_by(recipe_ids.c.recipe_id).limit(chunk_size)
+        if last is not None:
+            query = query.where(recipe_ids.c.recipe_id > last)
+        chunk = db.scalars(query).all()
+        if not chunk:
+            return written
+
+        lock_recipes(db, chunk, exclusive=True)
+        totals: Dict[Tuple[int, datetime], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        for metric, model in SOURCES.items():
+            hour = _hour_expression(db, model.created_at)
+            grouped = (
+                select(model.recipe_id, hour, func.count())
+                .where(model.recipe_id.in_(chunk))
+                .group_by(model.recipe_id, hour)
+            )
+            if model is models.Comment:
+                grouped = grouped.where(model.deleted_at.is_(None))
+            for recipe_id, bucket, count in db.execute(grouped):
+                totals[recipe_id, hour_bucket(bucket)][metric] += count
+
+        db.execute(delete(Rollup).where(Rollup.recipe_id.in_(chunk)))
+        if totals:
+            _upsert(db, [
+                {"recipe_id": recipe_id, "bucket": bucket, **counts}
+                for (recipe_id, bucket), counts in sorted(totals.items())
+            ], replace=True)
+        db.commit()
+        written += len(totals)
+        last = chunk[-1]
+        if on_progress is not None:
+            on_progress(last, len(totals))
+
+
+def get_series(
+    db: Session, recipe_ids: List[int], start: datetime, end: datetime, granularity: str = "hour"
+) -> Dict[int, List[dict]]:
+    """Per-recipe points in ``[start, end)`` from rollup rows only; buckets without activity are left out."""
+    Rollup = models.EngagementRollup
+    rows = db.execute(
+        select(Rollup.recipe_id, Rollup.bucket, Rollup.likes, Rollup.comments, Rollup.saves)
+        .where(Rollup.recipe_id.in_(set(recipe_ids)), Rollup.bucket >= start, Rollup.bucket < end)
+        .order_by(Rollup.recipe_id, Rollup.bucket)
+    )
+    series: Dict[int, Dict[datetime, Dict[str, int]]] = {recipe_id: {} for recipe_id in recipe_ids}
+    for recipe_id, bucket, *counts in rows:
+        bucket = align(bucket, granularity)
+        point = series[recipe_id].setdefault(bucket, dict.fromkeys(METRICS, 0))
+        for metric, count in zip(METRICS, counts):
+            point[metric] += count
+    return {
+        recipe_id: [{"bucket": bucket, **point} for bucket, point in points.items() if any(point.values())]
+        for recipe_id, points in series.items()
+    }
@@ -1,19 +1,49 @@
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 from .. import models, schemas
-from typing import Optional
+from typing import List, Optional, Tuple
+from ..database import insert_for
+from ..utils.membership import saved as saved_index
+from .outbox import add_event, SAVED_CREATED, SAVED_DELETED
+from .rollups import record as record_rollup, SAVES
 
 
-def save_recipe(db: Session, user_id: int, recipe_id: int) -> dict:
-    db_saved = models.SavedRecipe(
-        user_id=user_id,
-        recipe_id=recipe_id
+def save_recipe(db: Session, user_id: int, recipe_id: int) -> Optional[models.SavedRecipe]:
+    """``INSERT ... ON CONFLICT DO NOTHING RETURNING``; None if the recipe is already saved."""
+    stmt = (
+        insert_for(db, models.SavedRecipe)
+        .values(user_id=user_id, recipe_id=recipe_id)
+        .on_conflict_do_nothing(index_elements=["user_id", "recipe_id"])
+        .returning(models.SavedRecipe)
     )
-    db.add(db_saved)
+    db_saved = db.scalars(stmt).first()
+    if db_saved is not None:
+        add_event(db, SAVED_CREATED, f"recipe:{recipe_id}", saved_id=db_saved.saved_id, user_id=user_id,
+                  recipe_id=recipe_id, created_at=db_saved.created_at)
+        record_rollup(db, SAVES, [(recipe_id, db_saved.created_at)])
+        # RETURNING already loaded every column; detach so commit doesn't expire them.
+        db.expunge(db_saved)
     db.commit()
-    db.refresh(db_saved)
-
+    if db_saved is not None:
+        saved_index.add(user_id, recipe_id)
     return db_saved
 
+
+def put_saved(db: Session, user_id: int, recipe_id: int) -> Tuple[models.SavedRecipe, bool]:
+    """Idempotent save. Returns ``(saved, created)``; only a repeated PUT reads the existing row.
+
+    If the conflicting row is deleted before it can be read, the insert is
+    tried once more. ``(None, False)`` means it raced a delete twice.
+    """
+    for _ in range(2):
+        db_saved = save_recipe(db, user_id=user_id, recipe_id=recipe_id)
+        if db_saved is not None:
+            return db_saved, True
+        existing = get_saved_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
+        if existing is not None:
+            return existing, False
+    return None, False
+
 def get_saved(db: Session, saved_id: int):
     saved = db.query(models.SavedRecipe).filter(models.SavedRecipe.saved_id == saved_id).first()
 
@@ -35,11 +65,38 @@ def get_saved_for_user(db: Session, user_id: int):
         .all()
     )
 
-def unsave_recipe(db: Session, saved_id: int):
-    saved = db.query(models.SavedRecipe).filter(models.SavedRecipe.saved_id == saved_id).first()
-    if not saved:
-        return None
-    db.delete(saved)
+def saved_recipe_ids(db: Session, user_id: int, recipe_ids: List[int]) -> List[int]:
+    """Which of ``recipe_ids`` the user saved, ascending; from the membership index when enabled."""
+    found = saved_index.filter(user_id, recipe_ids)
+    if found is not None:
+        return found
+    rows = db.scalars(
+        select(models.SavedRecipe.recipe_id)
+        .where(models.SavedRecipe.user_id == user_id, models.SavedRecipe.recipe_id.in_(set(recipe_ids)))
+        .order_by(models.SavedRecipe.recipe_id)
+    )
+    return list(rows)
+
+def _delete_saved(db: Session, *conditions) -> bool:
+    stmt = delete(models.SavedRecipe).where(*conditions).returning(
+        models.SavedRecipe.saved_id, models.SavedRecipe.user_id, models.SavedRecipe.recipe_id, models.SavedRecipe.created_at
+    )
+    row = db.execute(stmt).first()
+    if row is None:
+        db.rollback()
+        return False
+    add_event(db, SAVED_DELETED, f"recipe:{row.recipe_id}", saved_id=row.saved_id, user_id=row.user_id, recipe_id=row.recipe_id)
+    record_rollup(db, SAVES, [(row.recipe_id, row.created_at)], delta=-1)
     db.commit()
+    saved_index.remove(row.user_id, row.recipe_id)
     return True
 
+
+def unsave_recipe(db: Session, saved_id: int, user_id: int) -> bool:
+    """``DELETE ... WHERE saved_id AND owner RETURNING``; False if no such entry is owned by the user."""
+    return _delete_saved(db, models.SavedRecipe.saved_id == saved_id, models.SavedRecipe.user_id == user_id)
+
+
+def unsave_recipe_for_user(db: Session, user_id: int, recipe_id: int) -> bool:
+    return _delete_saved(db, models.SavedRecipe.user_id == user_id, models.SavedRecipe.recipe_id == recipe_id)
+
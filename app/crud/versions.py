@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+from .. import models
+from ..database import insert_for
+
+# Watermark scopes. Every write that changes what a cached read returns
+# bumps the matching (scope, resource_id) row in the same transaction.
+RECIPE_COMMENTS = "recipe_comments"
+RECIPE_LIKES = "recipe_likes"
+USER_FOLLOWERS = "user_followers"
+USER_FOLLOWING = "user_following"
+
+
+def bump_version(db: Session, scope: str, resource_id: int):
+    """Increment the watermark for a resource. Does not commit."""
+    table = models.ResourceVersion.__table__
+    now = datetime.now(timezone.utc)
+    stmt = insert_for(db, table).values(scope=scope, resource_id=resource_id, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.resource_id],
+        set_={"version": table.c.version + 1, "updated_at": now},
+    )
+    db.execute(stmt)
+
+
+def get_version(db: Session, scope: str, resource_id: int) -> Tuple[int, Optional[datetime]]:
+    row = (
+        db.query(models.ResourceVersion.version, models.ResourceVersion.updated_at)
+        .filter(models.ResourceVersion.scope == scope, models.ResourceVersion.resource_id == resource_id)
+        .first()
+    )
+    if not row:
+        return 0, None
+    return row.version, row.updated_at
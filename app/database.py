@@ -1,11 +1,272 @@
+import logging
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.sql.dml import UpdateBase
+
+from .metrics import db_pool_connections_in_use, db_replica_up, db_replica_errors_total, db_session_routes_total
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL must be set in the environment")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+# Optional read replicas: DATABASE_READ_URLS is a comma-separated list,
+# DATABASE_READ_URL is accepted for the single-replica case.
+DATABASE_READ_URLS = [
+    u.strip()
+    for u in (os.getenv("DATABASE_READ_URLS") or os.getenv("DATABASE_READ_URL") or "").split(",")
+    if u.strip()
+]
+# How long a user's reads stay on the primary after one of their writes.
+READ_STICKY_SECONDS = float(os.getenv("READ_STICKY_SECONDS", "5"))
+# Optional Redis shared by all workers and pods, so a write is also seen by
+# reads that another worker serves. Without it the window is per worker.
+READ_STICKY_REDIS_URL = os.getenv("READ_STICKY_REDIS_URL", "")
+# How long a failed replica is skipped before it is probed again.
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# How often a healthy replica is probed before being handed out.
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+
+
+def _instrument_pool(engine: Engine, name: str) -> Engine:
+    gauge = db_pool_connections_in_use.labels(engine=name)
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        gauge.inc()
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_conn, record):
+        gauge.dec()
+
+    return engine
+
+
+engine = _instrument_pool(create_engine(DATABASE_URL), "primary")
+
+
+class _Replica:
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+
+class ReplicaSet:
+    """Round-robin over healthy read replicas, falling back to the primary.
+
+    A replica is taken out of rotation for REPLICA_RETRY_SECONDS when a
+    connection to it fails, either during the periodic probe in ``choose`` or
+    while a request is using it (``handle_error``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replicas: List[_Replica] = []
+        self._next = 0
+
+    def configure(self, engines: List[Engine]):
+        replicas = []
+        for i, replica_engine in enumerate(engines):
+            replica = _Replica(f"replica-{i}", _instrument_pool(replica_engine, f"replica-{i}"))
+            event.listen(replica_engine, "handle_error", self._error_listener(replica))
+            db_replica_up.labels(engine=replica.name).set(1)
+            replicas.append(replica)
+        with self._lock:
+            old, self._replicas, self._next = self._replicas, replicas, 0
+        for replica in old:
+            replica.engine.dispose()
+
+    def _error_listener(self, replica: _Replica):
+        def _on_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(replica)
+
+        return _on_error
+
+    def mark_down(self, replica: _Replica):
+        replica.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+        db_replica_errors_total.labels(engine=replica.name).inc()
+        db_replica_up.labels(engine=replica.name).set(0)
+
+    def _probe(self, replica: _Replica) -> bool:
+        try:
+            with replica.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+        except Exception:
+            self.mark_down(replica)
+            return False
+        replica.checked_at = time.monotonic()
+        db_replica_up.labels(engine=replica.name).set(1)
+        return True
+
+    def choose(self) -> Optional[_Replica]:
+        with self._lock:
+            replicas = self._replicas
+            start = self._next
+            self._next = (self._next + 1) % max(len(replicas), 1)
+        now = time.monotonic()
+        for offset in range(len(replicas)):
+            replica = replicas[(start + offset) % len(replicas)]
+            if replica.down_until > now:
+                continue
+            if now - replica.checked_at > REPLICA_CHECK_SECONDS and not self._probe(replica):
+                continue
+            return replica
+        return None
+
+    def engines(self) -> List[Engine]:
+        return [replica.engine for replica in self._replicas]
+
+    def __bool__(self):
+        return bool(self._replicas)
+
+
+replicas = ReplicaSet()
+if DATABASE_READ_URLS:
+    replicas.configure([create_engine(url, pool_pre_ping=True) for url in DATABASE_READ_URLS])
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a replica when opened with ``info={"read_only": True}``.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary. The
+    replica is pinned on first use so a request sees one consistent snapshot.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not self.info.get("read_only") or self._flushing or isinstance(clause, UpdateBase):
+            return engine
+        if "replica" not in self.info:
+            replica = replicas.choose() if replicas else None
+            self.info["replica"] = replica
+            db_session_routes_total.labels(
+                target=replica.name if replica else ("fallback" if replicas else "primary")
+            ).inc()
+        replica = self.info["replica"]
+        return replica.engine if replica is not None else engine
+
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine, info={"read_only": True})
+Base = declarative_base()
+
+
+_recent_writers = {}
+_recent_writers_lock = threading.Lock()
+# Expiry of the most recent write; every entry in _recent_writers expires by then.
+_sticky_until = 0.0
+_sticky_redis = None
+
+
+def _sticky_store():
+    global _sticky_redis
+    if _sticky_redis is None and READ_STICKY_REDIS_URL:
+        import redis
+
+        _sticky_redis = redis.Redis.from_url(READ_STICKY_REDIS_URL, socket_timeout=0.1, socket_connect_timeout=0.1)
+    return _sticky_redis
+
+
+def sticky_is_shared() -> bool:
+    """Whether ``share_recent_write`` has to run after ``mark_recent_write`` (it blocks; use a thread)."""
+    return bool(replicas) and bool(READ_STICKY_REDIS_URL)
+
+
+def mark_recent_write(user_id: int):
+    """Pin a user's reads to the primary for READ_STICKY_SECONDS (read-your-writes)."""
+    global _sticky_until
+    if not replicas:
+        return
+    now = time.monotonic()
+    with _recent_writers_lock:
+        _recent_writers[user_id] = _sticky_until = now + READ_STICKY_SECONDS
+        if len(_recent_writers) > 10000:
+            for uid in [u for u, until in _recent_writers.items() if until <= now]:
+                del _recent_writers[uid]
+
+
+def share_recent_write(user_id: int):
+    """Record the sticky window in READ_STICKY_REDIS_URL for the other workers."""
+    try:
+        _sticky_store().set(f"sticky:{user_id}", 1, px=max(1, int(READ_STICKY_SECONDS * 1000)))
+    except Exception as e:
+        logger.warning("Could not share sticky window of user %s: %s", user_id, e)
+
+
+def has_sticky_users() -> bool:
+    """Whether any user may be inside their sticky window, so reads must check who is asking."""
+    if sticky_is_shared():
+        return True
+    if not _recent_writers:
+        return False
+    if _sticky_until > time.monotonic():
+        return True
+    with _recent_writers_lock:
+        if _sticky_until <= time.monotonic():
+            _recent_writers.clear()
+    return False
+
+
+def _is_sticky(user_id: int) -> bool:
+    if _recent_writers.get(user_id, 0.0) > time.monotonic():
+        return True
+    if not sticky_is_shared():
+        return False
+    try:
+        return bool(_sticky_store().exists(f"sticky:{user_id}"))
+    except Exception as e:
+        # Like the rate limiter, an unreachable shared store fails open.
+        logger.warning("Could not read sticky window of user %s: %s", user_id, e)
+        return False
+
+
+def open_read_session(user_id: Optional[int] = None) -> Session:
+    """Blocks on Redis when READ_STICKY_REDIS_URL is set; call from a thread."""
+    if user_id is not None and _is_sticky(user_id):
+        db_session_routes_total.labels(target="sticky").inc()
+        return SessionLocal()
+    return ReadSessionLocal()
+
+
+def read_target(db: Session) -> str:
+    """Name of the database ``db`` reads from: its pinned replica, or ``primary``."""
+    replica = db.info.get("replica") if db.info.get("read_only") else None
+    return replica.name if replica is not None else "primary"
+
+
+def run_in_session_like(db: Session, fn, *args):
+    """Run ``fn(session, *args)`` in a new session on the same database as ``db``.
+
+    For work shared between requests (single-flight): it must not depend on
+    the session of whichever request started it, which is closed if that
+    request goes away, yet has to read from the same replica that request's
+    watermark came from.
+    """
+    if read_target(db) == "primary":
+        session = SessionLocal()
+    else:
+        session = ReadSessionLocal(info={"replica": db.info["replica"]})
+    try:
+        return fn(session, *args)
+    finally:
+        session.close()
+
+
+def insert_for(db: Session, table):
+    """Dialect-specific INSERT so callers can use ON CONFLICT / RETURNING."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
@@ -1,28 +1,92 @@
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
+import time
 
-from .routers import comments, follow, likes, saved
-from .database import engine
-from . import models
-from .schemas import RootResponse, HealthResponse
+_IMPORT_STARTED = time.perf_counter()
 
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from starlette.responses import Response
-import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+
+from .routers import admin, comments, follow, internal, likes, recipes, saved
+from .database import engine, mark_recent_write, replicas, share_recent_write, sticky_is_shared
+from .recommendations import RECOMMEND_ENABLED, recommender
+from .schemas import RootResponse, HealthResponse, ReadinessResponse
+from .utils.admission import admission_middleware
+from .utils.health import readiness, warm_up_pool
+from .utils import live
+from .utils.loop_monitor import LOOP_MONITOR_ENABLED, monitor as loop_monitor
+from .utils.memory import MEMORY_TRACK_ROUTES, configure_memory_tracing, routes as memory_routes, run_memory_sampler
+from .utils.profiler import profiler, route_template, should_profile
+from .utils.tracing import TracingMiddleware, configure_tracing
+from .utils.upstream import run_reconciler
+from .workers import purge
+from .workers.outbox import OUTBOX_RELAY_ENABLED, Relay
+from .workers.reconciler import RECONCILE_ENABLED, Reconciler
+
+from prometheus_client import CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from starlette.responses import JSONResponse, Response
 from .metrics import (
     num_requests,
     num_errors,
     request_latency,
-    requests_in_progress
+    requests_in_progress,
+    startup_duration_seconds,
 )
 import os
 
+logger = logging.getLogger(__name__)
+
 
 ROOT_PATH = os.getenv("ROOT_PATH", "").rstrip("/")
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Set when running several workers (gunicorn.conf.py); /metrics then
+# aggregates every worker's samples instead of reporting only its own.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema changes are applied by `python -m app.cli migrate`, not here.
+    imported = time.perf_counter()
+    await run_in_threadpool(warm_up_pool, engine)
+    for replica_engine in replicas.engines():
+        await run_in_threadpool(warm_up_pool, replica_engine)
+    ready = time.perf_counter()
+
+    startup_duration_seconds.labels(phase="import").set(imported - _IMPORT_STARTED)
+    startup_duration_seconds.labels(phase="warmup").set(ready - imported)
+    startup_duration_seconds.labels(phase="total").set(ready - _IMPORT_STARTED)
+    logger.info("Startup finished in %.3fs (warm-up %.3fs)", ready - _IMPORT_STARTED, ready - imported)
+
+    live.start()
+    background = [
+        asyncio.create_task(run_reconciler()),
+        asyncio.create_task(run_memory_sampler()),
+        # Finish purge jobs that a restarted worker left behind.
+        asyncio.create_task(purge.run_resumer()),
+    ]
+    if RECONCILE_ENABLED:
+        background.append(asyncio.create_task(Reconciler().run_forever()))
+    if OUTBOX_RELAY_ENABLED:
+        background.append(asyncio.create_task(Relay().run_forever()))
+    if LOOP_MONITOR_ENABLED:
+        background.append(asyncio.create_task(loop_monitor.run()))
+    if RECOMMEND_ENABLED:
+        background.append(asyncio.create_task(recommender.run_forever()))
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
 
 app = FastAPI(
     title="Social Service",
     root_path=ROOT_PATH,
+    lifespan=lifespan,
 )
 
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:5173")
@@ -36,12 +100,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-models.Base.metadata.create_all(bind=engine)
+configure_tracing()
+configure_memory_tracing()
 
 app.include_router(comments.router)
 app.include_router(follow.router)
 app.include_router(likes.router)
 app.include_router(saved.router)
+app.include_router(recipes.router)
+app.include_router(internal.router)
+app.include_router(admin.router)
+
+# Registered before metrics_middleware so it runs inside it: shed requests
+# still show up in http_requests_total as 503s.
+app.middleware("http")(admission_middleware)
 
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
@@ -50,12 +122,23 @@ async def metrics_middleware(request: Request, call_next):
 
     requests_in_progress.inc()
     start_time = time.time()
+    # Materialise the shared state dict so handlers can report the user back.
+    state = request.state
+    profile = profiler.start() if should_profile(request) else None
+    memory_measurement = memory_routes.start() if MEMORY_TRACK_ROUTES else None
 
     try:
         response = await call_next(request)
         status_code = response.status_code
         duration = time.time() - start_time
 
+        user_id = getattr(state, "user_id", None)
+        if user_id is not None and method not in SAFE_METHODS and status_code < 400:
+            mark_recent_write(user_id)
+            if sticky_is_shared():
+                # Before the response goes out, so the client's next read sees it on any worker.
+                await run_in_threadpool(share_recent_write, user_id)
+
         num_requests.labels(method=method, endpoint=endpoint, status_code=status_code).inc()
 
         if status_code >= 400:
@@ -66,6 +149,13 @@ async def metrics_middleware(request: Request, call_next):
         return response
     finally:
         requests_in_progress.dec()
+        if profile is not None:
+            profiler.finish(profile, route_template(request), time.time() - start_time)
+        if memory_measurement is not None:
+            memory_routes.finish(memory_measurement, route_template(request))
+
+# Added last so it wraps everything else and the server span covers the whole request.
+app.add_middleware(TracingMiddleware)
 
 @app.get(
     "/metrics",
@@ -75,6 +165,10 @@ async def metrics_middleware(request: Request, call_next):
     },
 )
 def metrics():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
  
 
@@ -103,3 +197,42 @@ def root():
 )
 def health():
     return {"status": "ok"}
+
+
+@app.get(
+    "/health/live",
+    response_model=HealthResponse,
+    summary="Liveness probe",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": {"status": "ok"}}}}
+    },
+)
+def liveness():
+    return {"status": "ok"}
+
+
+@app.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    summary="Readiness probe",
+    responses={
+        200: {
+            "description": "Ready",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "status": "ready",
+                        "checks": {"database": "ok", "recipe_service": "ok", "user_service": "ok"},
+                    }
+                }
+            },
+        },
+        503: {"model": ReadinessResponse, "description": "Not ready"},
+    },
+)
+async def ready():
+    is_ready, checks = await readiness()
+    if not is_ready:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "checks": checks})
+    degraded = any(result != "ok" for result in checks.values())
+    return {"status": "degraded" if degraded else "ready", "checks": checks}
@@ -1,10 +1,70 @@
 from prometheus_client import Counter, Histogram, Gauge
 
+# Gauges declare how they aggregate across gunicorn workers in multiprocess
+# mode (PROMETHEUS_MULTIPROC_DIR set); the setting is ignored otherwise.
+
 num_requests = Counter("http_requests_total", "Total number of HTTP requests", ["method", "endpoint", "status_code"])
 num_errors = Counter("http_request_errors_total", "Total number of HTTP request errors", ["method", "endpoint", "status_code"])
 request_latency = Histogram("http_request_latency_seconds", "HTTP request latency in seconds",  ["method", "endpoint"])
-requests_in_progress = Gauge("http_requests_in_progress", "Number of HTTP requests in progress")
+requests_in_progress = Gauge("http_requests_in_progress", "Number of HTTP requests in progress", multiprocess_mode="livesum")
 likes_total = Counter("likes_total", "Total number of likes", ["action","source", "status"])
 comments_total = Counter("comments_total", "Total number of comments", ["source", "status"])
 follows_total = Counter("follows_total", "Total number of follows", ["action","source", "status"])
-saved_items_total = Counter("saved_items_total", "Total number of saved items", ["action","source", "status"])
\ No newline at end of file
+saved_items_total = Counter("saved_items_total", "Total number of saved items", ["action","source", "status"])
+
+db_pool_connections_in_use = Gauge("db_pool_connections_in_use", "Connections currently checked out of the pool", ["engine"], multiprocess_mode="livesum")
+db_replica_up = Gauge("db_replica_up", "Whether a read replica is currently in rotation (1) or skipped (0)", ["engine"], multiprocess_mode="livemin")
+db_replica_errors_total = Counter("db_replica_errors_total", "Connection failures that took a read replica out of rotation", ["engine"])
+db_session_routes_total = Counter("db_session_routes_total", "Read sessions by routing target (primary, replica-N, fallback, sticky)", ["target"])
+startup_duration_seconds = Gauge("app_startup_duration_seconds", "Time spent starting the worker", ["phase"], multiprocess_mode="livemax")
+upstream_circuit_state = Gauge("upstream_circuit_state", "Circuit breaker state per upstream (0=closed, 1=half-open, 2=open)", ["upstream"], multiprocess_mode="livemax")
+upstream_circuit_transitions_total = Counter("upstream_circuit_transitions_total", "Circuit breaker state transitions", ["upstream", "from_state", "to_state"])
+upstream_requests_total = Counter("upstream_requests_total", "Upstream existence checks by outcome", ["upstream", "outcome"])
+upstream_optimistic_accepts_total = Counter("upstream_optimistic_accepts_total", "Writes accepted without upstream verification", ["endpoint"])
+upstream_reconciled_total = Counter("upstream_reconciled_total", "Optimistically accepted ids resolved by the reconciler", ["upstream", "result"])
+singleflight_calls_total = Counter("singleflight_calls_total", "Calls executed by a single-flight group", ["operation"])
+singleflight_coalesced_total = Counter("singleflight_coalesced_total", "Callers that shared an in-flight call instead of running their own", ["operation"])
+deletion_events_total = Counter("deletion_events_total", "Recipe/user deletion events ingested", ["type", "status"])
+reconcile_ids_checked_total = Counter("reconcile_ids_checked_total", "Distinct ids validated against upstream by the sweeper", ["sweep"])
+reconcile_orphans_purged_total = Counter("reconcile_orphans_purged_total", "Orphaned ids whose rows were purged by the sweeper", ["sweep"])
+reconcile_checkpoint = Gauge("reconcile_checkpoint", "Last id resolved by each sweep in the current pass", ["sweep"], multiprocess_mode="livemostrecent")
+reconcile_passes_total = Counter("reconcile_passes_total", "Completed sweeper passes", ["sweep"])
+reconcile_paused_total = Counter("reconcile_paused_total", "Sweeper batches stopped early", ["sweep", "reason"])
+search_index_errors_total = Counter("search_index_errors_total", "Failed incremental updates to the external comment search index", ["operation"])
+search_queries_total = Counter("search_queries_total", "Comment search queries by backend", ["backend", "status"])
+rate_limited_total = Counter("rate_limited_total", "Write requests rejected with 429 by the per-user token bucket", ["group"])
+rate_limit_errors_total = Counter("rate_limit_errors_total", "Rate limit checks that failed open because the backend errored", ["group"])
+requests_shed_total = Counter("requests_shed_total", "Requests rejected with 503 by admission control", ["route_class"])
+admission_limit = Gauge("admission_concurrency_limit", "Current adaptive concurrency limit per route class", ["route_class"], multiprocess_mode="livesum")
+admission_in_flight = Gauge("admission_in_flight", "Admitted requests currently in flight per route class", ["route_class"], multiprocess_mode="livesum")
+purge_jobs_total = Counter("purge_jobs_total", "Finished account purge jobs", ["status"])
+purge_rows_deleted_total = Counter("purge_rows_deleted_total", "Rows deleted by account purge jobs", ["table"])
+process_memory_bytes = Gauge("process_memory_bytes", "Worker memory: rss, and the tracemalloc traced/traced_peak heap while tracing", ["kind"], multiprocess_mode="livesum")
+request_memory_peak_bytes = Histogram(
+    "http_request_memory_peak_bytes",
+    "Rise of the traced Python heap during a request (MEMORY_TRACK_ROUTES)",
+    ["route"],
+    buckets=(16e3, 64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6),
+)
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop resumed a periodic timer (time spent in code that did not await)",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+event_loop_stalls_total = Counter("event_loop_stalls_total", "Times the event loop stayed blocked past LOOP_LAG_THRESHOLD_SECONDS")
+live_subscribers = Gauge("live_subscribers", "Open recipe event streams (SSE)", multiprocess_mode="livesum")
+live_events_published_total = Counter("live_events_published_total", "Recipe events published to the live broker", ["type"])
+live_resyncs_total = Counter("live_resyncs_total", "Slow SSE consumers whose queue overflowed and were told to resync")
+outbox_batch_size = Histogram("outbox_relay_batch_size", "Events per batch delivered by the outbox relay", buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000))
+outbox_events_published_total = Counter("outbox_events_published_total", "Outbox events delivered to the sink", ["type"])
+outbox_relay_errors_total = Counter("outbox_relay_errors_total", "Outbox batches the sink failed to accept", ["sink"])
+outbox_backlog = Gauge("outbox_backlog", "Outbox events not yet delivered", multiprocess_mode="livemax")
+outbox_compacted_total = Counter("outbox_compacted_total", "Published outbox events removed by compaction")
+membership_lookups_total = Counter("membership_lookups_total", "Liked/saved membership index lookups (hit, load from the database, bypass for oversized users)", ["index", "result"])
+recommend_build_seconds = Histogram(
+    "recommend_build_seconds",
+    "Time to build the co-occurrence recommendation model",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+recommend_builds_total = Counter("recommend_builds_total", "Recommendation refreshes (built, loaded, unchanged, error)", ["result"])
+recommend_model_neighbors = Gauge("recommend_model_neighbors", "Neighbour entries in the served recommendation model", multiprocess_mode="livemax")
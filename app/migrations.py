@@ -0,0 +1,54 @@
+import logging
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from . import models
+from .search import ensure_database_index
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+
+def _drop_duplicates(bind: Engine, table, index):
+    """Keep the oldest row per key so a new unique index can be built on existing data."""
+    (pk,) = table.primary_key.columns
+    keep = select(func.min(pk)).group_by(*index.columns)
+    with bind.begin() as conn:
+        removed = conn.execute(delete(table).where(pk.not_in(keep))).rowcount
+    if removed:
+        logger.warning("Removed %d duplicate rows from %s before creating %s", removed, table.name, index.name)
+
+
+def migrate(bind: Engine = engine):
+    """Bring the schema up to date with ``models``.
+
+    Creates missing tables, then adds columns and indexes that were
+    introduced after a table was first created, plus the full-text search
+    index on ``comments``. New columns must be nullable
+    or carry a server default so they can be added to populated tables.
+    """
+    models.Base.metadata.create_all(bind=bind)
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                logger.info("Adding column %s.%s", table.name, column.name)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+    for table in models.Base.metadata.sorted_tables:
+        existing = {i["name"] for i in inspect(bind).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                if index.unique:
+                    _drop_duplicates(bind, table, index)
+                logger.info("Creating index %s", index.name)
+                index.create(bind=bind, checkfirst=True)
+
+    ensure_database_index(bind)
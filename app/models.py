@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, TIMESTAMP
+from sqlalchemy import Column, Index, Integer, String, Text, TIMESTAMP
 from .database import Base
 from sqlalchemy.sql import func
 
@@ -7,23 +7,44 @@ class Comment(Base):
     __tablename__ = "comments"
 
     comment_id = Column(Integer, primary_key=True, index=True)
-    recipe_id = Column(Integer, nullable=False)
-    user_id = Column(Integer, nullable=False)
+    recipe_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
     content = Column(Text, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # Threading: top-level comments have parent_id/root_id NULL. ``path`` is the
+    # zero-padded ids from the root down to this comment ("0000000012/0000000034"),
+    # so a subtree is one (root_id, path) range scan.
+    parent_id = Column(Integer, nullable=True)
+    root_id = Column(Integer, nullable=True)
+    path = Column(String(255), nullable=True)
+    depth = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the author deleted a comment that others had replied to: the
+    # row stays (content cleared) so the replies keep their place in the thread.
+    deleted_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_comments_recipe_parent", "recipe_id", "parent_id", "comment_id"),
+        Index("ix_comments_root_path", "root_id", "path"),
+    )
 
 class Like(Base):
     __tablename__ = "likes"
 
     like_id = Column(Integer, primary_key=True, index=True)
-    recipe_id = Column(Integer, nullable=False)
+    recipe_id = Column(Integer, nullable=False, index=True)
     user_id = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("uq_likes_user_recipe", "user_id", "recipe_id", unique=True),
+        # A user's likes newest first (``like_id`` breaks ties within a timestamp).
+        Index("ix_likes_user_created", "user_id", "created_at", "like_id"),
+    )
+
 class Follow(Base):
     __tablename__ = "follows"
     follower_id = Column(Integer, primary_key=True)
-    following_id = Column(Integer, primary_key=True)
+    following_id = Column(Integer, primary_key=True, index=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
 class SavedRecipe(Base):
@@ -31,5 +52,57 @@ class SavedRecipe(Base):
 
     saved_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
-    recipe_id = Column(Integer, nullable=False)
+    recipe_id = Column(Integer, nullable=False, index=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index("uq_saved_recipes_user_recipe", "user_id", "recipe_id", unique=True),)
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+
+    scope = Column(String(32), primary_key=True)
+    resource_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+class SweepCheckpoint(Base):
+    __tablename__ = "sweep_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    last_key = Column(Integer, nullable=False, default=0)
+    passes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PurgeJob(Base):
+    __tablename__ = "purge_jobs"
+
+    job_id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(16), nullable=False, default="pending")
+    deleted = Column(Text, nullable=False, default="{}")  # JSON {table: rows}
+    error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class OutboxEvent(Base):
+    """Social events for other services, written in the transaction of the change they describe."""
+    __tablename__ = "outbox_events"
+
+    event_id = Column(Integer, primary_key=True, autoincrement=True)
+    event_type = Column(String(64), nullable=False)
+    key = Column(String(64), nullable=False)  # ordering/partition key, e.g. "recipe:10"
+    payload = Column(Text, nullable=False)  # JSON
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    published_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (Index("ix_outbox_events_published", "published_at", "event_id"),)
+
+class EngagementRollup(Base):
+    """Likes, comments and saves per recipe and UTC hour, kept in step by the write paths."""
+    __tablename__ = "engagement_rollups"
+
+    recipe_id = Column(Integer, primary_key=True)
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)  # start of the hour
+    likes = Column(Integer, nullable=False, default=0, server_default="0")
+    comments = Column(Integer, nullable=False, default=0, server_default="0")
+    saves = Column(Integer, nullable=False, default=0, server_default="0")
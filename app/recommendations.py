@@ -0,0 +1,320 @@
+"""Item-item co-occurrence recommendations ("users who liked this also liked").
+
+A build reads every ``(user_id, recipe_id)`` pair from ``likes`` and
+``saved_recipes`` (a like and a save of the same recipe count once) into a
+sparse user × recipe matrix ``X``. ``X.T @ X`` counts, for every pair of
+recipes, the users who interacted with both. It is computed in blocks of
+``RECOMMEND_BLOCK_SIZE`` recipes so peak memory stays bounded. Each count is
+scored by cosine similarity ``co(a, b) / sqrt(n(a) * n(b))``, which keeps
+universally popular recipes from being everyone's neighbour. Only the best
+``RECOMMEND_TOP_N`` neighbours per recipe are kept, in a CSR-style set of
+flat arrays (``Neighbors``).
+
+Users with more than ``RECOMMEND_MAX_USER_ITEMS`` interactions contribute a
+fixed random sample of them: a user's n items add n² pairs, and bulk savers
+say little about similarity.
+
+With ``RECOMMEND_ENABLED`` the model is rebuilt every
+``RECOMMEND_REFRESH_SECONDS``. A rebuild is skipped when the row count and
+highest id of both tables are unchanged. A build peaks at several times the
+model's size, so with ``WEB_CONCURRENCY`` > 1 only one worker per pod builds:
+the one holding an exclusive lock in ``RECOMMEND_BUILD_DIR``. It saves the
+model there and the other workers load that file; if the builder exits, the
+lock passes to another worker. With ``RECOMMEND_MODEL_PATH`` set, no worker
+builds: all of them load the ``.npz`` written by ``python -m app.cli
+build-recommendations`` (e.g. from a CronJob) whenever the file changes.
+Purged recipes are dropped from the answers of the worker that ran the purge
+at once, and from everywhere at the next build.
+
+NumPy and SciPy are imported on first build/load, so they cost nothing when
+recommendations are disabled.
+"""
+import asyncio
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import open_read_session
+from .metrics import recommend_build_seconds, recommend_builds_total, recommend_model_neighbors
+
+logger = logging.getLogger(__name__)
+
+RECOMMEND_ENABLED = os.getenv("RECOMMEND_ENABLED", "false").lower() == "true"
+RECOMMEND_REFRESH_SECONDS = float(os.getenv("RECOMMEND_REFRESH_SECONDS", "3600"))
+RECOMMEND_MODEL_PATH = os.getenv("RECOMMEND_MODEL_PATH", "")
+RECOMMEND_BUILD_DIR = os.getenv("RECOMMEND_BUILD_DIR", "/tmp/recommendations")
+RECOMMEND_TOP_N = int(os.getenv("RECOMMEND_TOP_N", "50"))
+RECOMMEND_MIN_COOCCURRENCE = int(os.getenv("RECOMMEND_MIN_COOCCURRENCE", "2"))
+RECOMMEND_MAX_USER_ITEMS = int(os.getenv("RECOMMEND_MAX_USER_ITEMS", "500"))
+RECOMMEND_BLOCK_SIZE = int(os.getenv("RECOMMEND_BLOCK_SIZE", "512"))
+RECOMMEND_LOAD_CHUNK = 100_000
+
+
+class Neighbors:
+    """Top-N similar recipes per recipe, as flat arrays.
+
+    ``recipe_ids`` is sorted; the neighbours of ``recipe_ids[i]`` are
+    ``recipe_ids[neighbors[indptr[i]:indptr[i + 1]]]`` with ``scores`` over the
+    same slice, best first.
+    """
+
+    def __init__(self, recipe_ids, indptr, neighbors, scores, built_at: float, interactions: int):
+        self.recipe_ids = recipe_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+        self.built_at = built_at
+        self.interactions = interactions
+
+    def similar(self, recipe_id: int, limit: int, exclude: Set[int] = frozenset()) -> List[Tuple[int, float]]:
+        import numpy as np
+
+        position = int(np.searchsorted(self.recipe_ids, recipe_id))
+        if position == len(self.recipe_ids) or self.recipe_ids[position] != recipe_id:
+            return []
+        start, stop = self.indptr[position], self.indptr[position + 1]
+        ids = self.recipe_ids[self.neighbors[start:stop]].tolist()
+        scores = self.scores[start:stop].tolist()
+        return [(i, round(s, 6)) for i, s in zip(ids, scores) if i not in exclude][:limit]
+
+    def save(self, path: str):
+        """Write atomically, so workers polling the file never load a partial model."""
+        import numpy as np
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f, recipe_ids=self.recipe_ids, indptr=self.indptr, neighbors=self.neighbors, scores=self.scores,
+                    meta=np.array([self.built_at, self.interactions], dtype=np.float64),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "Neighbors":
+        import numpy as np
+
+        with np.load(path) as data:
+            built_at, interactions = data["meta"].tolist()
+            return cls(data["recipe_ids"], data["indptr"], data["neighbors"], data["scores"], built_at, int(interactions))
+
+
+def build(user_ids, recipe_ids, top_n: int = RECOMMEND_TOP_N, min_cooccurrence: int = RECOMMEND_MIN_COOCCURRENCE,
+          max_user_items: int = RECOMMEND_MAX_USER_ITEMS, block_size: int = RECOMMEND_BLOCK_SIZE, seed: int = 0) -> Neighbors:
+    """Neighbour model from parallel integer arrays of interactions (duplicates allowed)."""
+    import numpy as np
+    from scipy import sparse
+
+    started = time.time()
+    keys = np.sort((np.asarray(user_ids, dtype=np.int64) << 32) | np.asarray(recipe_ids, dtype=np.int64))
+    keys = keys[np.diff(keys, prepend=keys[:1] - 1) != 0]
+    users = keys >> 32
+    user_index = np.cumsum(np.diff(users, prepend=users[:1]) != 0)
+    items, item_index = np.unique(keys & 0xFFFFFFFF, return_inverse=True)
+
+    if max_user_items and len(keys):
+        # Keys are sorted by user, so each user's rows are contiguous; rank them
+        # in a random order and keep the first max_user_items.
+        order = np.lexsort((np.random.default_rng(seed).random(len(keys)), user_index))
+        rank = np.arange(len(keys)) - np.searchsorted(user_index, user_index[order])
+        keep = np.sort(order[rank < max_user_items])
+        user_index, item_index = user_index[keep], item_index[keep]
+
+    n_users = int(user_index[-1]) + 1 if len(user_index) else 0
+    x = sparse.csr_matrix(
+        (np.ones(len(user_index), dtype=np.float32), (user_index, item_index)), shape=(n_users, len(items))
+    )
+    xt = x.T.tocsr()
+    norms = np.sqrt(np.diff(xt.indptr).astype(np.float32))
+
+    rows_out, cols_out, scores_out = [], [], []
+    for start in range(0, len(items), block_size):
+        block = xt[start:start + block_size] @ x
+        rows = np.repeat(np.arange(start, start + block.shape[0]), np.diff(block.indptr))
+        mask = (rows != block.indices) & (block.data >= min_cooccurrence)
+        rows, cols, counts = rows[mask], block.indices[mask], block.data[mask]
+        scores = counts / (norms[rows] * norms[cols])
+
+        # Rows stay contiguous. Only recipes with more than top_n candidates
+        # need a selection: everything above the top_n-th best score, then the
+        # smallest recipe ids among those tied with it.
+        bounds = np.searchsorted(rows, np.arange(start, start + block.shape[0] + 1))
+        keep = np.ones(len(rows), dtype=bool)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if hi - lo <= top_n:
+                continue
+            row_scores = scores[lo:hi]
+            kth = np.partition(row_scores, hi - lo - top_n)[hi - lo - top_n]
+            selected = row_scores > kth
+            tied = np.flatnonzero(row_scores == kth)
+            tied = tied[np.argsort(cols[lo:hi][tied], kind="stable")][:top_n - int(selected.sum())]
+            selected[tied] = True
+            keep[lo:hi] = selected
+        rows_out.append(rows[keep])
+        cols_out.append(cols[keep].astype(np.int32))
+        scores_out.append(scores[keep].astype(np.float32))
+
+    rows = np.concatenate(rows_out) if rows_out else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols_out) if cols_out else np.empty(0, dtype=np.int32)
+    scores = np.concatenate(scores_out) if scores_out else np.empty(0, dtype=np.float32)
+    # Best first within each recipe, ties broken by the smaller recipe id.
+    order = np.lexsort((cols, -scores, rows))
+    indptr = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(items)), out=indptr[1:])
+    return Neighbors(
+        items,
+        indptr,
+        cols[order],
+        scores[order],
+        built_at=started,
+        interactions=len(user_index),
+    )
+
+
+def _signature(db) -> tuple:
+    """Changes whenever a like or save is added or removed."""
+    return tuple(
+        db.execute(select(func.count(), func.max(pk))).one()
+        for pk in (models.Like.like_id, models.SavedRecipe.saved_id)
+    )
+
+
+def load_interactions(db):
+    """All ``(user_id, recipe_id)`` pairs of likes and saves as two int64 arrays."""
+    import numpy as np
+
+    chunks = []
+    for model in (models.Like, models.SavedRecipe):
+        result = db.execute(select(model.user_id, model.recipe_id).execution_options(yield_per=RECOMMEND_LOAD_CHUNK))
+        for partition in result.partitions():
+            chunks.append(np.array(partition, dtype=np.int64).reshape(-1, 2))
+    pairs = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def build_from_database(**options) -> Neighbors:
+    db = open_read_session()
+    try:
+        user_ids, recipe_ids = load_interactions(db)
+    finally:
+        db.close()
+    return build(user_ids, recipe_ids, **options)
+
+
+class Recommender:
+    """The model this worker serves from, and how it is kept fresh."""
+
+    def __init__(self, path: str = RECOMMEND_MODEL_PATH, build_dir: Optional[str] = None):
+        self.path = path
+        if build_dir is None and not path and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            build_dir = RECOMMEND_BUILD_DIR
+        # Set when the workers of this pod share one build; see _is_builder.
+        self.build_dir = build_dir if not path else None
+        self.model: Optional[Neighbors] = None
+        self._signature = None
+        self._mtime = None
+        self._build_lock = None
+        # Purged since the model was built; see forget_recipe.
+        self._removed: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def similar(self, recipe_id: int, limit: int) -> List[Tuple[int, float]]:
+        model, removed = self.model, self._removed
+        if model is None or recipe_id in removed:
+            return []
+        return model.similar(recipe_id, limit, exclude=removed)
+
+    def forget_recipe(self, recipe_id: int):
+        with self._lock:
+            self._removed = self._removed | {recipe_id}
+
+    def _install(self, model: Neighbors):
+        with self._lock:
+            self.model = model
+            self._removed = set()
+        recommend_model_neighbors.set(len(model.neighbors))
+
+    @property
+    def _shared_path(self) -> str:
+        return os.path.join(self.build_dir, "similar.npz")
+
+    def _is_builder(self) -> bool:
+        """Whether this worker builds for the pod. The lock is held until the process exits."""
+        if self._build_lock is None:
+            os.makedirs(self.build_dir, exist_ok=True)
+            lock = open(os.path.join(self.build_dir, "build.lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return False
+            self._build_lock = lock
+            logger.info("This worker builds recommendations into %s", self.build_dir)
+        return True
+
+    def _loads_file(self) -> bool:
+        return bool(self.path) or (self.build_dir is not None and not self._is_builder())
+
+    def _reload(self, path: str) -> bool:
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._install(Neighbors.load(path))
+        self._mtime = mtime
+        recommend_builds_total.labels(result="loaded").inc()
+        return True
+
+    def refresh(self) -> bool:
+        """Rebuild (or reload from a file) if the data changed. Returns whether the model was replaced."""
+        if self._loads_file():
+            return self._reload(self.path or self._shared_path)
+
+        db = open_read_session()
+        try:
+            signature = _signature(db)
+        finally:
+            db.close()
+        if signature == self._signature and self.model is not None:
+            recommend_builds_total.labels(result="unchanged").inc()
+            return False
+        started = time.perf_counter()
+        model = build_from_database()
+        recommend_build_seconds.observe(time.perf_counter() - started)
+        if self.build_dir is not None:
+            model.save(self._shared_path)
+        self._install(model)
+        self._signature = signature
+        recommend_builds_total.labels(result="built").inc()
+        logger.info(
+            "Built recommendations for %d recipes from %d interactions in %.2fs",
+            len(model.recipe_ids), model.interactions, time.perf_counter() - started,
+        )
+        return True
+
+    async def run_forever(self, interval: float = RECOMMEND_REFRESH_SECONDS):
+        while True:
+            try:
+                await run_in_threadpool(self.refresh)
+            except Exception:
+                recommend_builds_total.labels(result="error").inc()
+                logger.exception("Refreshing recommendations failed")
+            # Reloading a file is cheap, so check it more often than a build would run.
+            await asyncio.sleep(min(interval, 30.0) if self._loads_file() else interval)
+
+
+recommender = Recommender()
@@ -0,0 +1,230 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.responses import PlainTextResponse
+from .. import schemas
+from ..utils.auth import require_internal_token
+from ..utils import memory
+from ..utils.profiler import profiler, to_collapsed
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_internal_token)])
+
+ERROR_403 = {
+    "model": schemas.ErrorResponse,
+    "description": "Forbidden",
+    "content": {"application/json": {"example": {"detail": "Invalid internal token"}}},
+}
+ERROR_404 = {
+    "model": schemas.ErrorResponse,
+    "description": "Not found",
+    "content": {"application/json": {"example": {"detail": "No profile for route"}}},
+}
+ERROR_409 = {
+    "model": schemas.ErrorResponse,
+    "description": "tracemalloc is not tracing",
+    "content": {"application/json": {"example": {"detail": "tracemalloc is not tracing"}}},
+}
+GROUP_BY_QUERY = Query("lineno", pattern="^(lineno|filename|traceback)$", description="lineno, filename or traceback")
+
+
+@router.get(
+    "/profiles",
+    response_model=list[schemas.RouteProfile],
+    summary="List collected request profiles",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": [{"route": "/comments/{recipe_id}", "requests": 12, "samples": 340, "seconds": 1.9, "stacks": 87}]
+                }
+            },
+        },
+        403: ERROR_403,
+    },
+)
+def list_profiles():
+    profiles = profiler.collect()
+    return sorted(
+        (
+            {"route": route, "requests": p["requests"], "samples": p["samples"], "seconds": p["seconds"], "stacks": len(p["stacks"])}
+            for route, p in profiles.items()
+        ),
+        key=lambda p: -p["samples"],
+    )
+
+
+@router.get(
+    "/profiles/collapsed",
+    response_class=PlainTextResponse,
+    summary="Collapsed stacks for one route (flamegraph.pl / speedscope input)",
+    responses={
+        200: {"description": "OK", "content": {"text/plain": {"example": "run (base_events.py:640);... 12\n"}}},
+        403: ERROR_403,
+        404: ERROR_404,
+    },
+)
+def get_profile(route: str = Query(..., description="route template, e.g. /comments/{recipe_id}")):
+    profile = profiler.collect().get(route)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile for route")
+    return PlainTextResponse(to_collapsed(profile["stacks"]))
+
+
+@router.delete(
+    "/profiles",
+    status_code=204,
+    summary="Discard collected profiles",
+    responses={204: {"description": "Deleted"}, 403: ERROR_403},
+)
+def reset_profiles():
+    profiler.reset()
+    return None
+
+
+@router.get(
+    "/memory",
+    response_model=schemas.MemoryStatus,
+    summary="Memory usage of this worker",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "pid": 12, "rss_bytes": 148897792, "tracing": True, "frames": 10,
+                        "traced_bytes": 52428800, "traced_peak_bytes": 81788928,
+                        "snapshots": [{"snapshot_id": 1, "pid": 12, "taken_at": 1735732800.0, "traced_bytes": 52101120}],
+                    }
+                }
+            },
+        },
+        403: ERROR_403,
+    },
+)
+def get_memory():
+    memory.update_gauges()
+    return memory.memory_status()
+
+
+@router.post(
+    "/memory/tracing",
+    response_model=schemas.MemoryStatus,
+    summary="Start tracemalloc",
+    responses={200: {"description": "Tracing"}, 403: ERROR_403},
+)
+def start_memory_tracing(frames: int = Query(10, ge=1, le=100, description="frames kept per allocation")):
+    """Restarting with a different ``frames`` discards existing snapshots."""
+    memory.start_tracing(frames)
+    return memory.memory_status()
+
+
+@router.delete(
+    "/memory/tracing",
+    status_code=204,
+    summary="Stop tracemalloc and discard snapshots",
+    responses={204: {"description": "Stopped"}, 403: ERROR_403},
+)
+def stop_memory_tracing():
+    memory.stop_tracing()
+    return None
+
+
+@router.post(
+    "/memory/snapshots",
+    response_model=schemas.MemorySnapshot,
+    status_code=201,
+    summary="Take a tracemalloc snapshot",
+    responses={201: {"description": "Created"}, 403: ERROR_403, 409: ERROR_409},
+)
+def take_memory_snapshot():
+    try:
+        entry = memory.snapshots.take()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return entry
+
+
+def _snapshot(snapshot_id: int):
+    entry = memory.snapshots.get(snapshot_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot {snapshot_id}")
+    return entry
+
+
+@router.get(
+    "/memory/snapshots/{snapshot_id}/top",
+    response_model=list[schemas.AllocationSite],
+    summary="Largest allocation sites in a snapshot",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {"application/json": {"example": [{"site": "app/crud/comments.py:42", "size_bytes": 2097152, "count": 8120}]}},
+        },
+        403: ERROR_403,
+        404: ERROR_404,
+    },
+)
+def top_memory(snapshot_id: int, group_by: str = GROUP_BY_QUERY, limit: int = Query(20, ge=1, le=500)):
+    return memory.top_allocations(_snapshot(snapshot_id)["snapshot"], group_by, limit)
+
+
+@router.get(
+    "/memory/snapshots/{snapshot_id}/diff",
+    response_model=list[schemas.AllocationDiff],
+    summary="Allocation sites that grew since another snapshot",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"site": "app/crud/comments.py:42", "size_bytes": 2097152, "size_diff_bytes": 1048576, "count": 8120, "count_diff": 4060}
+                    ]
+                }
+            },
+        },
+        403: ERROR_403,
+        404: ERROR_404,
+        409: ERROR_409,
+    },
+)
+def diff_memory(
+    snapshot_id: int,
+    base: int = Query(..., description="id of the earlier snapshot"),
+    group_by: str = GROUP_BY_QUERY,
+    limit: int = Query(20, ge=1, le=500),
+):
+    before, after = _snapshot(base), _snapshot(snapshot_id)
+    if before["pid"] != after["pid"]:
+        raise HTTPException(status_code=409, detail=f"Snapshots {base} and {snapshot_id} are from different workers")
+    return memory.diff_allocations(before["snapshot"], after["snapshot"], group_by, limit)
+
+
+@router.get(
+    "/memory/routes",
+    response_model=list[schemas.RouteMemory],
+    summary="Peak heap growth per route (MEMORY_TRACK_ROUTES)",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": [{"route": "/comments/recipe/{recipe_id}", "requests": 40, "max_peak_bytes": 9437184, "mean_peak_bytes": 2097152}]
+                }
+            },
+        },
+        403: ERROR_403,
+    },
+)
+def route_memory():
+    return memory.routes.collect()
+
+
+@router.delete(
+    "/memory/routes",
+    status_code=204,
+    summary="Discard per-route memory statistics",
+    responses={204: {"description": "Deleted"}, 403: ERROR_403},
+)
+def reset_route_memory():
+    memory.routes.reset()
+    return None
@@ -1,22 +1,37 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, Body
 from sqlalchemy.orm import Session
-from ..database import SessionLocal
-import httpx
+from ..database import SessionLocal, has_sticky_users, open_read_session, read_target, run_in_session_like
 from .. import schemas
-from ..crud.comments import create_comment as create_comment_crud, get_comment, delete_comment as delete_comment_crud, get_comments_for_recipe, count_comments
-from ..utils.auth import get_current_user_id
-from ..metrics import comments_total
+from ..crud.comments import create_comment as create_comment_crud, get_comment, delete_comment as delete_comment_crud, get_comments_for_recipe, count_comments, search_comments, get_comment_threads, get_replies, MAX_COMMENT_DEPTH
+from ..utils.upstream import recipes, verify_exists
+from ..utils import live
+from ..utils.rate_limit import rate_limit
+from ..utils.auth import get_current_user_id, peek_user_id
+from ..metrics import comments_total, search_queries_total
+from ..search import backend as search_backend
+from ..crud.versions import RECIPE_COMMENTS
+from ..utils.http_cache import check_not_modified
+from ..utils.singleflight import SingleFlight
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/comments", tags=["Comments"])
 
+# Keyed by (recipe_id, ETag, read target): callers only share a read of the same watermark
+# version from the same database, so a sticky primary read never reuses a replica result.
+count_flight = SingleFlight("count_comments")
+
 EXAMPLE_COMMENT = {
     "comment_id": 1,
     "recipe_id": 10,
     "user_id": 2,
     "content": "Great recipe!",
     "created_at": "2025-01-01T12:00:00",
+    "parent_id": None,
+    "depth": 0,
 }
+EXAMPLE_REPLY = {**EXAMPLE_COMMENT, "comment_id": 2, "content": "Agreed!", "parent_id": 1, "depth": 1}
 
 ERROR_401 = {
     "model": schemas.ErrorResponse,
@@ -33,6 +48,11 @@ ERROR_404 = {
     "description": "Not found",
     "content": {"application/json": {"example": {"detail": "Comment not found"}}},
 }
+ERROR_429 = {
+    "model": schemas.ErrorResponse,
+    "description": "Too many requests",
+    "content": {"application/json": {"example": {"detail": "Too many requests"}}},
+}
 ERROR_502 = {
     "model": schemas.ErrorResponse,
     "description": "Upstream error",
@@ -51,16 +71,26 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    user_id = peek_user_id(request) if has_sticky_users() else None
+    db = open_read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
 @router.post(
     "/{recipe_id}",
     response_model=schemas.Comment,
     status_code=status.HTTP_201_CREATED,
     summary="Create comment",
+    dependencies=[Depends(rate_limit("comment"))],
     responses={
         201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_COMMENT}}},
         401: ERROR_401,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -68,7 +98,10 @@ async def create_comment(
     recipe_id: int,
     comment: schemas.CommentCreate = Body(
         ...,
-        examples={"example": {"value": {"content": "Great recipe!"}}},
+        examples={
+            "example": {"value": {"content": "Great recipe!"}},
+            "reply": {"value": {"content": "Agreed!", "parent_id": 1}},
+        },
     ),
     user_id: int = Depends(get_current_user_id), 
     db: Session = Depends(get_db),
@@ -76,18 +109,26 @@ async def create_comment(
     status_ = "success"
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{RECIPE_SERVICE_URL}/{recipe_id}")
-            if response.status_code != 200:
-                status_ = "error"
-                raise HTTPException(status_code=404, detail="Recipe not found")
+        parent = None
+        if comment.parent_id is not None:
+            parent = await run_in_threadpool(get_comment, db, comment_id=comment.parent_id)
+            if not parent or parent.recipe_id != recipe_id:
+                raise HTTPException(status_code=404, detail="Parent comment not found")
+            if parent.depth >= MAX_COMMENT_DEPTH:
+                raise HTTPException(status_code=422, detail="Replies are nested too deeply")
 
-        new_comment = create_comment_crud(
+        await verify_exists(recipes, recipe_id, "comment", "Recipe not found")
+
+        new_comment = await run_in_threadpool(
+            create_comment_crud,
             db=db,
             comment=comment,
             user_id=user_id,
             recipe_id=recipe_id,
+            parent=parent,
         )
+        await live.publish_async(recipe_id, {"type": "comment_count", "delta": 1})
+        await live.publish_async(recipe_id, {"type": "comment", "comment": _as_dict(new_comment)})
         return new_comment
 
     except HTTPException:
@@ -115,7 +156,7 @@ async def create_comment(
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def read_comment(comment_id: int, db: Session = Depends(get_db)):
+def read_comment(comment_id: int, db: Session = Depends(get_read_db)):
     comment = get_comment(db, comment_id=comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
@@ -128,25 +169,113 @@ def read_comment(comment_id: int, db: Session = Depends(get_db)):
     summary="List comments for recipe",
     responses={
         200: {"description": "OK", "content": {"application/json": {"example": [EXAMPLE_COMMENT]}}},
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_all_comments(recipe_id: int, db: Session = Depends(get_db)):
+def get_all_comments(recipe_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = check_not_modified(request, response, db, RECIPE_COMMENTS, recipe_id, "comments-list")
+    if not_modified is not None:
+        return not_modified
+
     all_comments = get_comments_for_recipe(db, recipe_id=recipe_id)
 
     return all_comments
 
+def _as_dict(comment) -> dict:
+    return schemas.Comment.model_validate(comment, from_attributes=True).model_dump()
+
+
+@router.get(
+    "/recipe/{recipe_id}/threads",
+    response_model=schemas.CommentThreadPage,
+    summary="List comment threads for recipe",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "recipe_id": 10,
+                        "threads": [{**EXAMPLE_COMMENT, "reply_count": 1, "replies": [EXAMPLE_REPLY]}],
+                        "next_cursor": None,
+                    }
+                }
+            },
+        },
+        304: {"description": "Not modified"},
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_comment_threads_endpoint(
+    recipe_id: int,
+    request: Request,
+    response: Response,
+    after: int = Query(0, ge=0, description="comment_id cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    replies: int = Query(3, ge=0, le=20, description="replies returned per thread"),
+    db: Session = Depends(get_read_db),
+):
+    not_modified = check_not_modified(request, response, db, RECIPE_COMMENTS, recipe_id, "comments-threads")
+    if not_modified is not None:
+        return not_modified
+
+    threads = get_comment_threads(db, recipe_id, after=after, limit=limit, replies=replies)
+    return {
+        "recipe_id": recipe_id,
+        "threads": [
+            {**_as_dict(comment), "reply_count": reply_count, "replies": [_as_dict(r) for r in thread_replies]}
+            for comment, reply_count, thread_replies in threads
+        ],
+        "next_cursor": threads[-1][0].comment_id if len(threads) == limit else None,
+    }
+
+
+@router.get(
+    "/comment/{comment_id}/replies",
+    response_model=schemas.CommentRepliesResponse,
+    summary="Expand replies of a comment",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {"application/json": {"example": {"comment_id": 1, "replies": [EXAMPLE_REPLY], "next_cursor": None}}},
+        },
+        404: ERROR_404,
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_comment_replies(
+    comment_id: int,
+    after: Optional[str] = Query(None, max_length=255, description="cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+):
+    comment = get_comment(db, comment_id=comment_id)
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+
+    replies = get_replies(db, comment, after=after, limit=limit)
+    return {
+        "comment_id": comment_id,
+        "replies": replies,
+        "next_cursor": replies[-1].path if len(replies) == limit else None,
+    }
+
 @router.delete(
     "/{comment_id}",
     status_code=204,
-    summary="Delete comment",
+    summary="Delete comment and its replies (tombstone if others replied)",
+    dependencies=[Depends(rate_limit("comment"))],
     responses={
         204: {"description": "Deleted"},
         401: ERROR_401,
         403: ERROR_403,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
@@ -163,7 +292,9 @@ def delete_comment(
     if comment.user_id != user_id:
         raise HTTPException(status_code=403, detail="You can delete only your own comments")
     
-    delete_comment_crud(db, comment_id)
+    deleted = delete_comment_crud(db, comment_id)
+    if deleted:
+        live.publish(comment.recipe_id, {"type": "comment_count", "delta": -len(deleted), "deleted_ids": deleted})
 
     return None
 
@@ -176,11 +307,66 @@ def delete_comment(
             "description": "OK",
             "content": {"application/json": {"example": {"recipe_id": 10, "comment_count": 2}}},
         },
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def count_comments_endpoint(recipe_id: int, db: Session = Depends(get_db)):
-    count = count_comments(db, recipe_id=recipe_id)
+async def count_comments_endpoint(recipe_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = await run_in_threadpool(check_not_modified, request, response, db, RECIPE_COMMENTS, recipe_id, "comments-count")
+    if not_modified is not None:
+        return not_modified
+
+    count = await count_flight.do(
+        (recipe_id, response.headers["ETag"], read_target(db)),
+        lambda: run_in_threadpool(run_in_session_like, db, count_comments, recipe_id),
+    )
     return {"recipe_id": recipe_id, "comment_count": count}
-    
+
+
+@router.get(
+    "/search",
+    response_model=schemas.CommentSearchResponse,
+    summary="Search comments",
+    responses={
+        200: {
+            "description": "OK",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "query": "great",
+                        "total": 1,
+                        "page": 1,
+                        "size": 20,
+                        "results": [{**EXAMPLE_COMMENT, "score": 1.23}],
+                    }
+                }
+            },
+        },
+        422: {"description": "Validation error"},
+        502: {"model": schemas.ErrorResponse, "description": "Search backend error"},
+    },
+)
+def search_comments_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    recipe_id: Optional[int] = None,
+    page: int = Query(1, ge=1),
+    size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    status_ = "success"
+
+    try:
+        total, hits = search_comments(db, q, recipe_id=recipe_id, page=page, size=size)
+        results = [{**_as_dict(comment), "score": score} for comment, score in hits]
+        return {"query": q, "total": total, "page": page, "size": size, "results": results}
+
+    except Exception as e:
+        status_ = "error"
+        raise HTTPException(status_code=502, detail=str(e))
+
+    finally:
+        search_queries_total.labels(
+            backend=search_backend.name,
+            status=status_,
+        ).inc()
@@ -1,15 +1,25 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from ..database import SessionLocal
-import httpx
+from ..database import SessionLocal, has_sticky_users, open_read_session, read_target, run_in_session_like
 from .. import schemas
 from ..crud.follow import follow_user, get_follow, get_followers, get_following, unfollow_user
-from ..utils.auth import get_current_user_id
+from ..utils.upstream import users, verify_exists
+from ..utils.rate_limit import rate_limit
+from ..utils.auth import get_current_user_id, peek_user_id
 from ..metrics import follows_total
+from ..crud.versions import USER_FOLLOWERS, USER_FOLLOWING
+from ..utils.http_cache import check_not_modified
+from ..utils.singleflight import SingleFlight
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/follows", tags=["Follows"])
 
+# Keyed by (user_id, ETag, read target): callers only share a read of the same watermark
+# version from the same database, so a sticky primary read never reuses a replica result.
+followers_flight = SingleFlight("get_followers")
+following_flight = SingleFlight("get_following")
+
 EXAMPLE_FOLLOW = {
     "follower_id": 1,
     "following_id": 2,
@@ -31,6 +41,11 @@ ERROR_404 = {
     "description": "Not found",
     "content": {"application/json": {"example": {"detail": "User to follow not found"}}},
 }
+ERROR_429 = {
+    "model": schemas.ErrorResponse,
+    "description": "Too many requests",
+    "content": {"application/json": {"example": {"detail": "Too many requests"}}},
+}
 ERROR_502 = {
     "model": schemas.ErrorResponse,
     "description": "Upstream error",
@@ -51,17 +66,27 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    user_id = peek_user_id(request) if has_sticky_users() else None
+    db = open_read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
 @router.post(
     "/{following_id}",
     response_model=schemas.Follow,
     status_code=status.HTTP_201_CREATED,
     summary="Follow user",
+    dependencies=[Depends(rate_limit("follow"))],
     responses={
         201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_FOLLOW}}},
         400: ERROR_400,
         401: ERROR_401,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -76,19 +101,15 @@ async def create_follow(following_id: int,
             status_ ="error"
             raise HTTPException(status_code=400, detail="Cannot follow yourself")
         
-        existing = get_follow(db, follower_id=follower_id, following_id=following_id)
+        existing = await run_in_threadpool(get_follow, db, follower_id=follower_id, following_id=following_id)
         if existing:
             status_ ="error"
             raise HTTPException(status_code=400, detail="Already following this user")
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{USER_SERVICE_URL}/{following_id}")
-            if response.status_code != 200:
-                status_ ="error"
-                raise HTTPException(status_code=404, detail="User to follow not found")
+        await verify_exists(users, following_id, "follow", "User to follow not found")
             
         
-        follow = follow_user(db, follower_id=follower_id, following_id=following_id)
+        follow = await run_in_threadpool(follow_user, db, follower_id=follower_id, following_id=following_id)
 
         
         return follow
@@ -111,11 +132,13 @@ async def create_follow(following_id: int,
     "/{following_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Unfollow user",
+    dependencies=[Depends(rate_limit("follow"))],
     responses={
         204: {"description": "Deleted"},
         401: ERROR_401,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -156,7 +179,7 @@ def delete_follow(following_id: int, follower_id: int = Depends(get_current_user
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_my_followers(follower_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def get_my_followers(follower_id: int = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
 
     followers = get_followers(db, user_id=follower_id)
 
@@ -173,7 +196,7 @@ def get_my_followers(follower_id: int = Depends(get_current_user_id), db: Sessio
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_my_following(follower_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+def get_my_following(follower_id: int = Depends(get_current_user_id), db: Session = Depends(get_read_db)):
 
     following = get_following(db, user_id=follower_id)
 
@@ -185,13 +208,20 @@ def get_my_following(follower_id: int = Depends(get_current_user_id), db: Sessio
     summary="List followers for a user",
     responses={
         200: {"description": "OK", "content": {"application/json": {"example": [EXAMPLE_FOLLOW]}}},
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_user_followers(user_id: int, db: Session = Depends(get_db)):
+async def get_user_followers(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = await run_in_threadpool(check_not_modified, request, response, db, USER_FOLLOWERS, user_id, "followers-list")
+    if not_modified is not None:
+        return not_modified
 
-    followers = get_followers(db, user_id=user_id)
+    followers = await followers_flight.do(
+        (user_id, response.headers["ETag"], read_target(db)),
+        lambda: run_in_threadpool(run_in_session_like, db, get_followers, user_id),
+    )
 
     return followers
 
@@ -201,13 +231,20 @@ def get_user_followers(user_id: int, db: Session = Depends(get_db)):
     summary="List following for a user",
     responses={
         200: {"description": "OK", "content": {"application/json": {"example": [EXAMPLE_FOLLOW]}}},
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_user_following(user_id: int, db: Session = Depends(get_db)):
-
-    following = get_following(db, user_id=user_id)
+async def get_user_following(user_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = await run_in_threadpool(check_not_modified, request, response, db, USER_FOLLOWING, user_id, "following-list")
+    if not_modified is not None:
+        return not_modified
+
+    following = await following_flight.do(
+        (user_id, response.headers["ETag"], read_target(db)),
+        lambda: run_in_threadpool(run_in_session_like, db, get_following, user_id),
+    )
 
     return following
 
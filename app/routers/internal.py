@@ -0,0 +1,123 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Body, status
+from sqlalchemy.orm import Session
+from ..database import SessionLocal
+from .. import schemas
+from ..crud.cleanup import delete_recipe_rows, delete_user_rows
+from ..utils.auth import require_internal_token
+from ..metrics import deletion_events_total
+from ..workers import purge
+
+router = APIRouter(prefix="/internal", tags=["Internal"], dependencies=[Depends(require_internal_token)])
+
+RECIPE_DELETED = "recipe.deleted"
+USER_DELETED = "user.deleted"
+
+ERROR_403 = {
+    "model": schemas.ErrorResponse,
+    "description": "Forbidden",
+    "content": {"application/json": {"example": {"detail": "Invalid internal token"}}},
+}
+ERROR_400 = {
+    "model": schemas.ErrorResponse,
+    "description": "Bad request",
+    "content": {"application/json": {"example": {"detail": "Unsupported event type"}}},
+}
+ERROR_404 = {
+    "model": schemas.ErrorResponse,
+    "description": "Not found",
+    "content": {"application/json": {"example": {"detail": "Purge job not found"}}},
+}
+
+EXAMPLE_PURGE_JOB = {
+    "job_id": "5f0c7c2e-8a53-4d8e-9d1b-2f8f3c1d9a10",
+    "user_id": 2,
+    "status": "running",
+    "deleted": {"likes": 12000, "comments": 3000},
+    "error": None,
+    "created_at": "2025-01-01T12:00:00",
+    "updated_at": "2025-01-01T12:00:05",
+}
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@router.post(
+    "/events",
+    response_model=schemas.CascadeResponse,
+    summary="Ingest recipe/user deletion event",
+    responses={
+        200: {
+            "description": "Cascade applied",
+            "content": {
+                "application/json": {
+                    "example": {"type": "recipe.deleted", "deleted": {"likes": 12, "comments": 3, "saved": 4}}
+                }
+            },
+        },
+        400: ERROR_400,
+        403: ERROR_403,
+        422: {"description": "Validation error"},
+    },
+)
+def ingest_event(
+    event: schemas.DeletionEvent = Body(
+        ...,
+        examples={"recipe": {"value": {"type": "recipe.deleted", "recipe_id": 10}}},
+    ),
+    db: Session = Depends(get_db),
+):
+    """Cascade-delete social rows for a deleted recipe or user. Replaying an event is a no-op."""
+    if event.type == RECIPE_DELETED and event.recipe_id is not None:
+        deleted = delete_recipe_rows(db, event.recipe_id)
+    elif event.type == USER_DELETED and event.user_id is not None:
+        deleted = delete_user_rows(db, event.user_id)
+    else:
+        deletion_events_total.labels(type=event.type, status="error").inc()
+        raise HTTPException(status_code=400, detail="Unsupported event type")
+
+    deletion_events_total.labels(type=event.type, status="success").inc()
+    return {"type": event.type, "deleted": deleted}
+
+
+@router.post(
+    "/users/{user_id}/purge",
+    response_model=schemas.PurgeJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Start purging all social rows of a deleted user",
+    responses={
+        202: {"description": "Purge started", "content": {"application/json": {"example": {**EXAMPLE_PURGE_JOB, "status": "pending", "deleted": {}}}}},
+        403: ERROR_403,
+        422: {"description": "Validation error"},
+    },
+)
+def start_user_purge(user_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Delete the user's likes, comments, saves and follow edges in chunked transactions, in the background.
+
+    Poll ``GET /internal/purges/{job_id}`` for progress.
+    """
+    job = purge.create_job(db, user_id)
+    background_tasks.add_task(purge.run_job_in_background, job.job_id)
+    return purge.job_to_dict(job)
+
+
+@router.get(
+    "/purges/{job_id}",
+    response_model=schemas.PurgeJobResponse,
+    summary="Purge job progress",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_PURGE_JOB}}},
+        403: ERROR_403,
+        404: ERROR_404,
+    },
+)
+def get_user_purge(job_id: str, db: Session = Depends(get_db)):
+    job = purge.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Purge job not found")
+    return purge.job_to_dict(job)
@@ -1,9 +1,8 @@
 import os
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from ..database import SessionLocal
-import httpx
+from ..database import SessionLocal, has_sticky_users, open_read_session, read_target, run_in_session_like
 from .. import schemas, models
 from ..crud.likes import (
     create_like as create_like_crud,
@@ -12,12 +11,28 @@ from ..crud.likes import (
     get_likes_for_recipe,
     count_likes,
     get_like_by_user_and_recipe,
+    put_like,
+    delete_like_for_recipe,
+    liked_recipe_ids,
+    get_likes_for_user,
 )
-from ..utils.auth import get_current_user_id
+from ..utils.upstream import recipes, verify_exists
+from ..utils import live
+from ..utils.membership import liked as liked_index
+from ..utils.rate_limit import rate_limit
+from ..utils.auth import get_current_user_id, peek_user_id
 from ..metrics import likes_total
+from ..crud.versions import RECIPE_LIKES
+from ..utils.http_cache import check_not_modified
+from ..utils.singleflight import SingleFlight
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/likes", tags=["Likes"])
 
+# Keyed by (recipe_id, ETag, read target): callers only share a read of the same watermark
+# version from the same database, so a sticky primary read never reuses a replica result.
+count_flight = SingleFlight("count_likes")
+
 EXAMPLE_LIKE = {
     "like_id": 1,
     "recipe_id": 10,
@@ -25,6 +40,8 @@ EXAMPLE_LIKE = {
     "created_at": "2025-01-01T12:00:00",
 }
 
+# Upper bound on ids per batch membership check (one page of recipe cards).
+MAX_CHECK_IDS = 200
 ERROR_400 = {
     "model": schemas.ErrorResponse,
     "description": "Bad request",
@@ -45,6 +62,16 @@ ERROR_404 = {
     "description": "Not found",
     "content": {"application/json": {"example": {"detail": "Like not found"}}},
 }
+ERROR_409 = {
+    "model": schemas.ErrorResponse,
+    "description": "Conflict",
+    "content": {"application/json": {"example": {"detail": "Like was removed concurrently, retry"}}},
+}
+ERROR_429 = {
+    "model": schemas.ErrorResponse,
+    "description": "Too many requests",
+    "content": {"application/json": {"example": {"detail": "Too many requests"}}},
+}
 ERROR_502 = {
     "model": schemas.ErrorResponse,
     "description": "Upstream error",
@@ -64,17 +91,27 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db(request: Request):
+    user_id = peek_user_id(request) if has_sticky_users() else None
+    db = open_read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
 @router.post(
     "/{recipe_id}",
     response_model=schemas.Like,
     status_code=status.HTTP_201_CREATED,
     summary="Like recipe",
+    dependencies=[Depends(rate_limit("like"))],
     responses={
         201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_LIKE}}},
         400: ERROR_400,
         401: ERROR_401,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -84,19 +121,54 @@ async def create_like(recipe_id: int,
     status_ = "success"
     action = "like"
     try:
-        existing = get_like_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
-        if existing:
-            status_ ="error"
+        await verify_exists(recipes, recipe_id, "like", "Recipe not found")
+
+        new_like = await run_in_threadpool(create_like_crud, db=db, user_id=user_id, recipe_id=recipe_id)
+        if new_like is None:
             raise HTTPException(status_code=400, detail="Recipe already liked")
+        await live.publish_async(recipe_id, {"type": "like_count", "delta": 1})
+        return new_like
+    except HTTPException:
+        status_ = "error"
+        raise
+    except Exception as e:
+        status_ = "error"
+        raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        likes_total.labels(source="api", action=action, status=status_).inc()
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{RECIPE_SERVICE_URL}/{recipe_id}")
-            if response.status_code != 200:
-                status_ ="error"
-                raise HTTPException(status_code=404, detail="Recipe not found")
+@router.put(
+    "/{recipe_id}",
+    response_model=schemas.Like,
+    summary="Like recipe (idempotent)",
+    dependencies=[Depends(rate_limit("like"))],
+    responses={
+        200: {"description": "Already liked", "content": {"application/json": {"example": EXAMPLE_LIKE}}},
+        201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_LIKE}}},
+        401: ERROR_401,
+        404: ERROR_404,
+        409: ERROR_409,
+        422: {"description": "Validation error"},
+        429: ERROR_429,
+        502: ERROR_502,
+    },
+)
+async def put_like_endpoint(recipe_id: int,
+                            response: Response,
+                            user_id: int = Depends(get_current_user_id),
+                            db: Session = Depends(get_db)):
+    status_ = "success"
+    action = "like"
+    try:
+        await verify_exists(recipes, recipe_id, "like", "Recipe not found")
 
-        new_like = create_like_crud(db=db, user_id=user_id, recipe_id=recipe_id)
-        return new_like
+        like, created = await run_in_threadpool(put_like, db, user_id=user_id, recipe_id=recipe_id)
+        if like is None:
+            raise HTTPException(status_code=409, detail="Like was removed concurrently, retry")
+        if created:
+            await live.publish_async(recipe_id, {"type": "like_count", "delta": 1})
+        response.status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return like
     except HTTPException:
         status_ = "error"
         raise
@@ -117,7 +189,7 @@ async def create_like(recipe_id: int,
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def read_like(like_id: int, db: Session = Depends(get_db)):
+def read_like(like_id: int, db: Session = Depends(get_read_db)):
     like = get_like(db, like_id=like_id)
     if not like:
         raise HTTPException(status_code=404, detail="Like not found")
@@ -130,11 +202,16 @@ def read_like(like_id: int, db: Session = Depends(get_db)):
     summary="List likes for recipe",
     responses={
         200: {"description": "OK", "content": {"application/json": {"example": [EXAMPLE_LIKE]}}},
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def get_all_likes(recipe_id: int, db: Session = Depends(get_db)):
+def get_all_likes(recipe_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = check_not_modified(request, response, db, RECIPE_LIKES, recipe_id, "likes-list")
+    if not_modified is not None:
+        return not_modified
+
     all_likes = get_likes_for_recipe(db, recipe_id=recipe_id)
 
     return all_likes
@@ -154,21 +231,108 @@ def get_all_likes(recipe_id: int, db: Session = Depends(get_db)):
 def get_my_like_for_recipe(
     recipe_id: int,
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
+    if liked_index.contains(user_id, recipe_id) is False:
+        return None
     like = get_like_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
     return like
 
+
+@router.get(
+    "/me/check",
+    response_model=schemas.MembershipResponse,
+    summary="Which of these recipes did I like",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": {"recipe_ids": [10, 12]}}}},
+        401: ERROR_401,
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def check_my_likes(
+    recipe_ids: list[int] = Query(..., max_length=MAX_CHECK_IDS, description="repeat for each recipe, e.g. ?recipe_ids=10&recipe_ids=11"),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+):
+    """The subset of ``recipe_ids`` liked by the caller, for rendering a list of recipe cards in one call."""
+    return {"recipe_ids": liked_recipe_ids(db, user_id, recipe_ids)}
+
+
+def _liked_page(db: Session, user_id: int, before: Optional[int], limit: int, include_counts: bool) -> dict:
+    rows = get_likes_for_user(db, user_id, before=before, limit=limit, with_counts=include_counts)
+    likes = []
+    for like, like_count in rows:
+        item = {"like_id": like.like_id, "recipe_id": like.recipe_id, "user_id": like.user_id, "created_at": like.created_at}
+        if include_counts:
+            item["like_count"] = like_count
+        likes.append(item)
+    return {
+        "user_id": user_id,
+        "likes": likes,
+        "next_cursor": likes[-1]["like_id"] if len(likes) == limit else None,
+    }
+
+
+EXAMPLE_LIKED_PAGE = {"user_id": 2, "likes": [{**EXAMPLE_LIKE, "like_count": 14}], "next_cursor": None}
+
+
+@router.get(
+    "/me",
+    response_model=schemas.LikedRecipesPage,
+    response_model_exclude_unset=True,
+    summary="Recipes I liked, newest first",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_LIKED_PAGE}}},
+        401: ERROR_401,
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_my_likes(
+    before: Optional[int] = Query(None, ge=1, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    include_counts: bool = Query(False, description="add each recipe's like_count (same query)"),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+):
+    return _liked_page(db, user_id, before, limit, include_counts)
+
+
+@router.get(
+    "/user/{user_id}",
+    response_model=schemas.LikedRecipesPage,
+    response_model_exclude_unset=True,
+    summary="Recipes a user liked, newest first",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_LIKED_PAGE}}},
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_user_likes(
+    user_id: int,
+    before: Optional[int] = Query(None, ge=1, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    include_counts: bool = Query(False, description="add each recipe's like_count (same query)"),
+    db: Session = Depends(get_read_db),
+):
+    """Likes are public, as in ``/likes/recipe/{recipe_id}``."""
+    return _liked_page(db, user_id, before, limit, include_counts)
+
+
 @router.delete(
     "/{like_id}",
     status_code=204,
     summary="Remove like",
+    dependencies=[Depends(rate_limit("like"))],
     responses={
         204: {"description": "Deleted"},
         401: ERROR_401,
         403: ERROR_403,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -179,22 +343,13 @@ def delete_like(like_id: int,
     status_ = "success"
     action = "unlike"
     try:
-
-        like = get_like(db, like_id=like_id)
-
-        if not like:
-            status_ ="error"
-            raise HTTPException(status_code=404, detail="Like not found")
-        
-        if like.user_id != user_id:
-            status_ ="error"
+        recipe_id = delete_like_crud(db, like_id=like_id, user_id=user_id)
+        if recipe_id is None:
+            # Only a failed delete needs the row, to tell 403 from 404.
+            if get_like(db, like_id=like_id) is None:
+                raise HTTPException(status_code=404, detail="Like not found")
             raise HTTPException(status_code=403, detail="You can delete only your own likes")
-        
-        success = delete_like_crud(db, like_id)
-
-        if not success:
-            status_ ="error"
-            raise HTTPException(status_code=404, detail="Like not deleted")
+        live.publish(recipe_id, {"type": "like_count", "delta": -1})
 
         return None
     except HTTPException:
@@ -206,6 +361,34 @@ def delete_like(like_id: int,
     finally:
         likes_total.labels(source="api", action=action, status=status_).inc()
 
+@router.delete(
+    "/recipe/{recipe_id}/me",
+    status_code=204,
+    summary="Remove my like for recipe (idempotent)",
+    dependencies=[Depends(rate_limit("like"))],
+    responses={
+        204: {"description": "Deleted or not liked"},
+        401: ERROR_401,
+        422: {"description": "Validation error"},
+        429: ERROR_429,
+        502: ERROR_502,
+    },
+)
+def delete_my_like_for_recipe(recipe_id: int,
+                              user_id: int = Depends(get_current_user_id),
+                              db: Session = Depends(get_db)):
+    status_ = "success"
+    action = "unlike"
+    try:
+        if delete_like_for_recipe(db, user_id=user_id, recipe_id=recipe_id):
+            live.publish(recipe_id, {"type": "like_count", "delta": -1})
+        return None
+    except Exception as e:
+        status_ = "error"
+        raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        likes_total.labels(source="api", action=action, status=status_).inc()
+
 @router.get(
     "/count/{recipe_id}",
     response_model=schemas.LikeCountResponse,
@@ -215,11 +398,19 @@ def delete_like(like_id: int,
             "description": "OK",
             "content": {"application/json": {"example": {"recipe_id": 10, "like_count": 3}}},
         },
+        304: {"description": "Not modified"},
         422: {"description": "Validation error"},
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-def count_likes_endpoint(recipe_id: int, db: Session = Depends(get_db)):
-    count = count_likes(db, recipe_id=recipe_id)
+async def count_likes_endpoint(recipe_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    not_modified = await run_in_threadpool(check_not_modified, request, response, db, RECIPE_LIKES, recipe_id, "likes-count")
+    if not_modified is not None:
+        return not_modified
+
+    count = await count_flight.do(
+        (recipe_id, response.headers["ETag"], read_target(db)),
+        lambda: run_in_threadpool(run_in_session_like, db, count_likes, recipe_id),
+    )
     return {"recipe_id": recipe_id, "like_count": count}
     
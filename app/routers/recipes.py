@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from ..database import has_sticky_users, open_read_session
+from ..recommendations import RECOMMEND_TOP_N, recommender
+from .. import models, schemas
+from ..crud.rollups import align, get_series
+from ..utils import live
+from ..utils.auth import peek_user_id
+
+router = APIRouter(prefix="/recipes", tags=["Recipes"])
+
+COUNTS, VIEWER, COMMENTS = "counts", "viewer", "comments"
+ALL_FIELDS = (COUNTS, VIEWER, COMMENTS)
+
+EXAMPLE_SUMMARY = {
+    "recipe_id": 10,
+    "like_count": 3,
+    "comment_count": 2,
+    "viewer": {"liked": True, "like_id": 7, "saved": False, "saved_id": None},
+    "comments": [
+        {
+            "comment_id": 1,
+            "recipe_id": 10,
+            "user_id": 2,
+            "content": "Great recipe!",
+            "created_at": "2025-01-01T12:00:00",
+            "parent_id": None,
+            "depth": 0,
+        }
+    ],
+    "comments_has_more": False,
+}
+
+
+def get_viewer_id(request: Request) -> Optional[int]:
+    """Optional auth: the bearer token's user, or None for anonymous/invalid tokens."""
+    return peek_user_id(request)
+
+
+def get_read_db(viewer_id: Optional[int] = Depends(get_viewer_id)):
+    db = open_read_session(viewer_id if has_sticky_users() else None)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _parse_fields(fields: Optional[str]) -> set:
+    if not fields:
+        return set(ALL_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(ALL_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+@router.get(
+    "/{recipe_id}/social",
+    response_model=schemas.RecipeSocialSummary,
+    response_model_exclude_unset=True,
+    summary="Recipe social summary",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_SUMMARY}}},
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_recipe_social(
+    recipe_id: int,
+    fields: Optional[str] = Query(None, description="comma-separated subset of counts,viewer,comments"),
+    comments_limit: int = Query(20, ge=1, le=100),
+    viewer_id: Optional[int] = Depends(get_viewer_id),
+    db: Session = Depends(get_read_db),
+):
+    """Counts, the caller's like/save state and the first page of comments for a recipe page.
+
+    Counts and viewer state are scalar subqueries of one SELECT; comments are a
+    second, indexed query. Authentication is optional: anonymous callers get no
+    ``viewer`` block.
+    """
+    wanted = _parse_fields(fields)
+    summary = {"recipe_id": recipe_id}
+
+    columns = []
+    if COUNTS in wanted:
+        columns += [
+            select(func.count()).where(models.Like.recipe_id == recipe_id).scalar_subquery().label("like_count"),
+            select(func.count()).where(models.Comment.recipe_id == recipe_id, models.Comment.deleted_at.is_(None)).scalar_subquery().label("comment_count"),
+        ]
+    if VIEWER in wanted and viewer_id is not None:
+        columns += [
+            select(models.Like.like_id)
+            .where(models.Like.recipe_id == recipe_id, models.Like.user_id == viewer_id)
+            .scalar_subquery().label("like_id"),
+            select(models.SavedRecipe.saved_id)
+            .where(models.SavedRecipe.recipe_id == recipe_id, models.SavedRecipe.user_id == viewer_id)
+            .scalar_subquery().label("saved_id"),
+        ]
+    if columns:
+        row = db.execute(select(*columns)).one()._mapping
+        if COUNTS in wanted:
+            summary["like_count"] = row["like_count"]
+            summary["comment_count"] = row["comment_count"]
+        if "like_id" in row:
+            summary["viewer"] = {
+                "liked": row["like_id"] is not None,
+                "like_id": row["like_id"],
+                "saved": row["saved_id"] is not None,
+                "saved_id": row["saved_id"],
+            }
+
+    if COMMENTS in wanted:
+        comments = (
+            db.query(models.Comment)
+            .filter(models.Comment.recipe_id == recipe_id)
+            .order_by(models.Comment.comment_id)
+            .limit(comments_limit + 1)
+            .all()
+        )
+        page = comments[:comments_limit]
+        summary["comments"] = page
+        summary["comments_has_more"] = len(comments) > comments_limit
+
+    return summary
+
+
+EXAMPLE_SIMILAR = {
+    "recipe_id": 10,
+    "similar": [{"recipe_id": 42, "score": 0.61}, {"recipe_id": 7, "score": 0.35}],
+    "built_at": "2025-01-01T12:00:00Z",
+}
+
+
+@router.get(
+    "/{recipe_id}/similar",
+    response_model=schemas.SimilarRecipes,
+    summary="Recipes liked or saved by the same users",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_SIMILAR}}},
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def get_similar_recipes(recipe_id: int, limit: int = Query(10, ge=1, le=RECOMMEND_TOP_N)):
+    """Most similar recipes by co-occurrence in likes and saves, best first.
+
+    Served from the precomputed model in memory, so it never queries the
+    database. ``similar`` is empty for recipes with too few interactions, and
+    ``built_at`` is null until the first build (``RECOMMEND_ENABLED``).
+    """
+    model = recommender.model
+    return {
+        "recipe_id": recipe_id,
+        "similar": [{"recipe_id": i, "score": s} for i, s in recommender.similar(recipe_id, limit)],
+        "built_at": datetime.fromtimestamp(model.built_at, timezone.utc) if model is not None else None,
+    }
+
+
+# Longest range per request, and the range returned when none is given.
+MAX_RANGES = {"hour": timedelta(days=31), "day": timedelta(days=366)}
+DEFAULT_RANGES = {"hour": timedelta(days=2), "day": timedelta(days=30)}
+MAX_ENGAGEMENT_RECIPES = 50
+
+EXAMPLE_ENGAGEMENT = {
+    "granularity": "day",
+    "start": "2025-01-01T00:00:00Z",
+    "end": "2025-01-31T00:00:00Z",
+    "series": [
+        {
+            "recipe_id": 10,
+            "points": [{"bucket": "2025-01-04T00:00:00Z", "likes": 12, "comments": 3, "saves": 5}],
+        }
+    ],
+}
+ENGAGEMENT_RESPONSES = {
+    200: {"description": "OK", "content": {"application/json": {"example": EXAMPLE_ENGAGEMENT}}},
+    422: {"description": "Validation error, or a range longer than allowed for the granularity"},
+    500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+}
+
+
+def _engagement(db: Session, recipe_ids: list[int], start: Optional[datetime], end: Optional[datetime], granularity: str) -> dict:
+    # Whole buckets only: start rounds down, the exclusive end rounds up.
+    end_bucket = align(end or datetime.now(timezone.utc), granularity, up=True)
+    start_bucket = align(start, granularity) if start else end_bucket - DEFAULT_RANGES[granularity]
+    if start_bucket >= end_bucket:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if end_bucket - start_bucket > MAX_RANGES[granularity]:
+        raise HTTPException(status_code=422, detail=f"Range too long for {granularity} buckets (max {MAX_RANGES[granularity].days} days)")
+
+    series = get_series(db, recipe_ids, start_bucket, end_bucket, granularity)
+    return {
+        "granularity": granularity,
+        "start": start_bucket,
+        "end": end_bucket,
+        "series": [{"recipe_id": recipe_id, "points": points} for recipe_id, points in series.items()],
+    }
+
+
+@router.get(
+    "/engagement",
+    response_model=schemas.EngagementResponse,
+    summary="Likes, comments and saves over time for several recipes",
+    responses=ENGAGEMENT_RESPONSES,
+)
+def get_engagement(
+    recipe_ids: list[int] = Query(..., max_length=MAX_ENGAGEMENT_RECIPES, description="repeat for each recipe"),
+    start: Optional[datetime] = Query(None, description="inclusive; naive times are UTC"),
+    end: Optional[datetime] = Query(None, description="exclusive; default now"),
+    granularity: Literal["hour", "day"] = Query("day"),
+    db: Session = Depends(get_read_db),
+):
+    """One series per requested recipe, read from the hourly rollup table only.
+
+    Counts are net: a like removed later no longer counts in the hour it was
+    created. Buckets without activity are left out.
+    """
+    return _engagement(db, list(dict.fromkeys(recipe_ids)), start, end, granularity)
+
+
+@router.get(
+    "/{recipe_id}/engagement",
+    response_model=schemas.EngagementResponse,
+    summary="Likes, comments and saves over time for a recipe",
+    responses=ENGAGEMENT_RESPONSES,
+)
+def get_recipe_engagement(
+    recipe_id: int,
+    start: Optional[datetime] = Query(None, description="inclusive; naive times are UTC"),
+    end: Optional[datetime] = Query(None, description="exclusive; default now"),
+    granularity: Literal["hour", "day"] = Query("day"),
+    db: Session = Depends(get_read_db),
+):
+    return _engagement(db, [recipe_id], start, end, granularity)
+
+
+def _counts(recipe_id: int) -> dict:
+    db = open_read_session()
+    try:
+        row = db.execute(
+            select(
+                select(func.count()).where(models.Like.recipe_id == recipe_id).scalar_subquery().label("like_count"),
+                select(func.count()).where(models.Comment.recipe_id == recipe_id, models.Comment.deleted_at.is_(None)).scalar_subquery().label("comment_count"),
+            )
+        ).one()
+        return {"recipe_id": recipe_id, "like_count": row.like_count, "comment_count": row.comment_count}
+    finally:
+        db.close()
+
+
+@router.get(
+    "/{recipe_id}/events",
+    response_class=StreamingResponse,
+    summary="Live like/comment updates for a recipe (Server-Sent Events)",
+    responses={
+        200: {
+            "description": "Event stream",
+            "content": {
+                "text/event-stream": {
+                    "example": (
+                        "event: snapshot\nid: 0\ndata: {\"type\": \"snapshot\", \"recipe_id\": 10, \"like_count\": 3, \"comment_count\": 2}\n\n"
+                        "event: like_count\nid: 1\ndata: {\"type\": \"like_count\", \"delta\": 1}\n\n"
+                    )
+                }
+            },
+        },
+        503: {"model": schemas.ErrorResponse, "description": "Too many open streams on this worker"},
+    },
+)
+async def recipe_events(recipe_id: int, request: Request):
+    """Starts with a ``snapshot`` of the counts, then pushes ``like_count`` / ``comment_count`` deltas
+    and new ``comment``s. A ``resync`` event means updates were dropped: refetch and continue.
+    """
+    try:
+        subscription = live.hub.subscribe(recipe_id)
+    except live.TooManySubscribers:
+        raise HTTPException(status_code=503, detail="Too many live streams, poll instead", headers={"Retry-After": "30"})
+    try:
+        # Subscribed first, so nothing committed after the snapshot is missed.
+        snapshot = await run_in_threadpool(_counts, recipe_id)
+    except Exception:
+        live.hub.unsubscribe(subscription)
+        raise
+    return StreamingResponse(
+        live.stream(subscription, snapshot, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,15 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from ..database import SessionLocal
-import httpx
-from .. import schemas, models
-from ..crud.saved import save_recipe, get_saved, get_saved_for_user, unsave_recipe, get_saved_by_user_and_recipe
-from ..utils.auth import get_current_user_id
+from ..database import SessionLocal, has_sticky_users, open_read_session
+from .. import schemas
+from ..crud.saved import save_recipe, get_saved, get_saved_for_user, unsave_recipe, get_saved_by_user_and_recipe, put_saved, unsave_recipe_for_user, saved_recipe_ids
+from ..utils.upstream import recipes, verify_exists
+from ..utils.membership import saved as saved_index
+from ..utils.rate_limit import rate_limit
+from ..utils.auth import get_current_user_id, peek_user_id
 from ..metrics import saved_items_total
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/saved", tags=["Saved"])
 
@@ -17,6 +20,8 @@ EXAMPLE_SAVED = {
     "created_at": "2025-01-01T12:00:00",
 }
 
+# Upper bound on ids per batch membership check (one page of recipe cards).
+MAX_CHECK_IDS = 200
 ERROR_400 = {
     "model": schemas.ErrorResponse,
     "description": "Bad request",
@@ -37,6 +42,16 @@ ERROR_404 = {
     "description": "Not found",
     "content": {"application/json": {"example": {"detail": "Saved recipe not found"}}},
 }
+ERROR_409 = {
+    "model": schemas.ErrorResponse,
+    "description": "Conflict",
+    "content": {"application/json": {"example": {"detail": "Saved recipe was removed concurrently, retry"}}},
+}
+ERROR_429 = {
+    "model": schemas.ErrorResponse,
+    "description": "Too many requests",
+    "content": {"application/json": {"example": {"detail": "Too many requests"}}},
+}
 ERROR_502 = {
     "model": schemas.ErrorResponse,
     "description": "Upstream error",
@@ -55,26 +70,27 @@ def get_db():
     finally:
         db.close()
 
-async def recipe_exists(recipe_id: int) -> bool:
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        r = await client.get(f"{RECIPE_SERVICE_URL}/{recipe_id}")
-        if r.status_code == 200:
-            return True
-        if r.status_code == 404:
-            return False
-        return True
+def get_read_db(request: Request):
+    user_id = peek_user_id(request) if has_sticky_users() else None
+    db = open_read_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
 
 @router.post(
     "/{recipe_id}",
     response_model=schemas.SavedRecipe,
     status_code=status.HTTP_201_CREATED,
     summary="Save recipe",
+    dependencies=[Depends(rate_limit("save"))],
     responses={
         201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_SAVED}}},
         400: ERROR_400,
         401: ERROR_401,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -84,18 +100,11 @@ async def create_saved(recipe_id: int,
     status_ = "success"
     action = "save"
     try:
-        existing = get_saved_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
-        if existing:
-            status_ ="error"
+        await verify_exists(recipes, recipe_id, "save", "Recipe not found")
+
+        new_saved = await run_in_threadpool(save_recipe, db=db, user_id=user_id, recipe_id=recipe_id)
+        if new_saved is None:
             raise HTTPException(status_code=400, detail="Recipe already saved")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{RECIPE_SERVICE_URL}/{recipe_id}")
-            if response.status_code != 200:
-                status_ ="error"
-                raise HTTPException(status_code=404, detail="Recipe not found")
-        
-
-        new_saved = save_recipe(db=db, user_id=user_id, recipe_id=recipe_id)  
         return new_saved
     except HTTPException:
         status_ = "error"
@@ -107,6 +116,46 @@ async def create_saved(recipe_id: int,
         saved_items_total.labels(source="api", action=action, status=status_).inc()  
 
 
+@router.put(
+    "/{recipe_id}",
+    response_model=schemas.SavedRecipe,
+    summary="Save recipe (idempotent)",
+    dependencies=[Depends(rate_limit("save"))],
+    responses={
+        200: {"description": "Already saved", "content": {"application/json": {"example": EXAMPLE_SAVED}}},
+        201: {"description": "Created", "content": {"application/json": {"example": EXAMPLE_SAVED}}},
+        401: ERROR_401,
+        404: ERROR_404,
+        409: ERROR_409,
+        422: {"description": "Validation error"},
+        429: ERROR_429,
+        502: ERROR_502,
+    },
+)
+async def put_saved_endpoint(recipe_id: int,
+                             response: Response,
+                             user_id: int = Depends(get_current_user_id),
+                             db: Session = Depends(get_db)):
+    status_ = "success"
+    action = "save"
+    try:
+        await verify_exists(recipes, recipe_id, "save", "Recipe not found")
+
+        saved, created = await run_in_threadpool(put_saved, db, user_id=user_id, recipe_id=recipe_id)
+        if saved is None:
+            raise HTTPException(status_code=409, detail="Saved recipe was removed concurrently, retry")
+        response.status_code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        return saved
+    except HTTPException:
+        status_ = "error"
+        raise
+    except Exception as e:
+        status_ = "error"
+        raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        saved_items_total.labels(source="api", action=action, status=status_).inc()
+
+
 @router.get(
     "/my",
     response_model=list[schemas.SavedRecipe],
@@ -118,25 +167,14 @@ async def create_saved(recipe_id: int,
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-async def get_saved_recipes(
+def get_saved_recipes(
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
+    # Rows for deleted recipes are removed by the recipe.deleted event
+    # (POST /internal/events), so no per-row upstream check is needed here.
     saved_recipes = get_saved_for_user(db, user_id=user_id)
 
-    stale = []
-    for s in saved_recipes:
-        ok = await recipe_exists(s.recipe_id)
-        if not ok:
-            stale.append(s)
-
-    if stale:
-        for s in stale:
-            db.delete(s)
-        db.commit()
-
-        saved_recipes = get_saved_for_user(db, user_id=user_id)
-
     return saved_recipes
 
 
@@ -151,32 +189,74 @@ async def get_saved_recipes(
         500: {"model": schemas.ErrorResponse, "description": "Internal error"},
     },
 )
-async def get_my_saved_for_recipe(
+def get_my_saved_for_recipe(
     recipe_id: int,
     user_id: int = Depends(get_current_user_id),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    saved = get_saved_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
-    if not saved:
+    if saved_index.contains(user_id, recipe_id) is False:
         return None
+    saved = get_saved_by_user_and_recipe(db, user_id=user_id, recipe_id=recipe_id)
+    return saved
+
 
-    ok = await recipe_exists(recipe_id)
-    if not ok:
-        db.delete(saved)
-        db.commit()
+@router.get(
+    "/my/check",
+    response_model=schemas.MembershipResponse,
+    summary="Which of these recipes did I save",
+    responses={
+        200: {"description": "OK", "content": {"application/json": {"example": {"recipe_ids": [10]}}}},
+        401: ERROR_401,
+        422: {"description": "Validation error"},
+        500: {"model": schemas.ErrorResponse, "description": "Internal error"},
+    },
+)
+def check_my_saved(
+    recipe_ids: list[int] = Query(..., max_length=MAX_CHECK_IDS, description="repeat for each recipe, e.g. ?recipe_ids=10&recipe_ids=11"),
+    user_id: int = Depends(get_current_user_id),
+    db: Session = Depends(get_read_db),
+):
+    """The subset of ``recipe_ids`` saved by the caller, for rendering a list of recipe cards in one call."""
+    return {"recipe_ids": saved_recipe_ids(db, user_id, recipe_ids)}
+
+@router.delete(
+    "/recipe/{recipe_id}/me",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Unsave recipe by recipe id (idempotent)",
+    dependencies=[Depends(rate_limit("save"))],
+    responses={
+        204: {"description": "Deleted or not saved"},
+        401: ERROR_401,
+        422: {"description": "Validation error"},
+        429: ERROR_429,
+        502: ERROR_502,
+    },
+)
+def delete_my_saved_for_recipe(recipe_id: int, user_id: int = Depends(get_current_user_id), db: Session = Depends(get_db)):
+    status_ = "success"
+    action = "unsave"
+    try:
+        unsave_recipe_for_user(db, user_id=user_id, recipe_id=recipe_id)
         return None
+    except Exception as e:
+        status_ = "error"
+        raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        saved_items_total.labels(source="api", action=action, status=status_).inc()
+
 
-    return saved
 @router.delete(
     "/{saved_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Unsave recipe",
+    dependencies=[Depends(rate_limit("save"))],
     responses={
         204: {"description": "Deleted"},
         401: ERROR_401,
         403: ERROR_403,
         404: ERROR_404,
         422: {"description": "Validation error"},
+        429: ERROR_429,
         502: ERROR_502,
     },
 )
@@ -184,17 +264,11 @@ def delete_saved(saved_id: int, user_id: int = Depends(get_current_user_id), db:
     status_ = "success"
     action = "unsave"
     try:
-        saved = get_saved(db, saved_id=saved_id)
-
-        if not saved:
-            status_ = "error"
-            raise HTTPException(status_code=404, detail="Saved recipe not found")
-        
-        if saved.user_id != user_id:
-            status_ = "error"
+        if not unsave_recipe(db, saved_id=saved_id, user_id=user_id):
+            # Only a failed delete needs the row, to tell 403 from 404.
+            if get_saved(db, saved_id=saved_id) is None:
+                raise HTTPException(status_code=404, detail="Saved recipe not found")
             raise HTTPException(403, "You can only unsave your own saved recipes")
-        
-        unsave_recipe(db, saved_id=saved_id)
 
         return None
     except HTTPException:
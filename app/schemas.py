@@ -1,10 +1,12 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Optional
 
 
 #Comments input
 class CommentCreate(BaseModel):
     content: str
+    parent_id: Optional[int] = None
 
 #Comments response schema
 class Comment(BaseModel):
@@ -13,6 +15,9 @@ class Comment(BaseModel):
     user_id: int
     content: str
     created_at: datetime
+    parent_id: Optional[int] = None
+    depth: int = 0
+    deleted_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True #da pydantic lahko pretvori iz sqlalchemy modela v pydantic model
@@ -59,12 +64,171 @@ class HealthResponse(BaseModel):
     status: str
 
 
+class ReadinessResponse(BaseModel):
+    status: str
+    checks: dict[str, str]
+
+
+class LikedRecipe(Like):
+    like_count: Optional[int] = None
+
+
+class LikedRecipesPage(BaseModel):
+    user_id: int
+    likes: list[LikedRecipe]
+    next_cursor: Optional[int] = None
+
+
 class LikeCountResponse(BaseModel):
     recipe_id: int
     like_count: int
 
 
+class MembershipResponse(BaseModel):
+    recipe_ids: list[int]
+
+
 class CommentCountResponse(BaseModel):
     recipe_id: int
     comment_count: int
 
+
+class CommentThread(Comment):
+    reply_count: int
+    replies: list[Comment]
+
+
+class CommentThreadPage(BaseModel):
+    recipe_id: int
+    threads: list[CommentThread]
+    next_cursor: Optional[int] = None
+
+
+class CommentRepliesResponse(BaseModel):
+    comment_id: int
+    replies: list[Comment]
+    next_cursor: Optional[str] = None
+
+
+class CommentSearchHit(Comment):
+    score: float
+
+
+class CommentSearchResponse(BaseModel):
+    query: str
+    total: int
+    page: int
+    size: int
+    results: list[CommentSearchHit]
+
+
+
+class ViewerState(BaseModel):
+    liked: bool
+    like_id: Optional[int] = None
+    saved: bool
+    saved_id: Optional[int] = None
+
+
+class RecipeSocialSummary(BaseModel):
+    recipe_id: int
+    like_count: Optional[int] = None
+    comment_count: Optional[int] = None
+    viewer: Optional[ViewerState] = None
+    comments: Optional[list[Comment]] = None
+    comments_has_more: Optional[bool] = None
+
+
+class SimilarRecipe(BaseModel):
+    recipe_id: int
+    score: float
+
+
+class SimilarRecipes(BaseModel):
+    recipe_id: int
+    similar: list[SimilarRecipe]
+    built_at: Optional[datetime] = None
+
+
+class EngagementPoint(BaseModel):
+    bucket: datetime
+    likes: int
+    comments: int
+    saves: int
+
+
+class EngagementSeries(BaseModel):
+    recipe_id: int
+    points: list[EngagementPoint]
+
+
+class EngagementResponse(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    series: list[EngagementSeries]
+
+
+class DeletionEvent(BaseModel):
+    type: str
+    recipe_id: Optional[int] = None
+    user_id: Optional[int] = None
+
+
+class CascadeResponse(BaseModel):
+    type: str
+    deleted: dict[str, int]
+
+
+
+class PurgeJobResponse(BaseModel):
+    job_id: str
+    user_id: int
+    status: str
+    deleted: dict[str, int]
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class RouteProfile(BaseModel):
+    route: str
+    requests: int
+    samples: int
+    seconds: float
+    stacks: int
+
+
+class MemorySnapshot(BaseModel):
+    snapshot_id: int
+    pid: int
+    taken_at: float
+    traced_bytes: int
+
+
+class MemoryStatus(BaseModel):
+    pid: int
+    rss_bytes: int
+    tracing: bool
+    frames: Optional[int] = None
+    traced_bytes: Optional[int] = None
+    traced_peak_bytes: Optional[int] = None
+    snapshots: list[MemorySnapshot]
+
+
+class AllocationSite(BaseModel):
+    site: str
+    size_bytes: int
+    count: int
+
+
+class AllocationDiff(AllocationSite):
+    size_diff_bytes: int
+    count_diff: int
+
+
+class RouteMemory(BaseModel):
+    route: str
+    requests: int
+    max_peak_bytes: int
+    mean_peak_bytes: int
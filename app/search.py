@@ -0,0 +1,257 @@
+"""Full-text search over comment content behind a pluggable index backend.
+
+``SEARCH_BACKEND=database`` (default) uses the primary database: an FTS5
+table kept in sync by triggers on SQLite, or a GIN expression index on
+``to_tsvector(content)`` on Postgres. Either way the database maintains the
+index itself, so the incremental hooks below are no-ops.
+
+``SEARCH_BACKEND=elasticsearch`` indexes comments in Elasticsearch; the CRUD
+write paths queue each create/delete and cascades queue a delete-by-query.
+A writer thread applies them in order, so no request (some run on the event
+loop) waits on Elasticsearch. Failures there never fail the write: they are
+logged, counted, and repaired by ``python -m app.cli reindex-comments``.
+"""
+import logging
+import os
+import queue
+import threading
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+from .metrics import search_index_errors_total
+
+logger = logging.getLogger(__name__)
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "database")
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "simple")
+ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "http://elasticsearch:9200")
+ELASTICSEARCH_INDEX = os.getenv("ELASTICSEARCH_INDEX", "social-comments")
+ELASTICSEARCH_TIMEOUT = float(os.getenv("ELASTICSEARCH_TIMEOUT", "2.0"))
+# Index writes waiting for the writer thread; more are dropped (and counted).
+SEARCH_QUEUE_SIZE = int(os.getenv("SEARCH_QUEUE_SIZE", "10000"))
+
+if not SEARCH_TS_CONFIG.isidentifier():
+    raise RuntimeError("SEARCH_TS_CONFIG must be a plain text search configuration name")
+
+_SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(content, content='comments', content_rowid='comment_id')",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_ai AFTER INSERT ON comments BEGIN "
+    "INSERT INTO comments_fts(rowid, content) VALUES (new.comment_id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_ad AFTER DELETE ON comments BEGIN "
+    "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.comment_id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS comments_fts_au AFTER UPDATE OF content ON comments BEGIN "
+    "INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.comment_id, old.content); "
+    "INSERT INTO comments_fts(rowid, content) VALUES (new.comment_id, new.content); END",
+]
+_POSTGRES_FTS_INDEX = "ix_comments_content_fts"
+_POSTGRES_FTS_DEFINITION = f"ON comments USING GIN (to_tsvector('{SEARCH_TS_CONFIG}'::regconfig, content))"
+_POSTGRES_FTS_DDL = [f"CREATE INDEX IF NOT EXISTS {_POSTGRES_FTS_INDEX} {_POSTGRES_FTS_DEFINITION}"]
+
+for _ddl in _SQLITE_FTS_DDL:
+    event.listen(models.Comment.__table__, "after_create", DDL(_ddl).execute_if(dialect="sqlite"))
+for _ddl in _POSTGRES_FTS_DDL:
+    event.listen(models.Comment.__table__, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+
+def ensure_database_index(bind: Engine):
+    """Create the FTS table/triggers or GIN index on an existing ``comments`` table.
+
+    On Postgres the index is built ``CONCURRENTLY``, so comment writes carry
+    on while ``migrate`` runs. An interrupted concurrent build leaves an
+    invalid index behind, which is dropped and built again.
+    """
+    if bind.dialect.name == "postgresql":
+        with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            valid = conn.execute(
+                text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+                {"name": _POSTGRES_FTS_INDEX},
+            ).scalar()
+            if valid is False:
+                logger.warning("Rebuilding invalid index %s", _POSTGRES_FTS_INDEX)
+                conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {_POSTGRES_FTS_INDEX}")
+            conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {_POSTGRES_FTS_INDEX} {_POSTGRES_FTS_DEFINITION}")
+        return
+    statements = {"sqlite": _SQLITE_FTS_DDL}.get(bind.dialect.name, [])
+    with bind.begin() as conn:
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input can't inject FTS5 operators; terms are ANDed.
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+class DatabaseSearchBackend:
+    name = "database"
+
+    def index_comment(self, comment):
+        pass
+
+    def delete_comment(self, comment_id: int):
+        pass
+
+    def delete_for_recipe(self, recipe_id: int):
+        pass
+
+    def delete_for_user(self, user_id: int):
+        pass
+
+    def flush(self):
+        pass
+
+    def search(self, db: Session, query: str, recipe_id: Optional[int], offset: int, limit: int) -> Tuple[int, List[Tuple[int, float]]]:
+        dialect = db.get_bind().dialect.name
+        params = {"q": query, "recipe_id": recipe_id, "limit": limit, "offset": offset}
+        recipe_filter = "AND c.recipe_id = :recipe_id" if recipe_id is not None else ""
+
+        if dialect == "sqlite":
+            params["q"] = _fts5_query(query)
+            if not params["q"]:
+                return 0, []
+            base = f"FROM comments_fts JOIN comments c ON c.comment_id = comments_fts.rowid WHERE comments_fts MATCH :q {recipe_filter}"
+            hits_sql = f"SELECT c.comment_id, -bm25(comments_fts) AS score {base} ORDER BY bm25(comments_fts), c.comment_id DESC LIMIT :limit OFFSET :offset"
+        elif dialect == "postgresql":
+            vector = f"to_tsvector('{SEARCH_TS_CONFIG}'::regconfig, c.content)"
+            base = f"FROM comments c, plainto_tsquery('{SEARCH_TS_CONFIG}'::regconfig, :q) query WHERE {vector} @@ query {recipe_filter}"
+            hits_sql = f"SELECT c.comment_id, ts_rank({vector}, query) AS score {base} ORDER BY score DESC, c.comment_id DESC LIMIT :limit OFFSET :offset"
+        else:
+            raise NotImplementedError(f"Database search is not supported on {dialect}")
+
+        total = db.execute(text(f"SELECT COUNT(*) {base}"), params).scalar() or 0
+        hits = [(row.comment_id, float(row.score)) for row in db.execute(text(hits_sql), params)]
+        return total, hits
+
+    def reindex(self, db: Session, batch_size: int = 1000) -> int:
+        dialect = db.get_bind().dialect.name
+        if dialect == "sqlite":
+            db.execute(text("INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')"))
+            db.commit()
+        elif dialect == "postgresql":
+            # Outside a transaction, and without blocking writes to comments.
+            with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql(f"REINDEX INDEX CONCURRENTLY {_POSTGRES_FTS_INDEX}")
+        return db.query(models.Comment).count()
+
+
+class ElasticsearchBackend:
+    name = "elasticsearch"
+
+    def __init__(self, url: str = ELASTICSEARCH_URL, index: str = ELASTICSEARCH_INDEX):
+        from elasticsearch import Elasticsearch
+
+        self.index = index
+        self.client = Elasticsearch(url, request_timeout=ELASTICSEARCH_TIMEOUT)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=SEARCH_QUEUE_SIZE)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+    def ensure_index(self):
+        if not self.client.indices.exists(index=self.index):
+            self.client.indices.create(
+                index=self.index,
+                mappings={
+                    "properties": {
+                        "content": {"type": "text"},
+                        "recipe_id": {"type": "integer"},
+                        "user_id": {"type": "integer"},
+                        "created_at": {"type": "date"},
+                    }
+                },
+            )
+
+    @staticmethod
+    def _document(comment) -> dict:
+        return {
+            "content": comment.content,
+            "recipe_id": comment.recipe_id,
+            "user_id": comment.user_id,
+            "created_at": comment.created_at.isoformat() if comment.created_at else None,
+        }
+
+    def _submit(self, operation: str, fn, **kwargs):
+        """Queue a write for the writer thread; the caller never waits on Elasticsearch."""
+        if self._writer is None or not self._writer.is_alive():
+            with self._writer_lock:
+                # Also after a fork, which leaves the thread behind in the parent.
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._run, name="search-index-writer", daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait((operation, fn, kwargs))
+        except queue.Full:
+            search_index_errors_total.labels(operation=operation).inc()
+            logger.warning("Search index queue full, dropped %s", operation)
+
+    def _run(self):
+        while True:
+            operation, fn, kwargs = self._queue.get()
+            try:
+                fn(**kwargs)
+            except Exception as e:
+                search_index_errors_total.labels(operation=operation).inc()
+                logger.warning("Search index %s failed: %s", operation, e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait until every queued write has been applied."""
+        self._queue.join()
+
+    def index_comment(self, comment):
+        # The document is taken now: the ORM object may be expired or gone by the time the writer runs.
+        self._submit("index", self.client.index, index=self.index, id=comment.comment_id, document=self._document(comment))
+
+    def delete_comment(self, comment_id: int):
+        self._submit("delete", self.client.options(ignore_status=404).delete, index=self.index, id=comment_id)
+
+    def delete_for_recipe(self, recipe_id: int):
+        self._submit("delete_by_query", self.client.delete_by_query, index=self.index, query={"term": {"recipe_id": recipe_id}}, conflicts="proceed")
+
+    def delete_for_user(self, user_id: int):
+        self._submit("delete_by_query", self.client.delete_by_query, index=self.index, query={"term": {"user_id": user_id}}, conflicts="proceed")
+
+    def search(self, db: Session, query: str, recipe_id: Optional[int], offset: int, limit: int) -> Tuple[int, List[Tuple[int, float]]]:
+        es_query = {"bool": {"must": {"match": {"content": {"query": query, "operator": "and"}}}}}
+        if recipe_id is not None:
+            es_query["bool"]["filter"] = [{"term": {"recipe_id": recipe_id}}]
+        result = self.client.search(index=self.index, query=es_query, from_=offset, size=limit, track_total_hits=True, source=False)
+        hits = [(int(hit["_id"]), float(hit["_score"] or 0.0)) for hit in result["hits"]["hits"]]
+        return result["hits"]["total"]["value"], hits
+
+    def reindex(self, db: Session, batch_size: int = 1000) -> int:
+        from elasticsearch import helpers
+
+        self.ensure_index()
+        indexed, last_id = 0, 0
+        while True:
+            batch = (
+                db.query(models.Comment)
+                .filter(models.Comment.comment_id > last_id)
+                .order_by(models.Comment.comment_id)
+                .limit(batch_size)
+                .all()
+            )
+            if not batch:
+                return indexed
+            helpers.bulk(
+                self.client,
+                ({"_index": self.index, "_id": c.comment_id, "_source": self._document(c)} for c in batch),
+            )
+            indexed += len(batch)
+            last_id = batch[-1].comment_id
+
+
+def _make_backend():
+    if SEARCH_BACKEND == "elasticsearch":
+        return ElasticsearchBackend()
+    if SEARCH_BACKEND != "database":
+        raise RuntimeError(f"Unknown SEARCH_BACKEND {SEARCH_BACKEND!r}")
+    return DatabaseSearchBackend()
+
+
+backend = _make_backend()
@@ -0,0 +1,124 @@
+"""Adaptive admission control: per route class concurrency limits tuned by AIMD.
+
+Requests are classed as ``read`` (safe methods) or ``write``. Each class has
+a concurrency limit that grows by ~1 per window of fast completions while it
+is actually being used, and is cut by ``LOADSHED_BACKOFF`` when a request
+takes longer than the class latency target or fails with an overload status.
+Requests over the limit are rejected immediately with 503 instead of
+queueing behind work that is already slow.
+
+Reads have priority: while reads are at their limit, writes (which hold a
+primary connection and usually call an upstream) are shed as well.
+Limits are per worker process.
+"""
+import os
+import re
+import time
+from typing import Optional
+
+from fastapi import Request
+from starlette.responses import JSONResponse
+
+from ..metrics import admission_in_flight, admission_limit, requests_shed_total
+
+LOADSHED_ENABLED = os.getenv("LOADSHED_ENABLED", "true").lower() == "true"
+LOADSHED_MIN_LIMIT = int(os.getenv("LOADSHED_MIN_LIMIT", "4"))
+LOADSHED_MAX_LIMIT = int(os.getenv("LOADSHED_MAX_LIMIT", "256"))
+LOADSHED_READ_TARGET_SECONDS = float(os.getenv("LOADSHED_READ_TARGET_SECONDS", "0.25"))
+LOADSHED_WRITE_TARGET_SECONDS = float(os.getenv("LOADSHED_WRITE_TARGET_SECONDS", "1.0"))
+LOADSHED_BACKOFF = float(os.getenv("LOADSHED_BACKOFF", "0.9"))
+
+READ, WRITE = "read", "write"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Probes and scrapes must keep answering while the worker sheds load.
+EXEMPT_SUFFIXES = ("/metrics", "/health", "/health/live", "/health/ready")
+# Event streams stay open for minutes and would pin a slot and skew the latency
+# signal. Only the SSE route itself: POST /internal/events is ordinary work.
+# Matched at the end of the path, like the suffixes, so a ROOT_PATH prefix is allowed.
+EXEMPT_STREAM = re.compile(r"/recipes/\d+/events$")
+OVERLOAD_STATUSES = {503, 504}
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit. Only touched from the event loop, so no locking."""
+
+    def __init__(self, name: str, target: float, initial: int, min_limit: int = LOADSHED_MIN_LIMIT,
+                 max_limit: int = LOADSHED_MAX_LIMIT, backoff: float = LOADSHED_BACKOFF):
+        self.name = name
+        self.target = target
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.limit = float(initial)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        admission_limit.labels(route_class=name).set(self.limit)
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= int(self.limit)
+
+    def try_acquire(self) -> bool:
+        if self.saturated:
+            return False
+        self.in_flight += 1
+        admission_in_flight.labels(route_class=self.name).inc()
+        return True
+
+    def release(self, latency: float, overloaded: bool = False):
+        busy = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        admission_in_flight.labels(route_class=self.name).dec()
+
+        now = time.monotonic()
+        if overloaded or latency > self.target:
+            # Requests that were already in flight when latency rose all finish
+            # slow; count them as one signal per target interval.
+            if now - self._last_decrease >= self.target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif busy:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        admission_limit.labels(route_class=self.name).set(self.limit)
+
+
+limits = {
+    READ: AdaptiveLimit(READ, LOADSHED_READ_TARGET_SECONDS, initial=LOADSHED_MAX_LIMIT // 2),
+    WRITE: AdaptiveLimit(WRITE, LOADSHED_WRITE_TARGET_SECONDS, initial=LOADSHED_MAX_LIMIT // 4),
+}
+
+
+def route_class(request: Request) -> Optional[str]:
+    path = request.url.path.rstrip("/")
+    if path.endswith(EXEMPT_SUFFIXES) or (request.method == "GET" and EXEMPT_STREAM.search(path)):
+        return None
+    return READ if request.method in SAFE_METHODS else WRITE
+
+
+def _admit(cls: str) -> bool:
+    if cls == WRITE and limits[READ].saturated:
+        return False
+    return limits[cls].try_acquire()
+
+
+async def admission_middleware(request: Request, call_next):
+    cls = route_class(request) if LOADSHED_ENABLED else None
+    if cls is None:
+        return await call_next(request)
+
+    if not _admit(cls):
+        requests_shed_total.labels(route_class=cls).inc()
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Service overloaded, retry later"},
+            headers={"Retry-After": "1"},
+        )
+
+    start = time.monotonic()
+    overloaded = True
+    try:
+        response = await call_next(request)
+        overloaded = response.status_code in OVERLOAD_STATUSES
+        return response
+    finally:
+        limits[cls].release(time.monotonic() - start, overloaded)
@@ -1,12 +1,16 @@
-import os, jwt
-from fastapi import HTTPException, Security
+import hmac, os, jwt
+from typing import Optional
+from fastapi import Header, HTTPException, Request, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import ExpiredSignatureError, InvalidTokenError
+from .tracing import tracer
 
 
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
+# Shared secret for service-to-service endpoints under /internal.
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
 
 if not JWT_SECRET or not JWT_ALGORITHM:
     raise RuntimeError("JWT_SECRET and JWT_ALGORITHM must be set in the environment for social_service")
@@ -20,9 +24,26 @@ def decode_jwt(token: str) -> dict:
     except InvalidTokenError:
         raise InvalidTokenError("Invalid token")
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> int:
+def get_current_user_id(request: Request, credentials: HTTPAuthorizationCredentials = Security(security)) -> int:
+    with tracer.start_as_current_span("auth.get_current_user_id"):
+        try:
+            payload = decode_jwt(credentials.credentials)
+            request.state.user_id = payload["user_id"]
+            return payload["user_id"]
+        except InvalidTokenError as e:
+            raise HTTPException(status_code=401, detail=str(e))
+
+def peek_user_id(request: Request) -> Optional[int]:
+    """Best-effort user id from the bearer token on routes that do not require auth."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
     try:
-        payload = decode_jwt(credentials.credentials)
-        return payload["user_id"]
-    except InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail=str(e))
+        return decode_jwt(token).get("user_id")
+    except InvalidTokenError:
+        return None
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)) -> None:
+    if not INTERNAL_API_TOKEN or not x_internal_token or not hmac.compare_digest(x_internal_token, INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid internal token")
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+from ..database import engine, replicas
+
+logger = logging.getLogger(__name__)
+
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+READINESS_REQUIRE_UPSTREAMS = os.getenv("READINESS_REQUIRE_UPSTREAMS", "false").lower() == "true"
+UPSTREAM_HEALTH_TIMEOUT = float(os.getenv("UPSTREAM_HEALTH_TIMEOUT", "1.0"))
+DB_WARMUP_CONNECTIONS = int(os.getenv("DB_WARMUP_CONNECTIONS", "2"))
+
+
+def _health_url(service_url: str) -> str:
+    parts = urlsplit(service_url)
+    return f"{parts.scheme}://{parts.netloc}/health"
+
+
+UPSTREAM_HEALTH_URLS = {
+    "recipe_service": os.getenv("RECIPE_SERVICE_HEALTH_URL") or _health_url(os.getenv("RECIPE_SERVICE_URL", "")),
+    "user_service": os.getenv("USER_SERVICE_HEALTH_URL") or _health_url(os.getenv("USER_SERVICE_URL", "")),
+}
+
+
+def warm_up_pool(bind=engine, connections: int = DB_WARMUP_CONNECTIONS):
+    """Open ``connections`` pooled connections so the first requests skip the handshake."""
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = bind.connect()
+            opened.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    except Exception as e:
+        logger.warning("Database warm-up failed: %s", e)
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def check_database() -> str:
+    pool = engine.pool
+    max_overflow = getattr(pool, "_max_overflow", -1)
+    if hasattr(pool, "checkedout") and max_overflow >= 0 and pool.checkedout() >= pool.size() + max_overflow:
+        return "pool exhausted"
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    except Exception as e:
+        return f"error: {e.__class__.__name__}"
+    return "ok"
+
+
+async def check_upstream(url: str) -> str:
+    try:
+        async with httpx.AsyncClient(timeout=UPSTREAM_HEALTH_TIMEOUT) as client:
+            response = await client.get(url)
+    except Exception as e:
+        return f"error: {e.__class__.__name__}"
+    if response.status_code >= 500:
+        return f"error: HTTP {response.status_code}"
+    return "ok"
+
+
+_cached: Tuple[float, bool, Dict[str, str]] = (0.0, False, {})
+_lock = asyncio.Lock()
+
+
+async def readiness() -> Tuple[bool, Dict[str, str]]:
+    """Run readiness checks, reusing the last result for READINESS_CACHE_SECONDS.
+
+    The database gates readiness; upstream services only do so when
+    READINESS_REQUIRE_UPSTREAMS is set, so a recipe-service outage does not
+    take every social pod out of the load balancer with it.
+    """
+    global _cached
+    async with _lock:
+        checked_at, ready, checks = _cached
+        if time.monotonic() - checked_at < READINESS_CACHE_SECONDS:
+            return ready, checks
+
+        names = list(UPSTREAM_HEALTH_URLS)
+        results = await asyncio.gather(
+            run_in_threadpool(check_database),
+            *(check_upstream(UPSTREAM_HEALTH_URLS[name]) for name in names),
+        )
+        checks = {"database": results[0], **dict(zip(names, results[1:]))}
+        if replicas:
+            replica = await run_in_threadpool(replicas.choose)
+            checks["read_replica"] = "ok" if replica is not None else "fallback to primary"
+
+        ready = checks["database"] == "ok"
+        if READINESS_REQUIRE_UPSTREAMS:
+            ready = ready and all(checks[name] == "ok" for name in names)
+
+        _cached = (time.monotonic(), ready, checks)
+        return ready, checks
+
+
+def reset_readiness_cache():
+    global _cached
+    _cached = (0.0, False, {})
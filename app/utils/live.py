@@ -0,0 +1,229 @@
+"""Live per-recipe updates for Server-Sent Events subscribers.
+
+Write endpoints call ``publish(recipe_id, event)`` after their commit. The
+broker carries events to every worker and replica, and each worker's ``Hub``
+fans them out to the SSE connections open on that worker:
+
+* ``LIVE_BROKER=local`` – in-process only; the default, and what tests use.
+  With ``WEB_CONCURRENCY`` > 1 (or several replicas) clients only see the
+  writes served by their own worker; a warning is logged at startup
+* ``LIVE_BROKER=redis`` – Redis pub/sub on ``LIVE_REDIS_CHANNEL``
+
+Every subscriber has a bounded queue of ``LIVE_QUEUE_SIZE`` events. A
+consumer that falls that far behind does not hold up the others: its queue
+is emptied and it gets a single ``resync`` event, telling the client to
+refetch counts instead of applying deltas it has missed.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from ..metrics import live_events_published_total, live_resyncs_total, live_subscribers
+
+logger = logging.getLogger(__name__)
+
+LIVE_BROKER = os.getenv("LIVE_BROKER", "local")
+LIVE_REDIS_URL = os.getenv("LIVE_REDIS_URL", "redis://redis:6379/0")
+LIVE_REDIS_CHANNEL = os.getenv("LIVE_REDIS_CHANNEL", "social:recipe-events")
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "1000"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+
+RESYNC = {"type": "resync"}
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One SSE connection. Owned by the event loop it was created on."""
+
+    def __init__(self, recipe_id: int, queue_size: int):
+        self.recipe_id = recipe_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def push(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Deltas are useless once some are missing; drop the backlog and
+            # make the client reload instead.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            live_resyncs_total.inc()
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Hub:
+    """Subscriptions of this worker per recipe id."""
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscriptions: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, recipe_id: int) -> Subscription:
+        subscription = Subscription(recipe_id, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._subscriptions[recipe_id].add(subscription)
+            self._count += 1
+        live_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.recipe_id)
+            if not subscribers or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[subscription.recipe_id]
+            self._count -= 1
+        live_subscribers.dec()
+
+    def deliver(self, recipe_id: int, event: dict):
+        """Hand ``event`` to every local subscriber of ``recipe_id``; callable from any thread."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get(recipe_id, ()))
+        for subscription in subscribers:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is subscription.loop:
+                subscription.push(event)
+            else:
+                subscription.loop.call_soon_threadsafe(subscription.push, event)
+
+
+class LocalBroker:
+    def __init__(self, hub: Hub):
+        self.hub = hub
+
+    def publish(self, recipe_id: int, event: dict):
+        self.hub.deliver(recipe_id, event)
+
+
+class RedisBroker:
+    """Fan-out across workers and replicas through one Redis pub/sub channel."""
+
+    def __init__(self, hub: Hub, url: str = LIVE_REDIS_URL, channel: str = LIVE_REDIS_CHANNEL):
+        import redis
+
+        self.hub = hub
+        self.url = url
+        self.channel = channel
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._listener: Optional[threading.Thread] = None
+
+    def publish(self, recipe_id: int, event: dict):
+        self.client.publish(self.channel, json.dumps({"recipe_id": recipe_id, "event": event}, default=str))
+
+    def start(self):
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name="live-broker", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        import redis
+
+        # Separate connection without a read timeout: it idles between events.
+        subscriber = redis.Redis.from_url(self.url, socket_connect_timeout=0.5)
+        while True:
+            try:
+                listener = subscriber.pubsub(ignore_subscribe_messages=True)
+                listener.subscribe(self.channel)
+                for message in listener.listen():
+                    payload = json.loads(message["data"])
+                    self.hub.deliver(payload["recipe_id"], payload["event"])
+            except Exception as e:
+                logger.warning("Live event subscription to %s failed, reconnecting: %s", self.channel, e)
+                time.sleep(1)
+
+
+def _make_broker(hub: Hub):
+    if LIVE_BROKER == "redis":
+        return RedisBroker(hub)
+    if LIVE_BROKER != "local":
+        raise RuntimeError(f"Unknown LIVE_BROKER {LIVE_BROKER!r}")
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        logger.warning(
+            "LIVE_BROKER=local only reaches subscribers of the worker that served the write: with WEB_CONCURRENCY=%d "
+            "event streams miss most updates. Use LIVE_BROKER=redis.", workers,
+        )
+    return LocalBroker(hub)
+
+
+hub = Hub()
+broker = _make_broker(hub)
+
+
+def start():
+    """Start receiving from the broker (lifespan)."""
+    if isinstance(broker, RedisBroker):
+        broker.start()
+
+
+def publish(recipe_id: int, event: dict):
+    """Best effort: a broker outage must not fail the write that was already committed."""
+    try:
+        broker.publish(recipe_id, event)
+    except Exception as e:
+        logger.warning("Publishing %s event for recipe %s failed: %s", event.get("type"), recipe_id, e)
+        return
+    live_events_published_total.labels(type=event["type"]).inc()
+
+
+async def publish_async(recipe_id: int, event: dict):
+    """``publish`` for async handlers: network brokers are called from the threadpool."""
+    if isinstance(broker, LocalBroker):
+        publish(recipe_id, event)
+    else:
+        await run_in_threadpool(publish, recipe_id, event)
+
+
+def format_sse(event: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event['type']}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(event, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(subscription: Subscription, snapshot: dict, is_disconnected, heartbeat: float = LIVE_HEARTBEAT_SECONDS):
+    """SSE body: the current counts, then events as they arrive, with comment heartbeats."""
+    event_id = 0
+    try:
+        yield format_sse({"type": "snapshot", **snapshot}, event_id)
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                if await is_disconnected():
+                    return
+                # Keeps proxies from closing an idle connection.
+                yield ": keep-alive\n\n"
+                continue
+            event_id += 1
+            yield format_sse(event, event_id)
+    finally:
+        hub.unsubscribe(subscription)
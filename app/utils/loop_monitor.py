@@ -0,0 +1,78 @@
+"""Event-loop lag monitor.
+
+A task on the loop sleeps ``LOOP_LAG_INTERVAL_SECONDS`` at a time and
+observes how late it wakes up in ``event_loop_lag_seconds``: anything that
+runs on the loop without awaiting (sync SQLAlchemy calls in an ``async def``
+handler, CPU-heavy encoding) shows up as lag for every request of the worker.
+
+The task also stamps a heartbeat. A watchdog thread checks it and, when the
+loop has not come back for ``LOOP_LAG_THRESHOLD_SECONDS``, logs the loop
+thread's current stack once per stall, which names the handler that is
+blocking while it is still blocking. Reports are kept in ``stalls`` as well,
+so tests can assert that a code path never blocks the loop.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from ..metrics import event_loop_lag, event_loop_stalls_total
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.05"))
+LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_SECONDS", "0.25"))
+MAX_STALLS = 50
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS, threshold: float = LOOP_LAG_THRESHOLD_SECONDS):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: deque = deque(maxlen=MAX_STALLS)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        """Sample lag until cancelled; starts the watchdog for the current loop."""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self._heartbeat = now
+                event_loop_lag.observe(max(now - expected, 0.0))
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.interval):
+            heartbeat = self._heartbeat
+            if heartbeat == reported or time.monotonic() - heartbeat < self.threshold:
+                continue
+            # Only once per stall: the heartbeat moves again when the loop resumes.
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame))
+            blocked = time.monotonic() - heartbeat
+            self.stalls.append({"blocked_seconds": blocked, "stack": stack})
+            event_loop_stalls_total.inc()
+            logger.warning("Event loop blocked for %.3fs; loop thread stack:\n%s", blocked, stack)
+
+
+monitor = LoopMonitor()
@@ -0,0 +1,311 @@
+"""In-memory index of which recipes a user has liked / saved.
+
+Recipe pages ask "did I like / save this?" on every render, and nearly
+always the answer is no. With ``MEMBERSHIP_INDEX_ENABLED`` each worker keeps,
+per active user, a sorted ``array`` of the recipe ids they liked and saved,
+loaded from the primary on first use. Membership and batch checks are then a
+binary search, with no database round trip.
+
+The index holds at most ``MEMBERSHIP_MAX_USERS`` users, evicting the least
+recently used. Users with more than ``MEMBERSHIP_MAX_IDS`` rows are not
+cached and are always answered from the database. The crud write paths
+update the entries of the worker that served the write.
+
+Writes served by other workers would only show up once the entry expires
+after ``MEMBERSHIP_TTL_SECONDS``, which breaks read-your-writes when the
+user's next request lands elsewhere. With ``MEMBERSHIP_REDIS_URL`` every
+write, and every user purge, records a tick under the user's key for
+``MEMBERSHIP_TTL_SECONDS`` (by then any entry loaded earlier has expired
+anyway); recipe purges record one under a key shared by all users. Ticks come
+from a Redis script, so they are ordered like the writes whatever the workers'
+clocks say. Loads take a tick before querying, and a cached entry older than
+either key is dropped and reloaded, at the cost of one Redis MGET per check.
+If Redis is unreachable the check goes to the database. Without it the index
+refuses to run with ``WEB_CONCURRENCY`` > 1.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from .. import models
+from ..database import SessionLocal
+from ..metrics import membership_lookups_total
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_INDEX_ENABLED = os.getenv("MEMBERSHIP_INDEX_ENABLED", "false").lower() == "true"
+MEMBERSHIP_MAX_USERS = int(os.getenv("MEMBERSHIP_MAX_USERS", "10000"))
+MEMBERSHIP_MAX_IDS = int(os.getenv("MEMBERSHIP_MAX_IDS", "50000"))
+MEMBERSHIP_TTL_SECONDS = float(os.getenv("MEMBERSHIP_TTL_SECONDS", "60"))
+MEMBERSHIP_REDIS_URL = os.getenv("MEMBERSHIP_REDIS_URL", "")
+
+# Microseconds of the Redis clock, but never at or below a tick already handed out.
+_TICK = """
+local now = redis.call('TIME')
+local tick = math.max(tonumber(now[1]) * 1000000 + tonumber(now[2]), tonumber(redis.call('GET', KEYS[1]) or 0))
+redis.call('SET', KEYS[1], string.format('%.0f', tick))
+return tick
+"""
+
+# A fresh tick, stored under KEYS[2]; also returns the latest tick under KEYS[2] / KEYS[3] before it.
+_SHARE_WRITE = """
+local now = redis.call('TIME')
+local tick = math.max(tonumber(now[1]) * 1000000 + tonumber(now[2]), tonumber(redis.call('GET', KEYS[1]) or 0) + 1)
+local previous = math.max(tonumber(redis.call('GET', KEYS[2]) or 0), tonumber(redis.call('GET', KEYS[3]) or 0))
+redis.call('SET', KEYS[1], string.format('%.0f', tick))
+redis.call('SET', KEYS[2], string.format('%.0f', tick), 'PX', ARGV[1])
+return {previous, tick}
+"""
+
+
+# Arrays are never modified in place: readers search them without the lock.
+def _with(ids: array, recipe_id: int) -> array:
+    updated = array("q", ids)
+    insort(updated, recipe_id)
+    return updated
+
+
+def _without(ids: array, recipe_id: int) -> array:
+    position = bisect_left(ids, recipe_id)
+    if position == len(ids) or ids[position] != recipe_id:
+        return ids
+    return ids[:position] + ids[position + 1:]
+
+
+class _Entry:
+    __slots__ = ("ids", "expires", "loaded_at")
+
+    def __init__(self, ids: array, expires: float, loaded_at: int):
+        self.ids = ids
+        self.expires = expires
+        # Tick taken before the load; writes shared with a later tick may be missing.
+        self.loaded_at = loaded_at
+
+
+class MembershipIndex:
+    def __init__(self, name: str, model, enabled: bool = MEMBERSHIP_INDEX_ENABLED, max_users: int = MEMBERSHIP_MAX_USERS,
+                 max_ids: int = MEMBERSHIP_MAX_IDS, ttl: float = MEMBERSHIP_TTL_SECONDS, redis_url: str = MEMBERSHIP_REDIS_URL):
+        self.name = name
+        self.model = model
+        self.enabled = enabled
+        self.max_users = max_users
+        self.max_ids = max_ids
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self._redis = None
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        if enabled and workers > 1 and not redis_url:
+            logger.warning(
+                "MEMBERSHIP_INDEX_ENABLED without MEMBERSHIP_REDIS_URL would hide writes served by other workers "
+                "(WEB_CONCURRENCY=%d); the %s index is disabled.", workers, name,
+            )
+            self.enabled = False
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        # user_id -> True once a write touched the user while their ids were loading.
+        self._loading: Dict[int, bool] = {}
+        self._lock = threading.Lock()
+
+    def _store(self):
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        return self._redis
+
+    def _key(self, user_id: int) -> str:
+        return f"membership:{self.name}:{user_id}"
+
+    def _recipes_key(self) -> str:
+        return f"membership:{self.name}:recipes"
+
+    def _tick(self) -> Optional[int]:
+        """A tick for a load, or None when Redis can't order it against the writes."""
+        if not self.redis_url:
+            return 0
+        try:
+            return int(self._store().eval(_TICK, 1, f"membership:{self.name}:clock"))
+        except Exception as e:
+            logger.warning("Could not read the %s clock: %s", self.name, e)
+            return None
+
+    def _share_write(self, key: str) -> Optional[Tuple[int, int]]:
+        """Record a write under ``key`` for the other workers.
+
+        Returns the latest tick shared for the same user (or any recipe purge)
+        before this write, and the write's own tick.
+        """
+        if not self.enabled or not self.redis_url:
+            return None
+        try:
+            previous, written_at = self._store().eval(
+                _SHARE_WRITE, 3, f"membership:{self.name}:clock", key, self._recipes_key(), int(self.ttl * 1000),
+            )
+        except Exception as e:
+            # Other workers may serve stale entries until they expire; ``_keep`` drops ours.
+            logger.warning("Could not share %s write under %s: %s", self.name, key, e)
+            return None
+        return int(previous), int(written_at)
+
+    def _written_since(self, user_id: int, loaded_at: int) -> bool:
+        """Whether a write shared by any worker may be missing from an entry loaded at ``loaded_at``."""
+        if not self.redis_url:
+            return False
+        try:
+            ticks = self._store().mget([self._key(user_id), self._recipes_key()])
+        except Exception as e:
+            logger.warning("Could not read %s writes of user %s: %s", self.name, user_id, e)
+            return True
+        return any(tick is not None and int(tick) > loaded_at for tick in ticks)
+
+    def _load(self, user_id: int) -> Optional[array]:
+        loaded_at = self._tick()
+        with self._lock:
+            # A load already in flight keeps its flag; whichever finishes second
+            # finds no flag and doesn't store, which is merely conservative.
+            self._loading.setdefault(user_id, False)
+        try:
+            db = SessionLocal()
+            try:
+                ids = db.scalars(
+                    select(self.model.recipe_id)
+                    .where(self.model.user_id == user_id)
+                    .order_by(self.model.recipe_id)
+                    .limit(self.max_ids + 1)
+                ).all()
+            finally:
+                db.close()
+        except BaseException:
+            with self._lock:
+                self._loading.pop(user_id, None)
+            raise
+        cacheable = len(ids) <= self.max_ids
+        loaded = array("q", ids) if cacheable else None
+        with self._lock:
+            stale = self._loading.pop(user_id, True)
+            if cacheable and not stale and loaded_at is not None:
+                self._entries[user_id] = _Entry(loaded, time.monotonic() + self.ttl, loaded_at)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return loaded
+
+    def _ids(self, user_id: int) -> Optional[array]:
+        """The user's sorted ids, loading them if needed; None when the index can't answer."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry.expires <= time.monotonic():
+                entry = None
+        if entry is not None and not self._written_since(user_id, entry.loaded_at):
+            with self._lock:
+                if user_id in self._entries:
+                    self._entries.move_to_end(user_id)
+            membership_lookups_total.labels(index=self.name, result="hit").inc()
+            return entry.ids
+        ids = self._load(user_id)
+        membership_lookups_total.labels(index=self.name, result="load" if ids is not None else "bypass").inc()
+        return ids
+
+    def contains(self, user_id: int, recipe_id: int) -> Optional[bool]:
+        ids = self._ids(user_id)
+        if ids is None:
+            return None
+        position = bisect_left(ids, recipe_id)
+        return position < len(ids) and ids[position] == recipe_id
+
+    def filter(self, user_id: int, recipe_ids: Iterable[int]) -> Optional[List[int]]:
+        """The subset of ``recipe_ids`` the user has, in ascending order."""
+        ids = self._ids(user_id)
+        if ids is None:
+            return None
+        found = []
+        for recipe_id in sorted(set(recipe_ids)):
+            position = bisect_left(ids, recipe_id)
+            if position < len(ids) and ids[position] == recipe_id:
+                found.append(recipe_id)
+        return found
+
+    # Write paths. Called after the commit, from a thread (they may block on Redis).
+
+    def _keep(self, entry: _Entry, shared: Optional[Tuple[int, int]]) -> bool:
+        """Whether ``entry`` can be updated in place rather than dropped."""
+        if not self.redis_url:
+            return True
+        if shared is None:
+            return False
+        previous, written_at = shared
+        if previous > entry.loaded_at:
+            # Another worker wrote after the load: the entry may miss that write.
+            return False
+        # This worker's own write is applied below, so the entry is current as of it.
+        entry.loaded_at = written_at
+        return True
+
+    def add(self, user_id: int, recipe_id: int):
+        shared = self._share_write(self._key(user_id))
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if not self._keep(entry, shared):
+                del self._entries[user_id]
+                return
+            position = bisect_left(entry.ids, recipe_id)
+            if position < len(entry.ids) and entry.ids[position] == recipe_id:
+                return
+            if len(entry.ids) >= self.max_ids:
+                del self._entries[user_id]
+                return
+            entry.ids = _with(entry.ids, recipe_id)
+
+    def remove(self, user_id: int, recipe_id: int):
+        shared = self._share_write(self._key(user_id))
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if not self._keep(entry, shared):
+                del self._entries[user_id]
+                return
+            entry.ids = _without(entry.ids, recipe_id)
+
+    def forget_user(self, user_id: int):
+        self._share_write(self._key(user_id))
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            self._entries.pop(user_id, None)
+
+    def forget_recipe(self, recipe_id: int):
+        self._share_write(self._recipes_key())
+        with self._lock:
+            for user_id in self._loading:
+                self._loading[user_id] = True
+            if self.redis_url:
+                # Every entry predates the purge just shared, so each would be reloaded anyway.
+                self._entries.clear()
+                return
+            for entry in self._entries.values():
+                entry.ids = _without(entry.ids, recipe_id)
+
+    def clear(self):
+        with self._lock:
+            for user_id in self._loading:
+                self._loading[user_id] = True
+            self._entries.clear()
+
+
+liked = MembershipIndex("likes", models.Like)
+saved = MembershipIndex("saved", models.SavedRecipe)
@@ -0,0 +1,322 @@
+"""Memory diagnostics: process RSS, tracemalloc snapshots and per-route peaks.
+
+``process_memory_bytes`` is refreshed every ``MEMORY_SAMPLE_SECONDS`` by a
+background task, so pod memory limits can be sized from real usage. Python
+heap figures (``traced``/``traced_peak``) need tracemalloc, which costs CPU
+and memory of its own: it is off unless ``MEMORY_TRACEMALLOC_FRAMES`` is set
+or an admin starts it through ``POST /admin/memory/tracing``.
+
+While tracing, snapshots can be taken on demand and compared to find the
+allocation sites that grow. Each admin call reaches one worker, so responses
+carry the worker's pid; with ``MEMORY_SNAPSHOT_DIR`` set every worker dumps
+its snapshots there and any worker can list, show and diff them. Diffs only
+make sense between snapshots of the same worker.
+
+With ``MEMORY_TRACK_ROUTES`` the metrics middleware also records, per route
+template, how far the traced heap rose above its level at the start of the
+request. tracemalloc keeps a single peak, so it is reset whenever a request
+starts and the peak reached so far is first credited to the requests already
+in flight. A request is thus never charged for peaks from before it started,
+but still for what others allocated at the same time; the per-route maximum
+is a pointer to heavy endpoints, not an exact figure.
+"""
+import asyncio
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..metrics import process_memory_bytes, request_memory_peak_bytes
+
+logger = logging.getLogger(__name__)
+
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))
+MEMORY_TRACK_ROUTES = os.getenv("MEMORY_TRACK_ROUTES", "false").lower() == "true"
+MEMORY_SAMPLE_SECONDS = float(os.getenv("MEMORY_SAMPLE_SECONDS", "15"))
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "5"))
+MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR")
+GROUP_BY = ("lineno", "filename", "traceback")
+
+# Allocations made by the diagnostics themselves.
+_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_status() -> dict:
+    traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+        "traced_bytes": traced,
+        "traced_peak_bytes": peak,
+        "snapshots": snapshots.list(),
+    }
+
+
+def update_gauges():
+    process_memory_bytes.labels(kind="rss").set(rss_bytes())
+    if tracemalloc.is_tracing():
+        traced, peak = tracemalloc.get_traced_memory()
+        process_memory_bytes.labels(kind="traced").set(traced)
+        process_memory_bytes.labels(kind="traced_peak").set(peak)
+
+
+async def run_memory_sampler():
+    while True:
+        try:
+            update_gauges()
+        except Exception:
+            logger.exception("Memory sampling failed")
+        await asyncio.sleep(MEMORY_SAMPLE_SECONDS)
+
+
+def start_tracing(frames: int):
+    if tracemalloc.is_tracing():
+        if tracemalloc.get_traceback_limit() == frames:
+            return
+        # The traceback depth is fixed per tracing session.
+        tracemalloc.stop()
+        snapshots.clear()
+    tracemalloc.start(frames)
+    logger.info("tracemalloc started with %d frames", frames)
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    snapshots.clear()
+    routes.reset()
+
+
+class SnapshotStore:
+    """The last ``MEMORY_MAX_SNAPSHOTS`` tracemalloc snapshots, by id.
+
+    Without a directory the snapshots live in this worker only. With one,
+    ``<id>.tracemalloc`` holds the dump and ``<id>.json`` its description;
+    ids are claimed by creating the description exclusively, so workers
+    sharing the directory never hand out the same id.
+    """
+
+    def __init__(self, max_snapshots: int = MEMORY_MAX_SNAPSHOTS, directory: Optional[str] = MEMORY_SNAPSHOT_DIR):
+        self.max_snapshots = max_snapshots
+        self.directory = Path(directory) if directory else None
+        self._snapshots: "OrderedDict[int, dict]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def take(self) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        entry = {
+            "taken_at": time.time(),
+            "pid": os.getpid(),
+            "traced_bytes": sum(trace.size for trace in snapshot.traces),
+            "snapshot": snapshot,
+        }
+        if self.directory:
+            self._write(entry)
+            return entry
+        with self._lock:
+            entry["snapshot_id"] = self._next_id
+            self._snapshots[self._next_id] = entry
+            self._next_id += 1
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return entry
+
+    def get(self, snapshot_id: int) -> Optional[dict]:
+        if self.directory:
+            return self._read(snapshot_id)
+        with self._lock:
+            return self._snapshots.get(snapshot_id)
+
+    def list(self) -> List[dict]:
+        if self.directory:
+            return [description for _, description in self._descriptions()]
+        with self._lock:
+            return [_describe(entry) for entry in self._snapshots.values()]
+
+    def clear(self):
+        """Drop the snapshots of this worker; other workers' snapshots stay usable."""
+        with self._lock:
+            self._snapshots.clear()
+        if self.directory:
+            for snapshot_id, description in self._descriptions():
+                if description["pid"] == os.getpid():
+                    self._unlink(snapshot_id)
+
+    def _write(self, entry: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        snapshot_id = max((i for i, _ in self._descriptions(complete=False)), default=0) + 1
+        while True:
+            try:
+                os.close(os.open(self.directory / f"{snapshot_id}.json", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                snapshot_id += 1
+        entry["snapshot_id"] = snapshot_id
+        entry["snapshot"].dump(str(self.directory / f"{snapshot_id}.tracemalloc"))
+        # The description is written last: until then the id is claimed but not listed.
+        tmp = self.directory / f"{snapshot_id}.json.tmp"
+        tmp.write_text(json.dumps(_describe(entry)))
+        tmp.replace(self.directory / f"{snapshot_id}.json")
+        for old_id, _ in self._descriptions()[:-self.max_snapshots]:
+            self._unlink(old_id)
+
+    def _read(self, snapshot_id: int) -> Optional[dict]:
+        try:
+            description = json.loads((self.directory / f"{snapshot_id}.json").read_text())
+            snapshot = tracemalloc.Snapshot.load(str(self.directory / f"{snapshot_id}.tracemalloc"))
+        except (OSError, ValueError, EOFError):
+            return None
+        return {**description, "snapshot": snapshot}
+
+    def _descriptions(self, complete: bool = True) -> List[tuple]:
+        """(id, description) of the stored snapshots, oldest first; with ``complete=False`` also claimed ids."""
+        found = []
+        for path in self.directory.glob("*.json") if self.directory.exists() else ():
+            try:
+                snapshot_id = int(path.stem)
+            except ValueError:
+                continue
+            try:
+                description = json.loads(path.read_text())
+            except (OSError, ValueError):
+                description = None
+            if description is not None or not complete:
+                found.append((snapshot_id, description))
+        return sorted(found, key=lambda item: item[0])
+
+    def _unlink(self, snapshot_id: int):
+        (self.directory / f"{snapshot_id}.json").unlink(missing_ok=True)
+        (self.directory / f"{snapshot_id}.tracemalloc").unlink(missing_ok=True)
+
+
+def _describe(entry: dict) -> dict:
+    return {key: entry[key] for key in ("snapshot_id", "pid", "taken_at", "traced_bytes")}
+
+
+def _site(stat) -> str:
+    # Allocating frame first, then its callers.
+    return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)) or "<unknown>"
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, group_by: str = "lineno", limit: int = 20) -> List[dict]:
+    return [
+        {"site": _site(stat), "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+
+
+def diff_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                     group_by: str = "lineno", limit: int = 20) -> List[dict]:
+    """Allocation sites sorted by absolute growth from ``before`` to ``after``."""
+    return [
+        {
+            "site": _site(stat),
+            "size_bytes": stat.size,
+            "size_diff_bytes": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+        }
+        for stat in after.compare_to(before, group_by)[:limit]
+    ]
+
+
+class Measurement:
+    __slots__ = ("baseline", "peak")
+
+    def __init__(self, baseline: int):
+        self.baseline = baseline
+        self.peak = baseline
+
+
+class RouteMemory:
+    """Traced-heap rise per request, aggregated per route template."""
+
+    def __init__(self):
+        self.routes: Dict[str, dict] = {}
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def _credit_peak(self) -> int:
+        """Fold the peak since the last reset into every request in flight; returns the current size."""
+        traced, peak = tracemalloc.get_traced_memory()
+        for measurement in self._active:
+            measurement.peak = max(measurement.peak, peak)
+        return traced
+
+    def start(self) -> Optional[Measurement]:
+        if not tracemalloc.is_tracing():
+            return None
+        with self._lock:
+            measurement = Measurement(self._credit_peak())
+            tracemalloc.reset_peak()
+            self._active.add(measurement)
+        return measurement
+
+    def finish(self, measurement: Optional[Measurement], route: str):
+        if measurement is None:
+            return
+        with self._lock:
+            if tracemalloc.is_tracing():
+                self._credit_peak()
+            self._active.discard(measurement)
+            if not tracemalloc.is_tracing():
+                return
+            peak = max(measurement.peak - measurement.baseline, 0)
+            stats = self.routes.setdefault(route, {"requests": 0, "max_peak_bytes": 0, "total_peak_bytes": 0})
+            stats["requests"] += 1
+            stats["max_peak_bytes"] = max(stats["max_peak_bytes"], peak)
+            stats["total_peak_bytes"] += peak
+        request_memory_peak_bytes.labels(route=route).observe(peak)
+
+    def collect(self) -> List[dict]:
+        with self._lock:
+            return sorted(
+                (
+                    {
+                        "route": route,
+                        "requests": s["requests"],
+                        "max_peak_bytes": s["max_peak_bytes"],
+                        "mean_peak_bytes": s["total_peak_bytes"] // s["requests"],
+                    }
+                    for route, s in self.routes.items()
+                ),
+                key=lambda r: -r["max_peak_bytes"],
+            )
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+
+snapshots = SnapshotStore()
+routes = RouteMemory()
+
+
+def configure_memory_tracing():
+    if MEMORY_TRACEMALLOC_FRAMES > 0:
+        start_tracing(MEMORY_TRACEMALLOC_FRAMES)
@@ -0,0 +1,171 @@
+"""Opt-in statistical profiler for live requests.
+
+A request is profiled when it is picked by ``PROFILE_SAMPLE_RATE`` or sends
+``X-Profile: 1`` together with a valid ``X-Internal-Token``. While at least one
+profiled request is in flight, a daemon thread samples the stacks of every
+busy thread in the worker every ``PROFILE_INTERVAL_SECONDS``; each sample is
+credited to all profiled requests in flight at that moment. The event loop
+is shared, so under concurrency a profile also contains samples of whatever
+else the worker was doing.
+
+Samples are folded into collapsed stacks (``frame;frame;frame count``, the
+input format of flamegraph.pl and speedscope) per route template. With
+``PROFILE_DIR`` set every worker writes its profiles to ``<pid>.json`` there
+and the admin endpoints merge them. When nothing is profiled the cost is one
+random draw and one header lookup per request.
+"""
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+
+from .auth import INTERNAL_API_TOKEN
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_SECONDS", "0.005"))
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "2000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_HEADER = "x-profile"
+
+# Leaf frames of threads that are parked, not working.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class Session:
+    __slots__ = ("stacks", "samples")
+
+    def __init__(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class Profiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS, max_stacks: int = PROFILE_MAX_STACKS,
+                 directory: Optional[str] = PROFILE_DIR):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.directory = Path(directory) if directory else None
+        self.profiles: Dict[str, dict] = {}
+        self._active = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Session:
+        session = Session()
+        with self._lock:
+            self._active.add(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return session
+
+    def finish(self, session: Session, route: str, duration: float):
+        with self._lock:
+            self._active.discard(session)
+            profile = self.profiles.setdefault(route, {"requests": 0, "samples": 0, "seconds": 0.0, "stacks": Counter()})
+            profile["requests"] += 1
+            profile["samples"] += session.samples
+            profile["seconds"] += duration
+            profile["stacks"].update(session.stacks)
+            if len(profile["stacks"]) > self.max_stacks:
+                profile["stacks"] = Counter(dict(profile["stacks"].most_common(self.max_stacks)))
+            snapshot = self._serializable() if self.directory else None
+        if snapshot is not None:
+            self._write(snapshot)
+
+    def reset(self):
+        with self._lock:
+            self.profiles.clear()
+        if self.directory:
+            for path in self.directory.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wakeup.clear()
+                self._wakeup.wait()
+            stacks = [_collapse(frame) for ident, frame in sys._current_frames().items() if ident != own]
+            stacks = [s for s in stacks if s]
+            with self._lock:
+                for session in self._active:
+                    session.samples += 1
+                    session.stacks.update(stacks)
+            time.sleep(self.interval)
+
+    def _serializable(self) -> dict:
+        return {route: {**p, "stacks": dict(p["stacks"])} for route, p in self.profiles.items()}
+
+    def _write(self, snapshot: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f"{os.getpid()}.json.tmp"
+        tmp.write_text(json.dumps(snapshot))
+        tmp.replace(self.directory / f"{os.getpid()}.json")
+
+    def collect(self) -> Dict[str, dict]:
+        """Profiles of this worker, or of every worker when ``PROFILE_DIR`` is set."""
+        if not self.directory:
+            with self._lock:
+                return self._serializable()
+        merged: Dict[str, dict] = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for route, p in data.items():
+                into = merged.setdefault(route, {"requests": 0, "samples": 0, "seconds": 0.0, "stacks": Counter()})
+                into["requests"] += p["requests"]
+                into["samples"] += p["samples"]
+                into["seconds"] += p["seconds"]
+                into["stacks"].update(p["stacks"])
+        return {route: {**p, "stacks": dict(p["stacks"])} for route, p in merged.items()}
+
+
+def _collapse(frame) -> Optional[str]:
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+
+
+profiler = Profiler()
+
+
+def should_profile(request: Request) -> bool:
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    if request.headers.get(PROFILE_HEADER) not in ("1", "true"):
+        return False
+    token = request.headers.get("x-internal-token")
+    return bool(INTERNAL_API_TOKEN and token and hmac.compare_digest(token, INTERNAL_API_TOKEN))
+
+
+def route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
@@ -0,0 +1,165 @@
+"""Per-user token buckets for write endpoints.
+
+Buckets are keyed by ``(route group, user_id)`` and configured with
+``RATE_LIMITS`` as ``group=requests/seconds`` pairs, e.g.
+``like=30/60,follow=20/60``: a burst of ``requests`` refilled evenly over
+``seconds``. ``RATE_LIMIT_BACKEND=memory`` keeps buckets per worker process;
+``redis`` shares them between workers and pods through ``RATE_LIMIT_REDIS_URL``.
+
+The check is a route-level dependency, so it runs right after the JWT is
+decoded and before any database or upstream work.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+
+from ..metrics import rate_limit_errors_total, rate_limited_total
+from .auth import get_current_user_id
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://redis:6379/0")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+DEFAULT_RATE_LIMITS = "like=30/60,save=30/60,follow=20/60,comment=10/60"
+
+
+def _parse_limits(raw: str) -> Dict[str, Tuple[float, float]]:
+    """``group=requests/seconds`` pairs -> {group: (capacity, refill per second)}; ``off`` disables a group."""
+    limits = {}
+    for item in raw.split(","):
+        group, _, spec = item.partition("=")
+        group, spec = group.strip(), spec.strip()
+        if not group or not spec:
+            continue
+        if spec == "off":
+            limits.pop(group, None)
+            continue
+        requests, _, seconds = spec.partition("/")
+        try:
+            capacity, period = float(requests), float(seconds or 1)
+        except ValueError:
+            logger.warning("Ignoring invalid RATE_LIMITS entry %r", item)
+            continue
+        if capacity > 0 and period > 0:
+            limits[group] = (capacity, capacity / period)
+    return limits
+
+
+RATE_LIMITS = _parse_limits(DEFAULT_RATE_LIMITS + "," + os.getenv("RATE_LIMITS", ""))
+
+
+class MemoryBackend:
+    """Buckets in a bounded LRU; an evicted bucket simply starts full again."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token. Returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1.0:
+                tokens -= 1.0
+            else:
+                wait = (1.0 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS[1] bucket; ARGV capacity, rate, now (seconds). Returns milliseconds to wait (0 = allowed).
+_REDIS_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return wait
+"""
+
+
+class RedisBackend:
+    """Buckets shared by all workers; the refill and take run atomically in a Lua script."""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        self._script = self.client.register_script(_REDIS_BUCKET)
+
+    def acquire(self, key: str, capacity: float, rate: float) -> float:
+        return int(self._script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()])) / 1000.0
+
+    def reset(self):
+        for key in self.client.scan_iter("ratelimit:*"):
+            self.client.delete(key)
+
+
+def _make_backend():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend()
+    if RATE_LIMIT_BACKEND != "memory":
+        raise RuntimeError(f"Unknown RATE_LIMIT_BACKEND {RATE_LIMIT_BACKEND!r}")
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        logger.warning(
+            "RATE_LIMIT_BACKEND=memory keeps buckets per worker: with WEB_CONCURRENCY=%d a user gets up to "
+            "%dx the configured limits per pod. Use RATE_LIMIT_BACKEND=redis.", workers, workers,
+        )
+    return MemoryBackend()
+
+
+backend = _make_backend()
+
+
+def rate_limit(group: str):
+    """Route dependency: 429 with ``Retry-After`` once ``user_id`` exhausts the group's bucket."""
+
+    def _check(user_id: int = Depends(get_current_user_id)) -> None:
+        limit: Optional[Tuple[float, float]] = RATE_LIMITS.get(group)
+        if limit is None:
+            return
+        try:
+            wait = backend.acquire(f"{group}:{user_id}", *limit)
+        except Exception as e:
+            # A broken shared store must not take the write endpoints down with it.
+            rate_limit_errors_total.labels(group=group).inc()
+            logger.warning("Rate limit check for %s failed open: %s", group, e)
+            return
+        if wait > 0:
+            rate_limited_total.labels(group=group).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+
+    return _check
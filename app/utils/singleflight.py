@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from ..metrics import singleflight_calls_total, singleflight_coalesced_total
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent callers asking for the same key.
+
+    The first caller for a key starts ``fn()`` as a task; callers arriving
+    while it runs await the same task instead of starting their own. The
+    result is not cached: once the task finishes the next caller starts a
+    fresh call. The task is shielded, so a cancelled caller does not cancel
+    the work the others are waiting on.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None:
+            singleflight_coalesced_total.labels(operation=self.operation).inc()
+        else:
+            singleflight_calls_total.labels(operation=self.operation).inc()
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter was cancelled.
+            task.exception()
@@ -0,0 +1,165 @@
+"""OpenTelemetry tracing for requests, auth, upstream calls, SQL and response serialization.
+
+Instrumentation always goes through the OpenTelemetry API, which is a no-op
+until a tracer provider is installed. ``TRACING_EXPORTER`` installs the SDK:
+
+* ``console`` – spans as JSON lines on stdout
+* ``file``    – spans as JSON lines appended to ``TRACING_FILE``
+* ``none``    – disabled (default)
+
+Spans per request: the server span (``METHOD /route/{template}``, continuing
+an incoming ``traceparent``), ``auth.get_current_user_id``, one client span
+per upstream call (with ``traceparent`` injected so the recipe/user services
+join the trace), one span per SQL statement, ``db.commit`` and
+``response.serialize``.
+"""
+import logging
+import os
+import sys
+
+from opentelemetry import context, trace
+from opentelemetry.propagate import extract
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "social-service")
+MAX_STATEMENT_LENGTH = 1000
+
+tracer = trace.get_tracer("social_service")
+_enabled = False
+
+
+def configure_tracing(exporter=None, simple: bool = False) -> bool:
+    """Install the SDK tracer provider and the SQL/serialization hooks.
+
+    ``exporter`` overrides ``TRACING_EXPORTER``; ``simple`` exports each span
+    synchronously instead of in batches (tests, debugging).
+    """
+    global _enabled
+    if _enabled:
+        return True
+    if exporter is None and TRACING_EXPORTER == "none":
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warning("TRACING_EXPORTER=%s but opentelemetry-sdk is not installed; tracing disabled", TRACING_EXPORTER)
+        return False
+
+    if exporter is None:
+        if TRACING_EXPORTER == "file":
+            out = open(TRACING_FILE, "a", buffering=1)
+        elif TRACING_EXPORTER == "console":
+            out = sys.stdout
+        else:
+            raise RuntimeError(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    provider.add_span_processor(SimpleSpanProcessor(exporter) if simple else BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    _instrument_sqlalchemy()
+    _instrument_serialization()
+    _enabled = True
+    return True
+
+
+def _instrument_sqlalchemy():
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_statement(conn, cursor, statement, parameters, ctx, executemany):
+        span = tracer.start_span(statement.split(None, 1)[0].upper() if statement else "SQL", kind=SpanKind.CLIENT)
+        span.set_attribute("db.system", conn.dialect.name)
+        span.set_attribute("db.statement", statement[:MAX_STATEMENT_LENGTH])
+        ctx._otel_span = span
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _end_statement(conn, cursor, statement, parameters, ctx, executemany):
+        span = getattr(ctx, "_otel_span", None)
+        if span is not None:
+            span.end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _fail_statement(exception_context):
+        span = getattr(exception_context.execution_context, "_otel_span", None)
+        if span is not None:
+            span.record_exception(exception_context.original_exception)
+            span.set_status(Status(StatusCode.ERROR))
+            span.end()
+
+    # Commit spans include the flush, so the INSERT/UPDATE spans nest under them.
+    @event.listens_for(Session, "before_commit")
+    def _start_commit(session):
+        span = tracer.start_span("db.commit")
+        session.info["_otel_commit"] = (span, context.attach(trace.set_span_in_context(span)))
+
+    def _end_commit(session, error: bool = False):
+        span, token = session.info.pop("_otel_commit", (None, None))
+        if span is None:
+            return
+        context.detach(token)
+        if error:
+            span.set_status(Status(StatusCode.ERROR))
+        span.end()
+
+    event.listen(Session, "after_commit", _end_commit)
+    event.listen(Session, "after_rollback", lambda session: _end_commit(session, error=True))
+
+
+def _instrument_serialization():
+    # FastAPI validates and encodes response models inside its request handler,
+    # with no hook of its own; wrap the module-level function it calls.
+    import fastapi.routing as routing
+
+    original = routing.serialize_response
+
+    async def serialize_response(*args, **kwargs):
+        with tracer.start_as_current_span("response.serialize"):
+            return await original(*args, **kwargs)
+
+    routing.serialize_response = serialize_response
+
+
+class TracingMiddleware:
+    """Server span per HTTP request; a plain pass-through until tracing is configured."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not _enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        method = scope["method"]
+        with tracer.start_as_current_span(f"{method} {scope['path']}", context=extract(carrier), kind=SpanKind.SERVER) as span:
+            span.set_attribute("http.request.method", method)
+            span.set_attribute("url.path", scope["path"])
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"{method} {route}")
+                    span.set_attribute("http.route", route)
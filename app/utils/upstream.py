@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Set, Tuple
+
+import httpx
+from fastapi import HTTPException
+from opentelemetry.propagate import inject
+from opentelemetry.trace import SpanKind
+from starlette.concurrency import run_in_threadpool
+
+from ..crud.cleanup import delete_recipe_rows, delete_user_rows
+from ..database import SessionLocal
+from .singleflight import SingleFlight
+from .tracing import tracer
+
+from ..metrics import (
+    upstream_circuit_state,
+    upstream_circuit_transitions_total,
+    upstream_requests_total,
+    upstream_optimistic_accepts_total,
+    upstream_reconciled_total,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+FAIL_FAST, OPTIMISTIC = "fail_fast", "optimistic"
+
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "0.5"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "1"))
+UPSTREAM_RETRY_BUDGET_RATIO = float(os.getenv("UPSTREAM_RETRY_BUDGET_RATIO", "0.1"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "15"))
+UPSTREAM_RECONCILE_SECONDS = float(os.getenv("UPSTREAM_RECONCILE_SECONDS", "30"))
+
+
+def _parse_policies(raw: str) -> Dict[str, str]:
+    policies = {"like": OPTIMISTIC, "save": OPTIMISTIC, "comment": FAIL_FAST, "follow": FAIL_FAST}
+    for item in raw.split(","):
+        endpoint, _, policy = item.partition("=")
+        if endpoint.strip() and policy.strip() in (FAIL_FAST, OPTIMISTIC):
+            policies[endpoint.strip()] = policy.strip()
+    return policies
+
+
+# Per write endpoint: fail fast with 502 while the upstream is unavailable,
+# or accept the write and let the reconciler verify it later.
+UPSTREAM_POLICIES = _parse_policies(os.getenv("UPSTREAM_POLICIES", ""))
+
+
+class UpstreamUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures.
+
+    After ``reset_seconds`` one probe call is let through (half-open); its
+    outcome closes or re-opens the circuit. Everything else is rejected
+    immediately while the circuit is not closed.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+        upstream_circuit_state.labels(upstream=name).set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+        upstream_circuit_transitions_total.labels(upstream=self.name, from_state=self.state, to_state=state).inc()
+        upstream_circuit_state.labels(upstream=self.name).set(_STATE_VALUES[state])
+        self.state = state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            now = time.monotonic()
+            # A probe that never reported back (e.g. cancelled) must not wedge the circuit.
+            if self._probe_started is None or now - self._probe_started >= self.reset_seconds:
+                self._probe_started = now
+                return True
+        return False
+
+    def record_success(self):
+        self._probe_started = None
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self._probe_started = None
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+
+class RetryBudget:
+    """Retries are capped at ``ratio`` of first attempts so they cannot multiply load during a brownout."""
+
+    def __init__(self, ratio: float = UPSTREAM_RETRY_BUDGET_RATIO, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Upstream:
+    def __init__(self, name: str, base_url: str, timeout: float, deadline: float):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=UPSTREAM_CONNECT_TIMEOUT)
+        self.deadline = deadline
+        self.breaker = CircuitBreaker(name)
+        self.budget = RetryBudget()
+        self._flight = SingleFlight(f"{name}.exists")
+
+    async def exists(self, resource_id: int) -> bool:
+        """True on 2xx, False on 404; raises UpstreamUnavailable on any other status, timeouts or an open circuit.
+
+        Callers purge data when this returns False, so only an explicit 404
+        counts as "does not exist": a 401/403/429 says nothing about the id.
+        Concurrent checks for the same id share one upstream call.
+        """
+        return await self._flight.do(resource_id, lambda: self._exists(resource_id))
+
+    async def _exists(self, resource_id: int) -> bool:
+        if not self.breaker.allow():
+            upstream_requests_total.labels(upstream=self.name, outcome="rejected").inc()
+            raise UpstreamUnavailable(f"{self.name} circuit open")
+
+        self.budget.deposit()
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                url = f"{self.base_url}/{resource_id}"
+                with tracer.start_as_current_span(f"GET {self.name}", kind=SpanKind.CLIENT) as span:
+                    span.set_attribute("http.request.method", "GET")
+                    span.set_attribute("url.full", url)
+                    headers = {}
+                    inject(headers)  # traceparent, so the upstream joins this trace
+                    async with httpx.AsyncClient(timeout=self.timeout) as client:
+                        response = await client.get(url, headers=headers)
+                    span.set_attribute("http.response.status_code", response.status_code)
+                if 200 <= response.status_code < 300 or response.status_code == 404:
+                    self.breaker.record_success()
+                    found = response.status_code != 404
+                    upstream_requests_total.labels(upstream=self.name, outcome="found" if found else "not_found").inc()
+                    return found
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = e.__class__.__name__
+
+            upstream_requests_total.labels(upstream=self.name, outcome="error").inc()
+            elapsed = time.monotonic() - started
+            if (
+                attempt < UPSTREAM_MAX_RETRIES
+                and self.breaker.state == CLOSED
+                and elapsed + self.timeout.read < self.deadline
+                and self.budget.withdraw()
+            ):
+                attempt += 1
+                upstream_requests_total.labels(upstream=self.name, outcome="retry").inc()
+                continue
+
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(f"{self.name} unavailable ({error})")
+
+
+recipes = Upstream(
+    "recipe_service",
+    os.getenv("RECIPE_SERVICE_URL", ""),
+    timeout=float(os.getenv("RECIPE_SERVICE_TIMEOUT", "2.0")),
+    deadline=float(os.getenv("RECIPE_SERVICE_DEADLINE", "3.0")),
+)
+users = Upstream(
+    "user_service",
+    os.getenv("USER_SERVICE_URL", ""),
+    timeout=float(os.getenv("USER_SERVICE_TIMEOUT", "2.0")),
+    deadline=float(os.getenv("USER_SERVICE_DEADLINE", "3.0")),
+)
+
+
+# (upstream name, resource id) accepted optimistically and not yet verified.
+pending_checks: Set[Tuple[str, int]] = set()
+
+
+async def verify_exists(upstream: Upstream, resource_id: int, endpoint: str, not_found_detail: str):
+    """Raise 404/502 per the endpoint's policy, or record the id for later reconciliation."""
+    try:
+        found = await upstream.exists(resource_id)
+    except UpstreamUnavailable as e:
+        if UPSTREAM_POLICIES.get(endpoint, FAIL_FAST) != OPTIMISTIC:
+            raise HTTPException(status_code=502, detail=str(e))
+        pending_checks.add((upstream.name, resource_id))
+        upstream_optimistic_accepts_total.labels(endpoint=endpoint).inc()
+        return
+    if not found:
+        raise HTTPException(status_code=404, detail=not_found_detail)
+
+
+async def reconcile_pending():
+    """Re-check optimistically accepted ids and purge rows for the ones that do not exist."""
+    upstreams = {recipes.name: (recipes, delete_recipe_rows), users.name: (users, delete_user_rows)}
+    for key in list(pending_checks):
+        name, resource_id = key
+        upstream, purge = upstreams[name]
+        if upstream.breaker.state != CLOSED:
+            continue
+        try:
+            found = await upstream.exists(resource_id)
+        except UpstreamUnavailable:
+            continue
+        pending_checks.discard(key)
+        if found:
+            upstream_reconciled_total.labels(upstream=name, result="confirmed").inc()
+            continue
+
+        def _purge():
+            db = SessionLocal()
+            try:
+                return purge(db, resource_id)
+            finally:
+                db.close()
+
+        counts = await run_in_threadpool(_purge)
+        upstream_reconciled_total.labels(upstream=name, result="purged").inc()
+        logger.info("Purged rows for missing %s %s: %s", name, resource_id, counts)
+
+
+async def run_reconciler(interval: float = UPSTREAM_RECONCILE_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_pending()
+        except Exception:
+            logger.exception("Upstream reconciliation failed")
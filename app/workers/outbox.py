@@ -0,0 +1,229 @@
+"""Relay from the ``outbox_events`` table to downstream consumers.
+
+Every create/delete in ``app/crud`` writes an outbox row in its own
+transaction, so an event exists exactly when the change committed. The relay
+reads undelivered rows in ``event_id`` order, hands a batch to the sink and
+only then marks it published. A crash between the two re-sends the batch:
+delivery is at least once and consumers deduplicate by ``event_id``. A batch
+that the sink rejects is retried with exponential backoff and blocks the
+ones behind it, which keeps the order intact.
+
+The batch is selected ``FOR UPDATE`` (Postgres), so several workers can run
+the relay without interleaving batches. Published rows are kept for
+``OUTBOX_RETENTION_SECONDS`` and then compacted away in chunks.
+
+Sinks (``OUTBOX_SINK``):
+
+* ``webhook`` – ``POST {"events": [...]}`` to ``OUTBOX_WEBHOOK_URL``; any 2xx acknowledges the batch
+* ``redis``   – ``XADD`` each event to the ``OUTBOX_REDIS_STREAM`` stream
+* ``local``   – keeps delivered events in memory and logs them (default; development and tests)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import httpx
+from sqlalchemy import func, select, update
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..crud.cleanup import delete_in_chunks
+from ..database import SessionLocal
+from ..metrics import (
+    outbox_backlog,
+    outbox_batch_size,
+    outbox_compacted_total,
+    outbox_events_published_total,
+    outbox_relay_errors_total,
+)
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RELAY_ENABLED = os.getenv("OUTBOX_RELAY_ENABLED", "false").lower() == "true"
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "local")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1.0"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "60"))
+OUTBOX_RETENTION_SECONDS = float(os.getenv("OUTBOX_RETENTION_SECONDS", str(7 * 24 * 3600)))
+OUTBOX_COMPACT_INTERVAL_SECONDS = float(os.getenv("OUTBOX_COMPACT_INTERVAL_SECONDS", "3600"))
+OUTBOX_WEBHOOK_URL = os.getenv("OUTBOX_WEBHOOK_URL", "")
+OUTBOX_WEBHOOK_SECRET = os.getenv("OUTBOX_WEBHOOK_SECRET", "")
+OUTBOX_WEBHOOK_TIMEOUT = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "5"))
+OUTBOX_REDIS_URL = os.getenv("OUTBOX_REDIS_URL", "redis://redis:6379/0")
+OUTBOX_REDIS_STREAM = os.getenv("OUTBOX_REDIS_STREAM", "social-events")
+
+
+def to_envelope(event: models.OutboxEvent) -> dict:
+    return {
+        "event_id": event.event_id,
+        "type": event.event_type,
+        "key": event.key,
+        "created_at": event.created_at.isoformat() if event.created_at else None,
+        "payload": json.loads(event.payload),
+    }
+
+
+class LocalSink:
+    """In-process stand-in for a real consumer."""
+
+    name = "local"
+
+    def __init__(self):
+        self.delivered: List[dict] = []
+
+    def send(self, events: List[dict]):
+        self.delivered.extend(events)
+        for event in events:
+            logger.debug("outbox event %s %s %s", event["event_id"], event["type"], event["payload"])
+
+
+class WebhookSink:
+    name = "webhook"
+
+    def __init__(self, url: str = OUTBOX_WEBHOOK_URL, secret: str = OUTBOX_WEBHOOK_SECRET, timeout: float = OUTBOX_WEBHOOK_TIMEOUT):
+        if not url:
+            raise RuntimeError("OUTBOX_SINK=webhook requires OUTBOX_WEBHOOK_URL")
+        self.url = url
+        self.secret = secret.encode()
+        self.client = httpx.Client(timeout=timeout)
+
+    def send(self, events: List[dict]):
+        body = json.dumps({"events": events}).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            # Lets the consumer verify the batch came from us.
+            headers["X-Signature"] = "sha256=" + hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+        response = self.client.post(self.url, content=body, headers=headers)
+        response.raise_for_status()
+
+
+class RedisStreamSink:
+    name = "redis"
+
+    def __init__(self, url: str = OUTBOX_REDIS_URL, stream: str = OUTBOX_REDIS_STREAM):
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=1)
+        self.stream = stream
+
+    def send(self, events: List[dict]):
+        pipe = self.client.pipeline(transaction=True)
+        for event in events:
+            pipe.xadd(self.stream, {"event_id": event["event_id"], "type": event["type"], "data": json.dumps(event)})
+        pipe.execute()
+
+
+def make_sink(name: str = OUTBOX_SINK):
+    if name == "webhook":
+        return WebhookSink()
+    if name == "redis":
+        return RedisStreamSink()
+    if name != "local":
+        raise RuntimeError(f"Unknown OUTBOX_SINK {name!r}")
+    return LocalSink()
+
+
+class Relay:
+    def __init__(self, sink=None, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.sink = sink or make_sink()
+        self.batch_size = batch_size
+
+    def relay_batch(self) -> int:
+        """Deliver the oldest undelivered batch. Returns its size; raises if the sink fails."""
+        db = SessionLocal()
+        try:
+            events = (
+                db.execute(
+                    select(models.OutboxEvent)
+                    .where(models.OutboxEvent.published_at.is_(None))
+                    .order_by(models.OutboxEvent.event_id)
+                    .limit(self.batch_size)
+                    .with_for_update()
+                )
+                .scalars()
+                .all()
+            )
+            if not events:
+                db.rollback()
+                return 0
+            envelopes = [to_envelope(e) for e in events]
+            try:
+                self.sink.send(envelopes)
+            except Exception:
+                db.rollback()
+                outbox_relay_errors_total.labels(sink=self.sink.name).inc()
+                raise
+            db.execute(
+                update(models.OutboxEvent)
+                .where(models.OutboxEvent.event_id.in_([e.event_id for e in events]))
+                .values(published_at=datetime.now(timezone.utc))
+            )
+            db.commit()
+        finally:
+            db.close()
+        outbox_batch_size.observe(len(envelopes))
+        for envelope in envelopes:
+            outbox_events_published_total.labels(type=envelope["type"]).inc()
+        return len(envelopes)
+
+    def drain(self) -> int:
+        """Relay batches until the outbox is empty."""
+        total = 0
+        while True:
+            sent = self.relay_batch()
+            total += sent
+            if sent < self.batch_size:
+                return total
+
+    async def run_forever(self, poll: float = OUTBOX_POLL_SECONDS):
+        backoff = poll
+        last_compaction = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                sent = await run_in_threadpool(self.relay_batch)
+                backoff = poll
+            except Exception as e:
+                logger.warning("Outbox relay to %s failed, retrying in %.1fs: %s", self.sink.name, backoff, e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, OUTBOX_MAX_BACKOFF_SECONDS)
+                continue
+            try:
+                if loop.time() - last_compaction >= OUTBOX_COMPACT_INTERVAL_SECONDS:
+                    last_compaction = loop.time()
+                    await run_in_threadpool(compact)
+                outbox_backlog.set(await run_in_threadpool(backlog))
+            except Exception:
+                logger.exception("Outbox maintenance failed")
+            if sent < self.batch_size:
+                await asyncio.sleep(poll)
+
+
+def backlog() -> int:
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count()).where(models.OutboxEvent.published_at.is_(None)))
+    finally:
+        db.close()
+
+
+def compact(retention_seconds: float = OUTBOX_RETENTION_SECONDS, chunk_size: Optional[int] = None) -> int:
+    """Delete events published more than ``retention_seconds`` ago. Undelivered events are never removed."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention_seconds)
+    db = SessionLocal()
+    try:
+        removed = delete_in_chunks(
+            db, models.OutboxEvent, [models.OutboxEvent.event_id],
+            models.OutboxEvent.published_at < cutoff, chunk_size=chunk_size,
+        )
+    finally:
+        db.close()
+    outbox_compacted_total.inc(removed)
+    if removed:
+        logger.info("Compacted %d published outbox events", removed)
+    return removed
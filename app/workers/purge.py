@@ -0,0 +1,152 @@
+"""Account purge jobs: remove every social row of a deleted user in bounded chunks.
+
+A job deletes the user's likes, comments and saves and follow edges in both
+directions through ``delete_user_rows``. Every chunk of ``CASCADE_CHUNK_SIZE``
+rows is its own short transaction, so accounts with millions of rows never
+hold locks for long. Progress is stored on the ``purge_jobs`` row after each
+chunk so any worker can report it, and a failed job can simply be re-run.
+
+Jobs run inside the worker that accepted them. Each progress update also
+refreshes ``updated_at``, which serves as a lease: a pending or running job
+left untouched for ``PURGE_LEASE_SECONDS`` (its worker was restarted or
+redeployed) is claimed and finished by ``run_resumer`` in any worker, or by
+``python -m app.cli resume-purges``. Deletes are idempotent, so resuming
+simply continues where the chunks stopped.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..crud.cleanup import delete_user_rows
+from ..database import SessionLocal
+from ..metrics import purge_jobs_total, purge_rows_deleted_total
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+# Must comfortably exceed the time one chunk takes, or a live job may be claimed twice.
+PURGE_LEASE_SECONDS = float(os.getenv("PURGE_LEASE_SECONDS", "300"))
+
+
+def create_job(db: Session, user_id: int) -> models.PurgeJob:
+    job = models.PurgeJob(job_id=str(uuid.uuid4()), user_id=user_id, status=PENDING, deleted="{}")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_job(db: Session, job_id: str) -> Optional[models.PurgeJob]:
+    return db.get(models.PurgeJob, job_id)
+
+
+def job_to_dict(job: models.PurgeJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "deleted": json.loads(job.deleted or "{}"),
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
+
+
+def run_job(job_id: str, chunk_size: Optional[int] = None, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Run a purge job to completion. Returns the per-table counts."""
+    db = SessionLocal()
+    try:
+        job = get_job(db, job_id)
+        if job is None:
+            raise ValueError(f"Unknown purge job {job_id}")
+        # A resumed job keeps counting from where it stopped.
+        counts = json.loads(job.deleted or "{}")
+        job.status = RUNNING
+        db.commit()
+
+        def _progress(table: str, rows: int):
+            counts[table] = counts.get(table, 0) + rows
+            purge_rows_deleted_total.labels(table=table).inc(rows)
+            job.deleted = json.dumps(counts)
+            db.commit()
+            if on_progress is not None:
+                on_progress(dict(counts))
+
+        try:
+            delete_user_rows(db, job.user_id, chunk_size=chunk_size, progress=_progress)
+        except Exception as e:
+            db.rollback()
+            job.status = FAILED
+            job.error = str(e)
+            db.commit()
+            purge_jobs_total.labels(status=FAILED).inc()
+            raise
+
+        job.status = DONE
+        job.deleted = json.dumps(counts)
+        db.commit()
+        purge_jobs_total.labels(status=DONE).inc()
+        logger.info("Purge job %s for user %s finished: %s", job_id, job.user_id, counts)
+        return counts
+    finally:
+        db.close()
+
+
+def run_job_in_background(job_id: str):
+    """BackgroundTasks entry point; failures are logged (and recorded on the job row when it could be loaded)."""
+    try:
+        run_job(job_id)
+    except Exception:
+        logger.exception("Purge job %s failed", job_id)
+
+
+def claim_stale_jobs(lease_seconds: float = PURGE_LEASE_SECONDS) -> List[str]:
+    """Take over pending/running jobs whose lease has expired; returns the claimed ids, oldest first.
+
+    Each claim is a conditional UPDATE, so of several workers scanning at
+    once only one gets a given job.
+    """
+    Job = models.PurgeJob
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=lease_seconds)
+    stale = (Job.status.in_([PENDING, RUNNING]), Job.updated_at < cutoff)
+    db = SessionLocal()
+    try:
+        claimed = []
+        for job_id in db.scalars(select(Job.job_id).where(*stale).order_by(Job.created_at)).all():
+            result = db.execute(
+                update(Job).where(Job.job_id == job_id, *stale).values(status=RUNNING, updated_at=func.now())
+            )
+            db.commit()
+            if result.rowcount == 1:
+                claimed.append(job_id)
+        return claimed
+    finally:
+        db.close()
+
+
+def resume_stale_jobs(lease_seconds: float = PURGE_LEASE_SECONDS) -> List[str]:
+    """Claim and run every abandoned job; returns their ids."""
+    claimed = claim_stale_jobs(lease_seconds)
+    for job_id in claimed:
+        logger.warning("Resuming abandoned purge job %s", job_id)
+        run_job_in_background(job_id)
+    return claimed
+
+
+async def run_resumer(interval: float = PURGE_LEASE_SECONDS):
+    while True:
+        try:
+            await run_in_threadpool(resume_stale_jobs)
+        except Exception:
+            logger.exception("Resuming purge jobs failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,200 @@
+"""Background sweeper that removes social rows pointing at deleted recipes/users.
+
+Deletion events (``POST /internal/events``) handle the normal case; this
+catches what they miss. Each sweep walks the distinct ids of one column in
+keyset order, checks them against the owning service and purges orphans.
+Progress is checkpointed in ``sweep_checkpoints`` so a restarted worker
+resumes where the last one stopped.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..crud.cleanup import delete_recipe_rows, delete_user_rows
+from ..database import ReadSessionLocal, SessionLocal
+from ..metrics import (
+    reconcile_ids_checked_total,
+    reconcile_orphans_purged_total,
+    reconcile_checkpoint,
+    reconcile_passes_total,
+    reconcile_paused_total,
+)
+from ..utils.upstream import Upstream, UpstreamUnavailable, recipes, users
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_ENABLED = os.getenv("RECONCILE_ENABLED", "false").lower() == "true"
+RECONCILE_INTERVAL_SECONDS = float(os.getenv("RECONCILE_INTERVAL_SECONDS", "300"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "200"))
+RECONCILE_RATE = float(os.getenv("RECONCILE_RATE", "20"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "5"))
+# A batch where most ids look deleted is more likely a misrouted upstream than
+# a mass deletion; such batches are skipped instead of purged.
+RECONCILE_MAX_ORPHAN_RATIO = float(os.getenv("RECONCILE_MAX_ORPHAN_RATIO", "0.5"))
+RECONCILE_SUSPICIOUS_MIN = int(os.getenv("RECONCILE_SUSPICIOUS_MIN", "10"))
+
+
+@dataclass
+class Sweep:
+    name: str
+    column: object
+    upstream: Upstream
+    purge: Callable[[Session, int], dict]
+
+
+SWEEPS = [
+    Sweep("saved_recipes.recipe_id", models.SavedRecipe.recipe_id, recipes, delete_recipe_rows),
+    Sweep("likes.recipe_id", models.Like.recipe_id, recipes, delete_recipe_rows),
+    Sweep("comments.recipe_id", models.Comment.recipe_id, recipes, delete_recipe_rows),
+    Sweep("follows.following_id", models.Follow.following_id, users, delete_user_rows),
+    Sweep("follows.follower_id", models.Follow.follower_id, users, delete_user_rows),
+]
+
+
+class RateLimiter:
+    """Token bucket that spaces out upstream calls to ``rate`` per second."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+def _load_checkpoint(name: str) -> int:
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(models.SweepCheckpoint, name)
+        return checkpoint.last_key if checkpoint else 0
+    finally:
+        db.close()
+
+
+def _save_checkpoint(name: str, last_key: int, pass_completed: bool = False):
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(models.SweepCheckpoint, name)
+        if checkpoint is None:
+            checkpoint = models.SweepCheckpoint(name=name, last_key=0, passes=0)
+            db.add(checkpoint)
+        checkpoint.last_key = last_key
+        if pass_completed:
+            checkpoint.passes = (checkpoint.passes or 0) + 1
+        db.commit()
+    finally:
+        db.close()
+
+
+def _distinct_ids(column, after: int, limit: int) -> List[int]:
+    db = ReadSessionLocal()
+    try:
+        stmt = select(column).where(column > after).distinct().order_by(column).limit(limit)
+        return [row[0] for row in db.execute(stmt)]
+    finally:
+        db.close()
+
+
+def _purge(purge: Callable[[Session, int], dict], resource_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return purge(db, resource_id)
+    finally:
+        db.close()
+
+
+class Reconciler:
+    def __init__(
+        self,
+        sweeps: List[Sweep] = SWEEPS,
+        batch_size: int = RECONCILE_BATCH_SIZE,
+        rate: float = RECONCILE_RATE,
+        concurrency: int = RECONCILE_CONCURRENCY,
+    ):
+        self.sweeps = sweeps
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(rate)
+        self.concurrency = concurrency
+
+    async def _check(self, upstream: Upstream, ids: List[int]) -> Dict[int, Optional[bool]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check_one(resource_id):
+            async with semaphore:
+                await self.limiter.acquire()
+                try:
+                    return await upstream.exists(resource_id)
+                except UpstreamUnavailable:
+                    return None
+
+        results = await asyncio.gather(*(check_one(i) for i in ids))
+        return dict(zip(ids, results))
+
+    async def run_batch(self, sweep: Sweep) -> bool:
+        """Process one keyset batch. Returns False when the pass is finished or paused."""
+        last_key = await run_in_threadpool(_load_checkpoint, sweep.name)
+        ids = await run_in_threadpool(_distinct_ids, sweep.column, last_key, self.batch_size)
+        if not ids:
+            await run_in_threadpool(_save_checkpoint, sweep.name, 0, True)
+            reconcile_checkpoint.labels(sweep=sweep.name).set(0)
+            reconcile_passes_total.labels(sweep=sweep.name).inc()
+            return False
+
+        results = await self._check(sweep.upstream, ids)
+        reconcile_ids_checked_total.labels(sweep=sweep.name).inc(sum(r is not None for r in results.values()))
+
+        orphans = [i for i, found in results.items() if found is False]
+        if len(orphans) >= RECONCILE_SUSPICIOUS_MIN and len(orphans) > RECONCILE_MAX_ORPHAN_RATIO * len(ids):
+            logger.error("Sweep %s: %d/%d ids reported missing, refusing to purge", sweep.name, len(orphans), len(ids))
+            reconcile_paused_total.labels(sweep=sweep.name, reason="suspicious").inc()
+            return False
+
+        resolved = last_key
+        for resource_id in ids:
+            found = results[resource_id]
+            if found is None:
+                break
+            if found is False:
+                counts = await run_in_threadpool(_purge, sweep.purge, resource_id)
+                reconcile_orphans_purged_total.labels(sweep=sweep.name).inc()
+                logger.info("Sweep %s purged orphan %s: %s", sweep.name, resource_id, counts)
+            resolved = resource_id
+
+        await run_in_threadpool(_save_checkpoint, sweep.name, resolved)
+        reconcile_checkpoint.labels(sweep=sweep.name).set(resolved)
+        if resolved != ids[-1]:
+            reconcile_paused_total.labels(sweep=sweep.name, reason="upstream_unavailable").inc()
+            return False
+        return True
+
+    async def run_pass(self):
+        for sweep in self.sweeps:
+            while await self.run_batch(sweep):
+                pass
+
+    async def run_forever(self, interval: float = RECONCILE_INTERVAL_SECONDS):
+        while True:
+            try:
+                await self.run_pass()
+            except Exception:
+                logger.exception("Reconciliation pass failed")
+            await asyncio.sleep(interval)
@@ -0,0 +1,80 @@
+"""Build time and memory of the similar-recipes model on synthetic interactions.
+
+Usage:
+    python benchmarks/bench_recommendations.py --interactions 3000000 --users 300000 --recipes 50000
+
+Interactions are drawn with Zipf-like recipe popularity and user activity,
+like real likes/saves: a few recipes and users account for most rows. The
+build runs on in-memory arrays, which excludes the database read (roughly
+one second per million rows on Postgres). It reports build time, peak RSS,
+model size and lookup latency for each ``--block-size``.
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+# Only the build runs; importing the app still needs a database URL.
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app.recommendations import build  # noqa: E402
+
+
+def _zipf_choice(rng, n: int, size: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+def synthetic(interactions: int, users: int, recipes: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    user_ids = _zipf_choice(rng, users, interactions, 0.8) + 1
+    recipe_ids = _zipf_choice(rng, recipes, interactions, 1.0) + 1
+    return user_ids, recipe_ids
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interactions", type=int, default=3_000_000)
+    parser.add_argument("--users", type=int, default=300_000)
+    parser.add_argument("--recipes", type=int, default=50_000)
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--max-user-items", type=int, default=500)
+    parser.add_argument("--block-size", type=int, nargs="+", default=[512])
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    user_ids, recipe_ids = synthetic(args.interactions, args.users, args.recipes)
+    print(f"{args.interactions} interactions, {args.users} users, {args.recipes} recipes; rss {_peak_rss_mb():.0f} MiB")
+
+    for block_size in args.block_size:
+        started = time.perf_counter()
+        model = build(user_ids, recipe_ids, top_n=args.top_n, max_user_items=args.max_user_items, block_size=block_size)
+        elapsed = time.perf_counter() - started
+        size = sum(a.nbytes for a in (model.recipe_ids, model.indptr, model.neighbors, model.scores))
+
+        probes = np.random.default_rng(1).choice(model.recipe_ids, size=args.lookups).tolist()
+        started = time.perf_counter()
+        for recipe_id in probes:
+            model.similar(recipe_id, 10)
+        lookup = (time.perf_counter() - started) / args.lookups
+
+        print(
+            f"block {block_size:>6}: build {elapsed:6.2f}s  peak rss {_peak_rss_mb():7.0f} MiB  "
+            f"model {size / 2**20:6.1f} MiB ({len(model.neighbors)} neighbours, {model.interactions} kept)  "
+            f"lookup {lookup * 1e6:5.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
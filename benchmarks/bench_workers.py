@@ -0,0 +1,121 @@
+"""Throughput vs. gunicorn worker count, with a check that /metrics aggregates all workers.
+
+Usage:
+    python benchmarks/bench_workers.py --workers 1 2 4 --duration 10 --concurrency 64
+
+For each worker count a fresh gunicorn (gunicorn.conf.py) is started against a
+temporary SQLite database, loaded with GET /likes/count/{id} (an indexed COUNT
+plus the ETag watermark lookup) for ``--duration`` seconds, and then
+``http_requests_total`` from /metrics is compared with the number of requests
+the client actually completed. On a pod, throughput should scale close to
+linearly until the worker count reaches the number of cores.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _env(tmp: Path, workers: int, port: int) -> dict:
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite:///{tmp / 'bench.db'}",
+        JWT_SECRET="bench-secret",
+        JWT_ALGORITHM="HS256",
+        RECIPE_SERVICE_URL="http://127.0.0.1:9/recipes",
+        USER_SERVICE_URL="http://127.0.0.1:9/users",
+        PROMETHEUS_MULTIPROC_DIR=str(tmp / "metrics"),
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(port),
+    )
+    return env
+
+
+async def _wait_ready(base: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base}/health/live")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def _load(base: str, duration: float, concurrency: int) -> int:
+    done = 0
+    stop = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=10.0) as client:
+        async def worker():
+            nonlocal done
+            while time.monotonic() < stop:
+                response = await client.get(f"/likes/count/{random.randint(1, 1000)}")
+                response.raise_for_status()
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done
+
+
+def _counted_requests(metrics_text: str) -> int:
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith("http_requests_total{") and 'endpoint="/likes/count/' in line:
+            total += float(line.rsplit(" ", 1)[1])
+    return int(total)
+
+
+async def run(workers: int, duration: float, concurrency: int, port: int):
+    with tempfile.TemporaryDirectory(prefix="socialms-bench-") as tmp_dir:
+        tmp = Path(tmp_dir)
+        env = _env(tmp, workers, port)
+        (tmp / "metrics").mkdir()
+        subprocess.run([sys.executable, "-m", "app.cli", "migrate"], cwd=ROOT, env=env, check=True, capture_output=True)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        base = f"http://127.0.0.1:{port}"
+        try:
+            await _wait_ready(base)
+            completed = await _load(base, duration, concurrency)
+            async with httpx.AsyncClient() as client:
+                counted = _counted_requests((await client.get(f"{base}/metrics")).text)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return completed / duration, completed, counted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()} duration={args.duration}s concurrency={args.concurrency}")
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8} {'completed':>10} {'in /metrics':>12}")
+    baseline = None
+    for workers in args.workers:
+        rps, completed, counted = asyncio.run(run(workers, args.duration, args.concurrency, args.port))
+        baseline = baseline or rps
+        print(f"{workers:>7} {rps:>10.1f} {rps / baseline:>7.2f}x {completed:>10} {counted:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Gunicorn settings for running several uvicorn workers per pod.
+
+Prometheus metrics are shared between workers through prometheus_client's
+multiprocess mode: every worker writes its samples to mmap files in
+PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them. The variable is only
+set here, for gunicorn and its workers: one-off commands such as
+``python -m app.cli migrate`` run with ordinary single-process metrics.
+"""
+import glob
+import multiprocessing
+import os
+
+# prometheus_client picks its value storage on import, so this comes first.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+from prometheus_client import multiprocess  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+accesslog = None
+
+
+def on_starting(server):
+    # Samples left over from a previous container run would otherwise be
+    # summed into the new process's counters.
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def child_exit(server, worker):
+    # Drops the dead worker's live* gauge files (e.g. requests_in_progress);
+    # its counters and histograms stay so totals never go backwards.
+    multiprocess.mark_process_dead(worker.pid)
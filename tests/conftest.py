@@ -17,6 +17,7 @@ os.environ.setdefault("JWT_SECRET", "test-secret")
 os.environ.setdefault("JWT_ALGORITHM", "HS256")
 os.environ.setdefault("RECIPE_SERVICE_URL", "http://recipe-service.local/recipes")
 os.environ.setdefault("USER_SERVICE_URL", "http://user-service.local/users")
+os.environ.setdefault("INTERNAL_API_TOKEN", "internal-test-token")
 
 from app import models  # noqa: E402
 from app.database import SessionLocal, engine  # noqa: E402
@@ -32,6 +33,10 @@ def db_session():
         db.query(models.Like).delete()
         db.query(models.Follow).delete()
         db.query(models.SavedRecipe).delete()
+        db.query(models.ResourceVersion).delete()
+        db.query(models.OutboxEvent).delete()
+        db.query(models.EngagementRollup).delete()
+        db.query(models.PurgeJob).delete()
         db.commit()
         yield db
     finally:
@@ -40,7 +45,72 @@ def db_session():
 
 @pytest.fixture()
 def client():
+    from app.utils import rate_limit
+
+    rate_limit.backend.reset()
     app.dependency_overrides = {}
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides = {}
+
+
+class StubResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+
+class StubAsyncClient:
+    status_code = 200
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def get(self, *args, **kwargs):
+        return StubResponse(self.status_code)
+
+
+@pytest.fixture()
+def upstream(monkeypatch):
+    """Patch httpx so recipe/user lookups answer with ``upstream.status_code``."""
+    import httpx
+
+    class _Client(StubAsyncClient):
+        pass
+
+    monkeypatch.setattr(httpx, "AsyncClient", _Client)
+    return _Client
+
+
+@pytest.fixture()
+def auth_headers():
+    import jwt
+
+    def _make(user_id=1):
+        token = jwt.encode(
+            {"user_id": user_id},
+            os.environ["JWT_SECRET"],
+            algorithm=os.environ["JWT_ALGORITHM"],
+        )
+        return {"Authorization": f"Bearer {token}"}
+
+    return _make
+
+
+@pytest.fixture()
+def internal_headers():
+    """Headers for the ``/internal`` and ``/admin`` endpoints, plus any ``extra``."""
+
+    def _make(**extra):
+        return {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"], **extra}
+
+    return _make
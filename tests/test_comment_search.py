@@ -0,0 +1,81 @@
+import threading
+
+from app.database import engine
+from app.migrations import migrate
+from app.search import ElasticsearchBackend
+
+
+def _post(client, auth_headers, recipe_id, content, user_id=1):
+    response = client.post(f"/comments/{recipe_id}", json={"content": content}, headers=auth_headers(user_id))
+    assert response.status_code == 201
+    return response.json()["comment_id"]
+
+
+def test_search_ranks_and_filters_by_recipe(client, db_session, upstream, auth_headers):
+    best = _post(client, auth_headers, 10, "garlic garlic garlic bread")
+    other = _post(client, auth_headers, 10, "needs more garlic, less salt and a lot more butter")
+    elsewhere = _post(client, auth_headers, 11, "garlic soup")
+    _post(client, auth_headers, 10, "too salty")
+
+    body = client.get("/comments/search", params={"q": "garlic"}).json()
+    assert body["total"] == 3
+    assert [hit["comment_id"] for hit in body["results"]][0] == best
+    assert {hit["comment_id"] for hit in body["results"]} == {best, other, elsewhere}
+
+    body = client.get("/comments/search", params={"q": "garlic", "recipe_id": 11}).json()
+    assert [hit["comment_id"] for hit in body["results"]] == [elsewhere]
+
+    page = client.get("/comments/search", params={"q": "garlic", "size": 2, "page": 2}).json()
+    assert page["total"] == 3 and len(page["results"]) == 1
+
+
+def test_search_index_follows_deletes_and_operator_input(client, db_session, upstream, auth_headers):
+    comment_id = _post(client, auth_headers, 10, "lovely crust")
+    assert client.get("/comments/search", params={"q": 'crust" OR *'}).json()["total"] == 0
+
+    assert client.delete(f"/comments/{comment_id}", headers=auth_headers(1)).status_code == 204
+    assert client.get("/comments/search", params={"q": "crust"}).json()["total"] == 0
+
+
+def test_migrate_adds_index_to_existing_comments_table(client, db_session, upstream, auth_headers):
+    _post(client, auth_headers, 10, "crispy edges")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE comments_fts")
+
+    migrate(engine)
+    assert client.get("/comments/search", params={"q": "crispy"}).json()["total"] == 0
+
+    from app.cli import main
+    main(["reindex-comments"])
+    assert client.get("/comments/search", params={"q": "crispy"}).json()["total"] == 1
+
+
+class _SlowClient:
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def options(self, **kwargs):
+        return self
+
+    def index(self, index, id, document):
+        self.release.wait(5)
+        self.calls.append(("index", id, document["content"]))
+
+    def delete(self, index, id):
+        self.calls.append(("delete", id))
+        raise ConnectionError("cluster down")
+
+
+def test_elasticsearch_writes_never_wait_on_the_cluster(client, db_session, upstream, auth_headers, monkeypatch):
+    backend = ElasticsearchBackend()
+    backend.client = es = _SlowClient()
+    monkeypatch.setattr("app.crud.comments.search_backend", backend)
+
+    comment_id = _post(client, auth_headers, 10, "quick")  # returns while the index call is still blocked
+    assert client.delete(f"/comments/{comment_id}", headers=auth_headers(1)).status_code == 204
+    assert es.calls == []
+
+    es.release.set()
+    backend.flush()
+    assert es.calls == [("index", comment_id, "quick"), ("delete", comment_id)]
@@ -0,0 +1,93 @@
+from sqlalchemy import event, func
+
+from app import models
+from app.crud.rollups import backfill
+from app.database import engine
+
+
+def _post(client, auth_headers, recipe_id, content, parent_id=None, user_id=1):
+    payload = {"content": content} if parent_id is None else {"content": content, "parent_id": parent_id}
+    response = client.post(f"/comments/{recipe_id}", json=payload, headers=auth_headers(user_id))
+    assert response.status_code == 201, response.text
+    return response.json()["comment_id"]
+
+
+def _thread(client, auth_headers):
+    root = _post(client, auth_headers, 10, "root")
+    a = _post(client, auth_headers, 10, "a", parent_id=root)
+    a1 = _post(client, auth_headers, 10, "a1", parent_id=a)
+    b = _post(client, auth_headers, 10, "b", parent_id=root)
+    a2 = _post(client, auth_headers, 10, "a2", parent_id=a)
+    return root, a, a1, b, a2
+
+
+def test_threads_page_returns_first_replies_in_one_query(client, db_session, upstream, auth_headers):
+    root, a, a1, b, a2 = _thread(client, auth_headers)
+    other = _post(client, auth_headers, 10, "second thread")
+    _post(client, auth_headers, 11, "other recipe")
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        body = client.get("/comments/recipe/10/threads", params={"replies": 3}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len([s for s in statements if "FROM comments" in s]) == 1
+    first, second = body["threads"]
+    assert first["comment_id"] == root and first["reply_count"] == 4
+    assert [r["comment_id"] for r in first["replies"]] == [a, a1, a2]
+    assert [r["depth"] for r in first["replies"]] == [1, 2, 2]
+    assert second["comment_id"] == other and second["replies"] == []
+    assert body["next_cursor"] is None
+
+    page = client.get("/comments/recipe/10/threads", params={"limit": 1}).json()
+    assert [t["comment_id"] for t in page["threads"]] == [root]
+    page = client.get("/comments/recipe/10/threads", params={"limit": 1, "after": page["next_cursor"]}).json()
+    assert [t["comment_id"] for t in page["threads"]] == [other]
+
+
+def test_expand_subtree_paginates_and_delete_removes_replies(client, db_session, upstream, auth_headers):
+    root, a, a1, b, a2 = _thread(client, auth_headers)
+
+    body = client.get(f"/comments/comment/{a}/replies").json()
+    assert [r["comment_id"] for r in body["replies"]] == [a1, a2]
+
+    first = client.get(f"/comments/comment/{root}/replies", params={"limit": 2}).json()
+    rest = client.get(f"/comments/comment/{root}/replies", params={"limit": 2, "after": first["next_cursor"]}).json()
+    assert [r["comment_id"] for r in first["replies"] + rest["replies"]] == [a, a1, a2, b]
+
+    assert client.delete(f"/comments/{a}", headers=auth_headers(1)).status_code == 204
+    remaining = client.get(f"/comments/comment/{root}/replies").json()["replies"]
+    assert [r["comment_id"] for r in remaining] == [b]
+    assert client.get("/comments/count/10").json()["comment_count"] == 2
+
+
+def test_reply_parent_must_belong_to_recipe(client, db_session, upstream, auth_headers):
+    root = _post(client, auth_headers, 10, "root")
+    response = client.post("/comments/11", json={"content": "x", "parent_id": root}, headers=auth_headers(1))
+    assert response.status_code == 404
+
+
+def test_delete_keeps_other_users_replies_under_a_tombstone(client, db_session, upstream, auth_headers):
+    root = _post(client, auth_headers, 10, "root")
+    mine = _post(client, auth_headers, 10, "mine", parent_id=root)
+    theirs = _post(client, auth_headers, 10, "theirs", parent_id=root, user_id=2)
+
+    assert client.delete(f"/comments/{root}", headers=auth_headers(1)).status_code == 204
+    replies = client.get(f"/comments/comment/{root}/replies").json()["replies"]
+    assert [r["comment_id"] for r in replies] == [mine, theirs]
+    tombstone = client.get("/comments/recipe/10").json()[0]
+    assert tombstone["comment_id"] == root and tombstone["content"] == "" and tombstone["deleted_at"] is not None
+    assert client.get("/comments/count/10").json()["comment_count"] == 2
+    assert client.get("/comments/search", params={"q": "root"}).json()["total"] == 0
+    rolled_up = lambda: db_session.query(func.sum(models.EngagementRollup.comments)).scalar()
+    assert rolled_up() == 2
+    backfill(db_session)
+    assert rolled_up() == 2
+
+    # Deleting it again changes nothing; the other user's reply can still be removed.
+    assert client.delete(f"/comments/{root}", headers=auth_headers(1)).status_code == 204
+    assert client.delete(f"/comments/{theirs}", headers=auth_headers(2)).status_code == 204
+    assert client.get("/comments/count/10").json()["comment_count"] == 1
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+from app import models
+
+
+def test_like_count_revalidates_with_etag(client, db_session, upstream, auth_headers):
+    first = client.get("/likes/count/10")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "max-age" in first.headers["cache-control"]
+
+    cached = client.get("/likes/count/10", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert cached.content == b""
+
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+
+    changed = client.get("/likes/count/10", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["like_count"] == 1
+
+
+def test_followers_etag_changes_on_unfollow(client, db_session, upstream, auth_headers):
+    assert client.post("/follows/2", headers=auth_headers(1)).status_code == 201
+    etag = client.get("/follows/followers/2").headers["etag"]
+
+    assert client.get("/follows/followers/2", headers={"If-None-Match": etag}).status_code == 304
+
+    assert client.delete("/follows/2", headers=auth_headers(1)).status_code == 204
+    response = client.get("/follows/followers/2", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_last_modified_only_once_its_second_is_over(client, db_session, upstream, auth_headers):
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+    row = db_session.query(models.ResourceVersion).filter_by(scope="recipe_likes", resource_id=10).one()
+
+    # A date in the current second would also cover a later write in it.
+    row.updated_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    db_session.commit()
+    assert "last-modified" not in client.get("/likes/count/10").headers
+
+    row.updated_at = datetime(2024, 1, 1, 12, 0, 0, 500000, tzinfo=timezone.utc)
+    db_session.commit()
+    last_modified = client.get("/likes/count/10").headers["last-modified"]
+    assert client.get("/likes/count/10", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    assert client.post("/likes/10", headers=auth_headers(2)).status_code == 201
+    assert client.get("/likes/count/10", headers={"If-Modified-Since": last_modified}).status_code == 200
@@ -0,0 +1,35 @@
+from app.crud import cleanup
+
+
+def test_recipe_deleted_event_cascades_in_chunks(client, db_session, upstream, auth_headers, internal_headers, monkeypatch):
+    monkeypatch.setattr(cleanup, "CASCADE_CHUNK_SIZE", 2)
+    for user_id in (1, 2, 3):
+        assert client.post("/likes/10", headers=auth_headers(user_id)).status_code == 201
+        assert client.post("/saved/10", headers=auth_headers(user_id)).status_code == 201
+    assert client.post("/comments/10", json={"content": "yum"}, headers=auth_headers(1)).status_code == 201
+    assert client.post("/likes/11", headers=auth_headers(1)).status_code == 201
+
+    response = client.post("/internal/events", json={"type": "recipe.deleted", "recipe_id": 10}, headers=internal_headers())
+    assert response.status_code == 200
+    assert response.json()["deleted"] == {"likes": 3, "comments": 1, "saved": 3}
+
+    assert client.get("/likes/count/10").json()["like_count"] == 0
+    assert client.get("/likes/count/11").json()["like_count"] == 1
+    assert client.get("/saved/my", headers=auth_headers(1)).json() == []
+
+
+def test_user_deleted_event_removes_both_follow_directions(client, db_session, upstream, auth_headers, internal_headers):
+    assert client.post("/follows/2", headers=auth_headers(1)).status_code == 201
+    assert client.post("/follows/1", headers=auth_headers(2)).status_code == 201
+    assert client.post("/follows/3", headers=auth_headers(2)).status_code == 201
+    etag = client.get("/follows/followers/3").headers["etag"]
+
+    response = client.post("/internal/events", json={"type": "user.deleted", "user_id": 2}, headers=internal_headers())
+    assert response.json()["deleted"]["follows"] == 3
+
+    assert client.get("/follows/followers/3", headers={"If-None-Match": etag}).json() == []
+
+
+def test_internal_events_require_token(client, db_session):
+    response = client.post("/internal/events", json={"type": "recipe.deleted", "recipe_id": 1})
+    assert response.status_code == 403
@@ -0,0 +1,25 @@
+from app.utils import health
+
+
+def test_liveness_and_readiness(client, db_session, upstream):
+    health.reset_readiness_cache()
+
+    assert client.get("/health/live").json() == {"status": "ok"}
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["checks"]["database"] == "ok"
+
+
+def test_readiness_fails_when_database_is_down(client, db_session, upstream, monkeypatch):
+    health.reset_readiness_cache()
+    monkeypatch.setattr(health, "check_database", lambda: "pool exhausted")
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["database"] == "pool exhausted"
+
+    # Result is cached, so a recovered database is not re-probed immediately.
+    monkeypatch.setattr(health, "check_database", lambda: "ok")
+    assert client.get("/health/ready").status_code == 503
+    health.reset_readiness_cache()
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event, text
+
+from app import models
+from app.database import engine
+
+
+def test_my_likes_page_newest_first_with_keyset_cursor(client, db_session, upstream, auth_headers):
+    for recipe_id in (1, 2, 3, 4):
+        assert client.post(f"/likes/{recipe_id}", headers=auth_headers(1)).status_code == 201
+    # Imported later but older: recency follows created_at, not like_id.
+    db_session.add(models.Like(user_id=1, recipe_id=9, created_at=datetime(2020, 1, 1, tzinfo=timezone.utc)))
+    db_session.commit()
+
+    pages, before = [], None
+    while True:
+        params = {"limit": 2, **({"before": before} if before else {})}
+        body = client.get("/likes/me", params=params, headers=auth_headers(1)).json()
+        pages.append([like["recipe_id"] for like in body["likes"]])
+        assert all("like_count" not in like for like in body["likes"])
+        before = body["next_cursor"]
+        if before is None:
+            break
+    assert pages == [[4, 3], [2, 1], [9]]
+
+    first = client.get("/likes/me", params={"limit": 2}, headers=auth_headers(1)).json()
+    # The cursor's like is gone: the next page still starts after it.
+    assert client.delete("/likes/recipe/3/me", headers=auth_headers(1)).status_code == 204
+    body = client.get("/likes/me", params={"limit": 2, "before": first["next_cursor"]}, headers=auth_headers(1)).json()
+    assert [like["recipe_id"] for like in body["likes"]] == [2, 1]
+
+    # Another user's like is not a valid anchor: its timestamp must not cut the page short.
+    foreign = models.Like(user_id=2, recipe_id=1, created_at=datetime(2019, 1, 1, tzinfo=timezone.utc))
+    db_session.add(foreign)
+    db_session.commit()
+    body = client.get("/likes/me", params={"limit": 2, "before": foreign.like_id}, headers=auth_headers(1)).json()
+    assert [like["recipe_id"] for like in body["likes"]] == [4, 2]
+
+    assert client.get("/likes/me").status_code == 401
+
+
+def test_user_likes_with_counts_in_one_indexed_query(client, db_session, upstream, auth_headers):
+    for user_id in (1, 2, 3):
+        assert client.post("/likes/5", headers=auth_headers(user_id)).status_code == 201
+    assert client.post("/likes/6", headers=auth_headers(2)).status_code == 201
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        body = client.get("/likes/user/2", params={"include_counts": True}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert [(like["recipe_id"], like["like_count"]) for like in body["likes"]] == [(6, 1), (5, 3)]
+    assert body["next_cursor"] is None
+
+    plan = db_session.execute(
+        text("EXPLAIN QUERY PLAN SELECT like_id FROM likes WHERE user_id = 2 ORDER BY created_at DESC, like_id DESC")
+    ).all()
+    assert any("ix_likes_user_created" in row[-1] for row in plan)
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+from starlette.requests import Request
+
+from app.routers.recipes import recipe_events
+from app.utils import live
+from app.utils.live import Hub, TooManySubscribers
+
+
+async def _never_disconnects():
+    await asyncio.Event().wait()
+
+
+def _parse(chunk: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return {"event": fields["event"], "id": int(fields["id"]), **json.loads(fields["data"])}
+
+
+def test_stream_pushes_snapshot_then_write_events(client, db_session, upstream, auth_headers):
+    assert client.post("/likes/77", headers=auth_headers(5)).status_code == 201
+
+    async def scenario():
+        request = Request({"type": "http", "method": "GET", "path": "/recipes/77/events", "headers": []}, _never_disconnects)
+        response = await recipe_events(77, request)
+        assert response.media_type == "text/event-stream"
+        body = response.body_iterator
+        snapshot = _parse(await anext(body))
+
+        # Writes go through the app on the test client's own loop/thread.
+        await asyncio.to_thread(client.post, "/likes/77", headers=auth_headers(1))
+        await asyncio.to_thread(client.post, "/comments/77", json={"content": "live!"}, headers=auth_headers(2))
+        await asyncio.to_thread(client.delete, "/likes/recipe/77/me", headers=auth_headers(1))
+        await asyncio.to_thread(client.delete, "/likes/recipe/77/me", headers=auth_headers(1))  # nothing left: no event
+        events = [_parse(await asyncio.wait_for(anext(body), 2)) for _ in range(4)]
+        await body.aclose()
+        return snapshot, events
+
+    snapshot, events = asyncio.run(scenario())
+
+    assert snapshot == {"event": "snapshot", "id": 0, "type": "snapshot", "recipe_id": 77, "like_count": 1, "comment_count": 0}
+    assert [(e["event"], e.get("delta")) for e in events] == [
+        ("like_count", 1),
+        ("comment_count", 1),
+        ("comment", None),
+        ("like_count", -1),
+    ]
+    assert events[2]["comment"]["content"] == "live!" and events[2]["comment"]["user_id"] == 2
+    assert [e["id"] for e in events] == [1, 2, 3, 4]
+    assert 77 not in live.hub._subscriptions  # closing the stream unsubscribes
+
+
+def test_slow_consumer_gets_resync_without_blocking_others():
+    hub = Hub(queue_size=3, max_subscribers=2)
+
+    async def scenario():
+        fast, slow = hub.subscribe(1), hub.subscribe(1)
+        with pytest.raises(TooManySubscribers):
+            hub.subscribe(2)
+        received = []
+        for n in range(5):
+            hub.deliver(1, {"type": "like_count", "delta": n})
+            received.append(await fast.get(0.1))
+        backlog = [await slow.get(0.01) for _ in range(2)]
+        hub.unsubscribe(slow)
+        hub.deliver(1, {"type": "like_count", "delta": 9})
+        return received, backlog, slow.queue.qsize(), await fast.get(0.1)
+
+    received, backlog, slow_left, last = asyncio.run(scenario())
+
+    assert [e["delta"] for e in received] == [0, 1, 2, 3, 4]
+    # Overflowed on the 4th event; the 5th fits after the resync marker.
+    assert backlog == [{"type": "resync"}, {"type": "like_count", "delta": 4}]
+    assert slow_left == 0 and last["delta"] == 9
+
+
+def test_local_broker_warns_with_several_workers(monkeypatch, caplog):
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    assert isinstance(live._make_broker(Hub()), live.LocalBroker)
+    assert "LIVE_BROKER=local" in caplog.text
@@ -0,0 +1,69 @@
+from starlette.requests import Request
+
+from app.utils import admission
+
+
+def test_aimd_grows_when_busy_and_backs_off_on_slow_requests(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    limit = admission.AdaptiveLimit("test", target=0.1, initial=4, min_limit=2, max_limit=5, backoff=0.5)
+
+    for _ in range(4):
+        assert limit.try_acquire()
+    assert not limit.try_acquire()
+    for _ in range(4):
+        limit.release(0.01)
+    assert 4 < limit.limit <= 5
+
+    assert limit.try_acquire()
+    limit.release(0.01)
+    assert limit.limit <= 5  # not grown while idle
+
+    for _ in range(3):
+        limit.try_acquire()
+    limit.release(1.0)
+    limit.release(1.0)  # same interval: counted once
+    assert 2 < limit.limit < 3
+    clock[0] += 1
+    limit.release(1.0)
+    assert limit.limit == 2
+
+
+def test_saturated_class_sheds_with_503_and_reads_preempt_writes(client, db_session, upstream, auth_headers, monkeypatch):
+    read = admission.AdaptiveLimit(admission.READ, 10.0, initial=1)
+    write = admission.AdaptiveLimit(admission.WRITE, 10.0, initial=1)
+    monkeypatch.setattr(admission, "limits", {admission.READ: read, admission.WRITE: write})
+
+    assert client.get("/likes/count/1").status_code == 200
+    assert client.post("/likes/1", headers=auth_headers(1)).status_code == 201
+
+    read.in_flight = int(read.limit)  # reads saturated: writes are shed, probes still answer
+    response = client.post("/likes/2", headers=auth_headers(1))
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/likes/count/1").status_code == 503
+    assert client.get("/health/live").status_code == 200
+
+    read.in_flight = 0
+    write.in_flight = int(write.limit)
+    assert client.post("/likes/2", headers=auth_headers(1)).status_code == 503
+    assert client.get("/likes/count/1").status_code == 200
+    assert "requests_shed_total" in client.get("/metrics").text
+
+
+def test_only_the_sse_route_is_exempt():
+    def request(method, path, root_path=""):
+        return Request({
+            "type": "http", "method": method, "path": root_path + path, "root_path": root_path,
+            "headers": [], "query_string": b"",
+        })
+
+    assert admission.route_class(request("GET", "/recipes/10/events")) is None
+    assert admission.route_class(request("GET", "/health/ready")) is None
+    assert admission.route_class(request("POST", "/internal/events")) == admission.WRITE
+    assert admission.route_class(request("GET", "/recipes/10/events/extra")) == admission.READ
+
+    # Behind ROOT_PATH the stream is exempt just like the probes.
+    assert admission.route_class(request("GET", "/recipes/10/events", root_path="/api/social")) is None
+    assert admission.route_class(request("GET", "/health/ready", root_path="/api/social")) is None
+    assert admission.route_class(request("POST", "/internal/events", root_path="/api/social")) == admission.WRITE
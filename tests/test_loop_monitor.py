@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from app.metrics import event_loop_lag
+from app.utils.loop_monitor import LoopMonitor, monitor
+
+
+def _lag_count():
+    return next(s.value for s in event_loop_lag.collect()[0].samples if s.name == "event_loop_lag_seconds_count")
+
+
+def test_blocking_call_is_reported_with_the_loop_stack():
+    watcher = LoopMonitor(interval=0.01, threshold=0.1)
+
+    def blocking_handler():
+        time.sleep(0.3)
+
+    async def scenario():
+        task = asyncio.create_task(watcher.run())
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    before = _lag_count()
+    asyncio.run(scenario())
+
+    assert len(watcher.stalls) == 1
+    assert "blocking_handler" in watcher.stalls[0]["stack"]
+    assert watcher.stalls[0]["blocked_seconds"] >= 0.1
+    assert _lag_count() > before
+
+
+def test_write_handlers_keep_database_work_off_the_loop(client, db_session, upstream, auth_headers, monkeypatch):
+    from app.routers import follow
+
+    original = follow.follow_user
+
+    def slow_follow_user(*args, **kwargs):
+        time.sleep(monitor.threshold * 2)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(follow, "follow_user", slow_follow_user)
+    monitor.stalls.clear()
+
+    assert client.post("/follows/2", headers=auth_headers(1)).status_code == 201
+    assert not [stall for stall in monitor.stalls if "slow_follow_user" in stall["stack"]]
@@ -0,0 +1,172 @@
+import pytest
+from sqlalchemy import event
+
+from app import models
+from app.database import engine
+from app.utils import membership
+from app.utils.membership import MembershipIndex
+
+
+@pytest.fixture()
+def indexes(monkeypatch):
+    for index in (membership.liked, membership.saved):
+        monkeypatch.setattr(index, "enabled", True)
+        index.clear()
+    yield membership.liked, membership.saved
+    for index in (membership.liked, membership.saved):
+        index.clear()
+
+
+def _statements(fn):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return result, statements
+
+
+def test_checks_are_answered_from_the_index_after_one_load(client, db_session, upstream, auth_headers, indexes):
+    for recipe_id in (10, 12):
+        assert client.post(f"/likes/{recipe_id}", headers=auth_headers(1)).status_code == 201
+    assert client.post("/saved/11", headers=auth_headers(1)).status_code == 201
+
+    check = lambda: client.get("/likes/me/check", params={"recipe_ids": [12, 11, 10, 10]}, headers=auth_headers(1))
+    assert check().json() == {"recipe_ids": [10, 12]}  # loads user 1
+
+    response, statements = _statements(check)
+    assert response.json() == {"recipe_ids": [10, 12]}
+    assert statements == []
+    response, statements = _statements(lambda: client.get("/likes/recipe/11/me", headers=auth_headers(1)))
+    assert response.json() is None and statements == []
+
+    # Writes on this worker keep the loaded entry current.
+    assert client.put("/likes/11", headers=auth_headers(1)).status_code == 201
+    assert client.delete("/likes/recipe/10/me", headers=auth_headers(1)).status_code == 204
+    response, statements = _statements(check)
+    assert response.json() == {"recipe_ids": [11, 12]} and statements == []
+
+    assert client.get("/saved/my/check", params={"recipe_ids": [10, 11]}, headers=auth_headers(1)).json() == {"recipe_ids": [11]}
+    assert client.delete("/saved/recipe/11/me", headers=auth_headers(1)).status_code == 204
+    response, statements = _statements(
+        lambda: client.get("/saved/my/check", params={"recipe_ids": [10, 11]}, headers=auth_headers(1))
+    )
+    assert response.json() == {"recipe_ids": []} and statements == []
+
+
+def test_disabled_index_falls_back_to_the_database(client, db_session, upstream, auth_headers):
+    assert not membership.liked.enabled
+    assert client.post("/likes/7", headers=auth_headers(2)).status_code == 201
+    response = client.get("/likes/me/check", params={"recipe_ids": [7, 8]}, headers=auth_headers(2))
+    assert response.json() == {"recipe_ids": [7]}
+    assert client.get("/likes/me/check", params={"recipe_ids": list(range(201))}, headers=auth_headers(2)).status_code == 422
+
+
+def test_lru_eviction_and_large_users_bypass(db_session):
+    db_session.add_all([models.Like(user_id=user_id, recipe_id=recipe_id) for user_id in (1, 2, 3) for recipe_id in range(user_id)])
+    db_session.commit()
+    index = MembershipIndex("test", models.Like, enabled=True, max_users=2, max_ids=2)
+
+    assert index.contains(1, 0) is True
+    assert index.contains(2, 1) is True
+    assert index.contains(3, 0) is None  # three ids: never cached
+    assert list(index._entries) == [1, 2]
+
+    index.contains(1, 0)
+    index._entries[2].expires = 0  # expired entries are reloaded
+    assert index.filter(2, [0, 1, 5]) == [0, 1]
+    assert list(index._entries) == [1, 2]
+    db_session.add(models.Like(user_id=4, recipe_id=9))
+    db_session.commit()
+    assert index.contains(4, 9) is True
+    assert list(index._entries) == [2, 4]  # user 1 was least recently used
+
+    index.add(2, 7)  # would exceed max_ids: dropped rather than kept partial
+    assert 2 not in index._entries
+    index.forget_recipe(9)
+    assert index.contains(4, 9) is False
+
+
+class _SharedStore:
+    """Runs the index's two scripts against a dict, with a clock that never moves."""
+
+    def __init__(self):
+        self.keys = {}
+
+    def eval(self, script, numkeys, clock, *args):
+        tick = int(self.keys.get(clock, 0)) + (numkeys > 1)
+        self.keys[clock] = tick
+        if numkeys == 1:
+            return tick
+        key, recipes, _px = args
+        previous = max(int(self.keys.get(key, 0)), int(self.keys.get(recipes, 0)))
+        self.keys[key] = tick
+        return [previous, tick]
+
+    def mget(self, keys):
+        return [self.keys.get(key) for key in keys]
+
+
+def test_writes_on_another_worker_invalidate_the_entry(db_session):
+    store = _SharedStore()
+    workers = [MembershipIndex("test", models.Like, enabled=True, redis_url="redis://shared") for _ in range(2)]
+    for index in workers:
+        index._redis = store
+    mine, other = workers
+
+    assert mine.contains(1, 10) is False  # loaded before the write
+    db_session.add(models.Like(user_id=1, recipe_id=10))
+    db_session.commit()
+    other.add(1, 10)
+
+    assert "membership:test:1" in store.keys
+    assert mine.contains(1, 10) is True
+    # The writer's own entry stays current without a reload.
+    assert other.contains(1, 10) is True
+    _, statements = _statements(lambda: (mine.contains(1, 10), other.contains(1, 10)))
+    assert statements == []
+
+
+def test_own_write_does_not_hide_an_earlier_write_from_another_worker(db_session):
+    store = _SharedStore()
+    first, second = [MembershipIndex("test", models.Like, enabled=True, redis_url="redis://shared") for _ in range(2)]
+    first._redis = second._redis = store
+
+    assert first.contains(1, 10) is False
+    db_session.add(models.Like(user_id=1, recipe_id=10))
+    db_session.commit()
+    second.add(1, 10)
+    db_session.add(models.Like(user_id=1, recipe_id=11))
+    db_session.commit()
+    first.add(1, 11)  # its entry predates the other write: dropped, not moved forward
+
+    assert 1 not in first._entries
+    assert first.filter(1, [10, 11]) == [10, 11]
+
+
+def test_purges_on_another_worker_invalidate_the_entry(db_session):
+    store = _SharedStore()
+    mine, other = [MembershipIndex("test", models.Like, enabled=True, redis_url="redis://shared") for _ in range(2)]
+    mine._redis = other._redis = store
+    db_session.add_all([models.Like(user_id=user_id, recipe_id=recipe_id) for user_id in (1, 2) for recipe_id in (10, 11)])
+    db_session.commit()
+    assert mine.contains(1, 10) is True and mine.contains(2, 11) is True
+
+    db_session.query(models.Like).filter(models.Like.user_id == 1).delete()
+    db_session.commit()
+    other.forget_user(1)
+    assert mine.contains(1, 10) is False
+    assert mine.contains(2, 10) is True
+
+    db_session.query(models.Like).filter(models.Like.recipe_id == 11).delete()
+    db_session.commit()
+    other.forget_recipe(11)
+    assert mine.contains(2, 11) is False
+
+
+def test_index_is_disabled_with_several_workers_and_no_shared_store(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert MembershipIndex("test", models.Like, enabled=True, redis_url="").enabled is False
+    assert MembershipIndex("test", models.Like, enabled=True, redis_url="redis://shared").enabled is True
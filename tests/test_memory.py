@@ -0,0 +1,94 @@
+import tracemalloc
+
+import pytest
+
+from app.utils import memory
+from app.utils.memory import RouteMemory, SnapshotStore
+
+
+@pytest.fixture()
+def tracing():
+    yield
+    memory.stop_tracing()
+
+
+def test_snapshots_top_and_diff(client, internal_headers, tracing):
+    status = client.get("/admin/memory", headers=internal_headers()).json()
+    assert status["rss_bytes"] > 0 and status["tracing"] is False
+    assert client.post("/admin/memory/snapshots", headers=internal_headers()).status_code == 409
+
+    assert client.post("/admin/memory/tracing", params={"frames": 5}, headers=internal_headers()).json()["frames"] == 5
+    before = client.post("/admin/memory/snapshots", headers=internal_headers()).json()["snapshot_id"]
+    ballast = [bytearray(1024) for _ in range(2000)]  # noqa: F841 - held until the second snapshot
+    after = client.post("/admin/memory/snapshots", headers=internal_headers()).json()["snapshot_id"]
+
+    top = client.get(f"/admin/memory/snapshots/{after}/top", params={"limit": 5}, headers=internal_headers()).json()
+    assert len(top) <= 5 and all(site["size_bytes"] > 0 for site in top)
+
+    diff = client.get(
+        f"/admin/memory/snapshots/{after}/diff", params={"base": before, "limit": 3}, headers=internal_headers()
+    ).json()
+    grown = diff[0]
+    assert "test_memory.py" in grown["site"]
+    assert grown["size_diff_bytes"] >= 2000 * 1024 and grown["count_diff"] >= 2000
+
+    assert client.get("/admin/memory/snapshots/999/top", headers=internal_headers()).status_code == 404
+    assert client.get("/admin/memory/snapshots/1/top", params={"group_by": "nope"}, headers=internal_headers()).status_code == 422
+    assert [s["snapshot_id"] for s in client.get("/admin/memory", headers=internal_headers()).json()["snapshots"]] == [before, after]
+
+    assert client.delete("/admin/memory/tracing", headers=internal_headers()).status_code == 204
+    assert not tracemalloc.is_tracing()
+    assert client.get("/admin/memory").status_code == 403
+
+
+def test_route_peaks_are_tracked_per_template(tracing):
+    routes = RouteMemory()
+    assert routes.start() is None  # not tracing: nothing measured
+
+    memory.start_tracing(1)
+    baseline = routes.start()
+    chunk = bytearray(4 * 1024 * 1024)
+    del chunk
+    routes.finish(baseline, "/heavy/{id}")
+    routes.finish(routes.start(), "/light")
+
+    heavy, light = routes.collect()
+    assert heavy["route"] == "/heavy/{id}" and heavy["max_peak_bytes"] >= 4 * 1024 * 1024
+    assert light["route"] == "/light" and light["max_peak_bytes"] < heavy["max_peak_bytes"]
+
+
+def test_request_is_not_charged_for_peaks_before_it_started(tracing):
+    routes = RouteMemory()
+    memory.start_tracing(1)
+    long_running = routes.start()
+    chunk = bytearray(4 * 1024 * 1024)
+    del chunk
+
+    # Starts while the other request is still in flight.
+    routes.finish(routes.start(), "/light")
+    routes.finish(long_running, "/heavy")
+
+    heavy, light = routes.collect()
+    assert heavy["route"] == "/heavy" and heavy["max_peak_bytes"] >= 4 * 1024 * 1024
+    assert light["route"] == "/light" and light["max_peak_bytes"] < 1024 * 1024
+
+
+def test_snapshots_in_a_shared_dir_are_visible_to_every_worker(tmp_path, monkeypatch, tracing):
+    memory.start_tracing(1)
+    worker_a = SnapshotStore(max_snapshots=2, directory=str(tmp_path))
+    worker_b = SnapshotStore(max_snapshots=2, directory=str(tmp_path))
+
+    first = worker_a.take()["snapshot_id"]
+    second = worker_b.take()["snapshot_id"]
+    assert second == first + 1
+    assert worker_b.get(first)["snapshot"].traces is not None
+    assert [s["snapshot_id"] for s in worker_a.list()] == [first, second]
+
+    monkeypatch.setattr(memory.os, "getpid", lambda: 1)
+    third = worker_a.take()["snapshot_id"]
+    assert [(s["snapshot_id"], s["pid"]) for s in worker_b.list()][-1] == (third, 1)
+    assert worker_b.get(first) is None  # trimmed to max_snapshots
+
+    # Stopping tracing on one worker only drops that worker's snapshots.
+    worker_a.clear()
+    assert [s["snapshot_id"] for s in worker_b.list()] == [second]
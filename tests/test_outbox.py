@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import models
+from app.workers.outbox import LocalSink, Relay, compact
+
+
+class FlakySink(LocalSink):
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def send(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("consumer down")
+        super().send(events)
+
+
+def test_writes_enqueue_events_in_their_transaction_and_relay_in_order(client, db_session, upstream, auth_headers):
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 400  # rolled back: no event
+    assert client.post("/follows/2", headers=auth_headers(1)).status_code == 201
+    comment_id = client.post("/comments/10", json={"content": "hi"}, headers=auth_headers(3)).json()["comment_id"]
+    assert client.delete(f"/comments/{comment_id}", headers=auth_headers(3)).status_code == 204
+    assert client.delete("/likes/recipe/10/me", headers=auth_headers(1)).status_code == 204
+
+    sink = LocalSink()
+    assert Relay(sink, batch_size=2).drain() == 5
+    assert [e["type"] for e in sink.delivered] == [
+        "like.created", "follow.created", "comment.created", "comment.deleted", "like.deleted",
+    ]
+    ids = [e["event_id"] for e in sink.delivered]
+    assert ids == sorted(ids)
+    assert sink.delivered[0]["key"] == "recipe:10"
+    assert sink.delivered[0]["payload"]["user_id"] == 1
+    assert sink.delivered[3]["payload"]["comment_ids"] == [comment_id]
+
+    assert Relay(sink).drain() == 0  # everything is marked published
+    db_session.expire_all()
+    assert db_session.query(models.OutboxEvent).filter(models.OutboxEvent.published_at.is_(None)).count() == 0
+
+
+def test_failed_batch_is_redelivered_and_blocks_later_events(client, db_session, upstream, auth_headers):
+    for recipe_id in (1, 2, 3):
+        assert client.post(f"/saved/{recipe_id}", headers=auth_headers(1)).status_code == 201
+
+    sink = FlakySink(failures=1)
+    relay = Relay(sink, batch_size=2)
+    with pytest.raises(ConnectionError):
+        relay.relay_batch()
+    assert sink.delivered == []
+
+    assert relay.drain() == 3
+    assert [e["payload"]["recipe_id"] for e in sink.delivered] == [1, 2, 3]
+
+
+def test_compaction_only_removes_old_published_events(db_session):
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        models.OutboxEvent(event_type="like.created", key="recipe:1", payload="{}", published_at=now - timedelta(days=30)),
+        models.OutboxEvent(event_type="like.created", key="recipe:1", payload="{}", published_at=now),
+        models.OutboxEvent(event_type="like.created", key="recipe:1", payload="{}"),
+    ])
+    db_session.commit()
+
+    assert compact(retention_seconds=7 * 24 * 3600, chunk_size=1) == 1
+    db_session.expire_all()
+    assert db_session.query(models.OutboxEvent).count() == 2
@@ -0,0 +1,40 @@
+import time
+
+from app.utils import profiler as profiler_module
+from app.utils.profiler import Profiler, to_collapsed
+
+
+def test_admin_header_profiles_request_by_route_template(client, db_session, upstream, auth_headers, internal_headers, monkeypatch):
+    monkeypatch.setattr(profiler_module, "profiler", Profiler(interval=0.001))
+    monkeypatch.setattr("app.main.profiler", profiler_module.profiler)
+    monkeypatch.setattr("app.routers.admin.profiler", profiler_module.profiler)
+    client.delete("/admin/profiles", headers=internal_headers())
+
+    client.get("/likes/count/1", headers={"X-Profile": "1"})  # no token: not profiled
+    assert client.get("/admin/profiles", headers=internal_headers()).json() == []
+
+    for recipe_id in (1, 2):
+        client.get(f"/likes/count/{recipe_id}", headers=internal_headers(**{"X-Profile": "1"}))
+    profiles = client.get("/admin/profiles", headers=internal_headers()).json()
+    assert [(p["route"], p["requests"]) for p in profiles] == [("/likes/count/{recipe_id}", 2)]
+
+    response = client.get("/admin/profiles/collapsed", params={"route": "/likes/count/{recipe_id}"}, headers=internal_headers())
+    assert response.status_code == 200
+    assert client.get("/admin/profiles/collapsed", params={"route": "/nope"}, headers=internal_headers()).status_code == 404
+    assert client.get("/admin/profiles").status_code == 403
+
+
+def test_sampler_collects_busy_stacks_and_merges_worker_files(tmp_path):
+    worker = Profiler(interval=0.001, directory=str(tmp_path))
+    session = worker.start()
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline and session.samples < 5:
+        sum(range(10000))
+    worker.finish(session, "/busy", 0.2)
+
+    collected = worker.collect()["/busy"]
+    assert collected["samples"] >= 1 and collected["stacks"]
+    assert any("test_sampler_collects_busy_stacks" in stack for stack in collected["stacks"])
+    assert list(tmp_path.glob("*.json"))
+    line = to_collapsed(collected["stacks"]).splitlines()[0]
+    assert int(line.rsplit(" ", 1)[1]) >= 1
@@ -0,0 +1,46 @@
+from app.utils import rate_limit
+
+
+def test_like_spam_gets_429_before_any_upstream_call(client, db_session, upstream, auth_headers, monkeypatch):
+    monkeypatch.setitem(rate_limit.RATE_LIMITS, "like", (2, 0.01))
+    calls = []
+    original_get = upstream.get
+
+    async def counting_get(self, *args, **kwargs):
+        calls.append(args)
+        return await original_get(self, *args, **kwargs)
+
+    monkeypatch.setattr(upstream, "get", counting_get)
+
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+    assert client.post("/likes/11", headers=auth_headers(1)).status_code == 201
+    upstream_calls = len(calls)
+
+    response = client.post("/likes/12", headers=auth_headers(1))
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert len(calls) == upstream_calls
+
+    # Buckets are per user and per route group.
+    assert client.post("/likes/12", headers=auth_headers(2)).status_code == 201
+    assert client.post("/saved/12", headers=auth_headers(1)).status_code == 201
+
+
+def test_memory_bucket_refills_and_stays_bounded(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    backend = rate_limit.MemoryBackend(max_keys=2)
+
+    assert backend.acquire("a", 1, 0.5) == 0
+    assert backend.acquire("a", 1, 0.5) == 2.0
+    clock[0] += 2.0
+    assert backend.acquire("a", 1, 0.5) == 0
+
+    backend.acquire("b", 1, 1)
+    backend.acquire("c", 1, 1)
+    assert list(backend._buckets) == ["b", "c"]
+
+
+def test_parse_limits():
+    limits = rate_limit._parse_limits("like=30/60,follow=off,comment=5,bogus=x/y")
+    assert limits == {"like": (30.0, 0.5), "comment": (5.0, 5.0)}
@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import create_engine
+
+from app import database, models
+
+
+@pytest.fixture()
+def replica(tmp_path):
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    models.Base.metadata.create_all(bind=replica_engine)
+    database.replicas.configure([replica_engine])
+    yield replica_engine
+    database.replicas.configure([])
+    database._recent_writers.clear()
+
+
+def test_reads_go_to_replica_and_writes_stick_to_primary(client, db_session, upstream, auth_headers, replica):
+    with replica.begin() as conn:
+        conn.execute(models.Like.__table__.insert().values(like_id=1, recipe_id=10, user_id=7))
+
+    assert client.get("/likes/count/10").json()["like_count"] == 1
+
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+
+    # Anonymous reads still hit the (lagging) replica ...
+    assert client.get("/likes/count/10").json()["like_count"] == 1
+    # ... while the writer reads their own write from the primary.
+    mine = client.get("/likes/recipe/10/me", headers=auth_headers(1))
+    assert mine.json()["user_id"] == 1
+
+
+def test_unreachable_replica_falls_back_to_primary(client, db_session, upstream, auth_headers, tmp_path):
+    database.replicas.configure([create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")])
+    try:
+        assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+        database._recent_writers.clear()
+
+        assert client.get("/likes/count/10").json()["like_count"] == 1
+    finally:
+        database.replicas.configure([])
+
+
+def test_sticky_window_expires(monkeypatch, replica):
+    monkeypatch.setattr(database, "READ_STICKY_SECONDS", 0.0)
+    database.mark_recent_write(1)
+    assert database.has_sticky_users() is False
+    assert database._recent_writers == {}
+
+    monkeypatch.setattr(database, "READ_STICKY_SECONDS", 60.0)
+    database.mark_recent_write(2)
+    assert database.has_sticky_users() is True
+
+
+class _SharedStore:
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, px):
+        self.keys[key] = value
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+def test_sticky_window_is_shared_between_workers(client, db_session, upstream, auth_headers, replica, monkeypatch):
+    store = _SharedStore()
+    monkeypatch.setattr(database, "READ_STICKY_REDIS_URL", "redis://shared")
+    monkeypatch.setattr(database, "_sticky_redis", store)
+
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+    assert "sticky:1" in store.keys
+
+    # Another worker has no local entry, but still reads the write from the primary.
+    database._recent_writers.clear()
+    assert database.has_sticky_users() is True
+    assert client.get("/likes/recipe/10/me", headers=auth_headers(1)).json()["user_id"] == 1
+    assert client.get("/likes/recipe/10/me", headers=auth_headers(2)).json() is None
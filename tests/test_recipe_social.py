@@ -0,0 +1,41 @@
+from sqlalchemy import event
+
+from app.database import engine
+
+
+def _seed(client, auth_headers):
+    client.post("/likes/10", headers=auth_headers(1))
+    client.post("/likes/10", headers=auth_headers(2))
+    client.post("/saved/10", headers=auth_headers(2))
+    for text in ("first", "second", "third"):
+        client.post("/comments/10", json={"content": text}, headers=auth_headers(3))
+
+
+def test_summary_for_viewer_in_two_queries(client, db_session, upstream, auth_headers):
+    _seed(client, auth_headers)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        body = client.get("/recipes/10/social", params={"comments_limit": 2}, headers=auth_headers(2)).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+    assert body["like_count"] == 2 and body["comment_count"] == 3
+    assert body["viewer"]["liked"] is True and body["viewer"]["saved"] is True
+    assert [c["content"] for c in body["comments"]] == ["first", "second"]
+    assert body["comments_has_more"] is True
+
+
+def test_summary_field_selection_and_anonymous(client, db_session, upstream, auth_headers):
+    _seed(client, auth_headers)
+
+    body = client.get("/recipes/10/social", params={"fields": "counts,viewer"}).json()
+    assert body == {"recipe_id": 10, "like_count": 2, "comment_count": 3}
+
+    body = client.get("/recipes/10/social", params={"fields": "viewer"}, headers=auth_headers(3)).json()
+    assert body == {"recipe_id": 10, "viewer": {"liked": False, "like_id": None, "saved": False, "saved_id": None}}
+
+    assert client.get("/recipes/10/social", params={"fields": "bogus"}).status_code == 422
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+
+from app import models
+from app.recommendations import Neighbors, Recommender, build, recommender
+
+
+@pytest.fixture()
+def fresh_recommender(monkeypatch):
+    monkeypatch.setattr(recommender, "model", None)
+    monkeypatch.setattr(recommender, "_signature", None)
+    monkeypatch.setattr(recommender, "_removed", set())
+    return recommender
+
+
+def test_build_scores_cooccurrence_and_keeps_top_n(tmp_path):
+    users = np.array([1, 1, 2, 2, 3, 3, 1, 2, 3, 3])
+    items = np.array([10, 20, 10, 20, 10, 20, 30, 30, 40, 40])  # user 3 liked and saved 40
+
+    model = build(users, items, top_n=1, min_cooccurrence=1)
+    assert model.interactions == 9
+    assert model.similar(20, 5) == [(10, 1.0)]
+    assert model.similar(40, 5) == [(10, round(1 / np.sqrt(3), 6))]  # ties go to the smaller id
+    assert model.similar(99, 5) == []
+    assert build([], []).similar(10, 5) == []
+
+    model = build(users, items, min_cooccurrence=2)
+    assert model.similar(10, 5) == [(20, 1.0), (30, round(2 / np.sqrt(6), 6))]
+    assert model.similar(40, 5) == []
+
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+    assert Neighbors.load(path).similar(10, 1) == [(20, 1.0)]
+    assert os.listdir(tmp_path) == ["model.npz"]
+
+
+def test_heavy_users_are_sampled():
+    users = np.repeat([1, 2], [100, 3])
+    items = np.concatenate([np.arange(100), [0, 1, 2]])
+
+    model = build(users, items, max_user_items=10, min_cooccurrence=1)
+    assert model.interactions == 13
+    assert np.diff(model.indptr).sum() <= 10 * 9 + 3 * 2
+
+
+def test_similar_endpoint_refreshes_only_on_change_and_drops_purged(client, db_session, fresh_recommender):
+    rows = [(user_id, recipe_id) for user_id in (1, 2, 3) for recipe_id in (10, 20)] + [(1, 30), (2, 30)]
+    db_session.add_all([models.Like(user_id=u, recipe_id=r) for u, r in rows])
+    db_session.add(models.SavedRecipe(user_id=3, recipe_id=30))
+    db_session.commit()
+
+    assert client.get("/recipes/10/similar").json() == {"recipe_id": 10, "similar": [], "built_at": None}
+    assert fresh_recommender.refresh() is True
+    assert fresh_recommender.refresh() is False
+
+    body = client.get("/recipes/10/similar", params={"limit": 1}).json()
+    assert body["similar"] == [{"recipe_id": 20, "score": 1.0}]
+    assert body["built_at"] is not None
+
+    response = client.post(
+        "/internal/events", json={"type": "recipe.deleted", "recipe_id": 20},
+        headers={"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]},
+    )
+    assert response.status_code == 200
+    assert client.get("/recipes/10/similar").json()["similar"] == [{"recipe_id": 30, "score": 1.0}]
+    assert client.get("/recipes/20/similar").json()["similar"] == []
+    assert fresh_recommender.refresh() is True  # the purge changed the tables
+
+
+def test_one_worker_per_pod_builds_and_the_others_load_its_file(db_session, tmp_path, monkeypatch):
+    db_session.add_all([models.Like(user_id=u, recipe_id=r) for u in (1, 2) for r in (10, 20)])
+    db_session.commit()
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setattr("app.recommendations.RECOMMEND_BUILD_DIR", str(tmp_path))
+    builder, follower = Recommender(path=""), Recommender(path="")
+
+    assert follower.build_dir == str(tmp_path)
+    assert builder.refresh() is True
+    assert follower.refresh() is True
+    assert follower._signature is None  # loaded, never built
+    assert follower.similar(10, 1) == builder.similar(10, 1) == [(20, 1.0)]
+    assert follower.refresh() is False
+
+    # The lock is released with the builder's process; another worker takes over.
+    builder._build_lock.close()
+    assert follower._is_builder() is True
+    assert Recommender(path="/models/similar.npz").build_dir is None
@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app import models
+from app.utils import upstream as upstream_mod
+from app.utils.upstream import CircuitBreaker
+from app.workers.reconciler import SWEEPS, Reconciler
+
+
+class _Recipes404For:
+    missing = set()
+    fail = False
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, url, *args, **kwargs):
+        if type(self).fail:
+            raise httpx.ConnectError("down")
+        resource_id = int(url.rsplit("/", 1)[1])
+        return httpx.Response(404 if resource_id in type(self).missing else 200)
+
+
+@pytest.fixture()
+def recipe_sweeps(monkeypatch, db_session):
+    db_session.query(models.SweepCheckpoint).delete()
+    db_session.commit()
+    monkeypatch.setattr(upstream_mod.recipes, "breaker", CircuitBreaker("recipe_service", failure_threshold=100))
+    return [s for s in SWEEPS if s.name.endswith("recipe_id")]
+
+
+def _seed(db, recipe_ids):
+    for i, recipe_id in enumerate(recipe_ids):
+        db.add(models.Like(recipe_id=recipe_id, user_id=i + 1))
+        db.add(models.SavedRecipe(recipe_id=recipe_id, user_id=i + 1))
+    db.commit()
+
+
+def test_sweeper_purges_orphans_and_completes_pass(db_session, monkeypatch, recipe_sweeps):
+    _seed(db_session, [1, 2, 3, 4, 5])
+    _Recipes404For.missing, _Recipes404For.fail = {2, 5}, False
+    monkeypatch.setattr(httpx, "AsyncClient", _Recipes404For)
+
+    asyncio.run(Reconciler(sweeps=recipe_sweeps, batch_size=2, rate=1000).run_pass())
+
+    assert sorted(r for (r,) in db_session.query(models.Like.recipe_id)) == [1, 3, 4]
+    assert sorted(r for (r,) in db_session.query(models.SavedRecipe.recipe_id)) == [1, 3, 4]
+    checkpoint = db_session.get(models.SweepCheckpoint, "likes.recipe_id")
+    assert checkpoint.last_key == 0 and checkpoint.passes == 1
+
+
+def test_sweeper_keeps_checkpoint_when_upstream_is_down(db_session, monkeypatch, recipe_sweeps):
+    _seed(db_session, [1, 2])
+    _Recipes404For.missing, _Recipes404For.fail = {1, 2}, True
+    monkeypatch.setattr(httpx, "AsyncClient", _Recipes404For)
+
+    asyncio.run(Reconciler(sweeps=recipe_sweeps[:1], batch_size=10, rate=1000).run_pass())
+
+    assert db_session.query(models.SavedRecipe).count() == 2
+    assert db_session.get(models.SweepCheckpoint, "saved_recipes.recipe_id").last_key == 0
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from app import models
+from app.crud.rollups import backfill, hour_bucket, lock_recipes, record
+from app.database import engine
+
+
+def _rollups(db):
+    db.expire_all()
+    return sorted(
+        (r.recipe_id, hour_bucket(r.bucket), r.likes, r.comments, r.saves)
+        for r in db.query(models.EngagementRollup)
+        if r.likes or r.comments or r.saves
+    )
+
+
+def test_write_paths_keep_rollups_equal_to_a_backfill(client, db_session, upstream, auth_headers):
+    for user_id in (1, 2):
+        assert client.post("/likes/10", headers=auth_headers(user_id)).status_code == 201
+    assert client.put("/saved/10", headers=auth_headers(1)).status_code == 201
+    assert client.post("/likes/11", headers=auth_headers(1)).status_code == 201
+    root = client.post("/comments/10", json={"content": "a"}, headers=auth_headers(3)).json()["comment_id"]
+    client.post("/comments/10", json={"content": "b", "parent_id": root}, headers=auth_headers(3))
+    client.post("/comments/10", json={"content": "c"}, headers=auth_headers(3))
+    assert client.delete("/likes/recipe/10/me", headers=auth_headers(2)).status_code == 204
+    assert client.delete(f"/comments/{root}", headers=auth_headers(3)).status_code == 204
+
+    hour = hour_bucket(db_session.query(models.Like.created_at).filter_by(recipe_id=11).scalar())
+    maintained = _rollups(db_session)
+    assert maintained == [(10, hour, 1, 1, 1), (11, hour, 1, 0, 0)]
+    assert backfill(db_session, chunk_size=1) == 2
+    assert _rollups(db_session) == maintained
+
+    # Cascades take their rows out of the rollups too.
+    headers = {"X-Internal-Token": os.environ["INTERNAL_API_TOKEN"]}
+    assert client.post("/internal/events", json={"type": "user.deleted", "user_id": 1}, headers=headers).status_code == 200
+    assert _rollups(db_session) == [(10, hour, 0, 1, 0)]
+    assert client.post("/internal/events", json={"type": "recipe.deleted", "recipe_id": 10}, headers=headers).status_code == 200
+    assert db_session.query(models.EngagementRollup).filter_by(recipe_id=10).count() == 0
+
+
+def test_range_query_reads_only_rollups(client, db_session):
+    at = lambda *args: datetime(2024, 3, *args, tzinfo=timezone.utc)
+    db_session.add_all([
+        models.Like(user_id=1, recipe_id=5, created_at=at(1, 10, 15)),
+        models.Like(user_id=2, recipe_id=5, created_at=at(1, 22, 40)),
+        models.Comment(user_id=1, recipe_id=5, content="x", created_at=at(2, 1, 0)),
+        models.SavedRecipe(user_id=1, recipe_id=6, created_at=at(2, 9, 30)),
+    ])
+    db_session.commit()
+    backfill(db_session)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        body = client.get(
+            "/recipes/engagement",
+            params={"recipe_ids": [5, 6, 7], "start": "2024-03-01T00:00:00Z", "end": "2024-03-02T12:00:00Z"},
+        ).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1 and "FROM engagement_rollups" in statements[0]
+    assert body["granularity"] == "day"
+    assert body["end"].startswith("2024-03-03T00:00:00")  # the partial day is included
+    series = {s["recipe_id"]: [(p["bucket"][:10], p["likes"], p["comments"], p["saves"]) for p in s["points"]] for s in body["series"]}
+    assert series == {5: [("2024-03-01", 2, 0, 0), ("2024-03-02", 0, 1, 0)], 6: [("2024-03-02", 0, 0, 1)], 7: []}
+
+    hourly = client.get(
+        "/recipes/5/engagement", params={"granularity": "hour", "start": "2024-03-01T10:00:00", "end": "2024-03-02T00:00:00"}
+    ).json()
+    assert [p["bucket"][:13] for p in hourly["series"][0]["points"]] == ["2024-03-01T10", "2024-03-01T22"]
+
+    too_long = client.get("/recipes/5/engagement", params={"granularity": "hour", "start": "2024-01-01T00:00:00Z", "end": "2024-03-01T00:00:00Z"})
+    assert too_long.status_code == 422
+    backwards = client.get("/recipes/5/engagement", params={"start": "2024-03-02T00:00:00Z", "end": "2024-03-01T00:00:00Z"})
+    assert backwards.status_code == 422
+
+
+class _PostgresSession:
+    """Records what would be sent to PostgreSQL."""
+
+    def __init__(self):
+        self.statements = []
+        self.dialect = type("Dialect", (), {"name": "postgresql"})()
+
+    def get_bind(self):
+        return self
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+
+
+def test_writers_and_backfill_lock_recipes_in_ascending_order(db_session):
+    pg = _PostgresSession()
+    lock_recipes(pg, [30, 10, 30], exclusive=True)
+    sql, params = pg.statements[0]
+    assert "pg_advisory_xact_lock(" in sql and params["ids"] == [10, 30]
+
+    pg.statements.clear()
+    record(pg, "likes", [(20, None), (5, None)])
+    sql, params = pg.statements[0]
+    assert "pg_advisory_xact_lock_shared(" in sql and params["ids"] == [5, 20]
+
+    # SQLite serializes writers itself.
+    lock_recipes(db_session, [1], exclusive=True)
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.routers import likes
+from app.utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("k", slow) for _ in range(10)))
+        assert results == [1] * 10
+        # Nothing is cached once the call has finished.
+        assert await flight.do("k", slow) == 2
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight("test")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def main():
+        results = await asyncio.gather(*(flight.do("k", boom) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+    asyncio.run(main())
+
+
+def test_hot_reads_coalesce_only_within_one_watermark_version(client, db_session, upstream, auth_headers, monkeypatch):
+    keys = []
+    do = likes.count_flight.do
+
+    async def recording_do(key, fn):
+        keys.append(key)
+        return await do(key, fn)
+
+    monkeypatch.setattr(likes.count_flight, "do", recording_do)
+    assert client.get("/likes/count/10").json()["like_count"] == 0
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 201
+    assert client.get("/likes/count/10").json()["like_count"] == 1
+
+    # A caller that saw the newer watermark never joins a read started before the write.
+    assert keys[0] != keys[1]
+    assert [key[0] for key in keys] == [10, 10]
@@ -0,0 +1,86 @@
+from sqlalchemy import event, text
+
+from app import models
+from app.crud import likes
+from app.database import engine
+from app.migrations import migrate
+
+
+def _capture_statements():
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_put_like_is_idempotent_single_statement(client, db_session, upstream, auth_headers):
+    statements, stop = _capture_statements()
+    try:
+        first = client.put("/likes/10", headers=auth_headers(1))
+    finally:
+        stop()
+    assert first.status_code == 201
+    likes_statements = [s for s in statements if "likes" in s and not any(t in s for t in ("resource_versions", "engagement_rollups"))]
+    assert likes_statements == [statements[0]]
+    assert statements[0].startswith("INSERT INTO likes") and "ON CONFLICT" in statements[0]
+
+    again = client.put("/likes/10", headers=auth_headers(1))
+    assert again.status_code == 200
+    assert again.json()["like_id"] == first.json()["like_id"]
+    assert client.post("/likes/10", headers=auth_headers(1)).status_code == 400
+    assert client.get("/likes/count/10").json()["like_count"] == 1
+
+    assert client.delete("/likes/recipe/10/me", headers=auth_headers(1)).status_code == 204
+    assert client.delete("/likes/recipe/10/me", headers=auth_headers(1)).status_code == 204
+    assert client.get("/likes/count/10").json()["like_count"] == 0
+
+
+def test_put_saved_and_delete_by_recipe(client, db_session, upstream, auth_headers):
+    assert client.put("/saved/10", headers=auth_headers(1)).status_code == 201
+    assert client.put("/saved/10", headers=auth_headers(1)).status_code == 200
+    assert len(client.get("/saved/my", headers=auth_headers(1)).json()) == 1
+
+    assert client.delete("/saved/recipe/10/me", headers=auth_headers(1)).status_code == 204
+    assert client.get("/saved/my", headers=auth_headers(1)).json() == []
+
+
+def test_delete_by_id_checks_owner_in_the_delete(client, db_session, upstream, auth_headers):
+    like_id = client.post("/likes/10", headers=auth_headers(1)).json()["like_id"]
+    saved_id = client.post("/saved/10", headers=auth_headers(1)).json()["saved_id"]
+
+    assert client.delete(f"/likes/{like_id}", headers=auth_headers(2)).status_code == 403
+    assert client.delete(f"/saved/{saved_id}", headers=auth_headers(2)).status_code == 403
+    assert client.delete("/likes/999999", headers=auth_headers(1)).status_code == 404
+
+    statements, stop = _capture_statements()
+    try:
+        assert client.delete(f"/likes/{like_id}", headers=auth_headers(1)).status_code == 204
+    finally:
+        stop()
+    assert [s.split()[0] for s in statements if "FROM likes" in s] == ["DELETE"]
+    assert client.delete(f"/saved/{saved_id}", headers=auth_headers(1)).status_code == 204
+
+
+def test_migrate_removes_duplicates_before_unique_index(db_session):
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_likes_user_recipe"))
+    db_session.add_all([models.Like(user_id=1, recipe_id=5) for _ in range(3)])
+    db_session.commit()
+
+    migrate(engine)
+
+    assert db_session.query(models.Like).filter_by(user_id=1, recipe_id=5).count() == 1
+
+
+def test_put_like_retries_when_the_existing_row_is_deleted_meanwhile(client, db_session, upstream, auth_headers, monkeypatch):
+    assert client.put("/likes/10", headers=auth_headers(1)).status_code == 201
+    read = likes.get_like_by_user_and_recipe
+
+    def deleted_before_read(db, user_id, recipe_id):
+        likes.delete_like_for_recipe(db, user_id=user_id, recipe_id=recipe_id)
+        return read(db, user_id=user_id, recipe_id=recipe_id)
+
+    monkeypatch.setattr(likes, "get_like_by_user_and_recipe", deleted_before_read)
+    response = client.put("/likes/10", headers=auth_headers(1))
+    assert response.status_code == 201 and response.json()["user_id"] == 1
+    assert client.get("/likes/count/10").json()["like_count"] == 1
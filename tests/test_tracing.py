@@ -0,0 +1,63 @@
+import pytest
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+
+from app.utils.tracing import configure_tracing
+
+exporter = InMemorySpanExporter()
+
+
+@pytest.fixture()
+def spans():
+    configure_tracing(exporter, simple=True)  # installs the provider once per process
+    exporter.clear()
+    yield exporter
+    exporter.clear()
+
+
+def test_write_request_spans_auth_upstream_sql_and_serialization(client, db_session, upstream, auth_headers, spans):
+    sent = []
+
+    stub_get = upstream.get
+
+    async def get(self, url, headers=None, **kwargs):
+        sent.append(headers or {})
+        return await stub_get(self, url)
+
+    upstream.get = get
+    parent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+    response = client.post("/comments/4242", json={"content": "traced"},
+                           headers={**auth_headers(1), "traceparent": parent})
+    assert response.status_code == 201
+
+    finished = spans.get_finished_spans()
+    by_name = {s.name: s for s in finished}
+    server = by_name["POST /comments/{recipe_id}"]
+    assert server.kind == SpanKind.SERVER
+    assert server.attributes["http.response.status_code"] == 201
+    # Continues the caller's trace and every span belongs to it.
+    assert format(server.context.trace_id, "032x") == "0af7651916cd43dd8448eb211c80319c"
+    assert {s.context.trace_id for s in finished} == {server.context.trace_id}
+
+    assert "auth.get_current_user_id" in by_name
+    assert "response.serialize" in by_name
+    assert any(s.kind == SpanKind.CLIENT and s.name.startswith("GET ") for s in finished)
+    assert sent and all(h["traceparent"].split("-")[1] == "0af7651916cd43dd8448eb211c80319c" for h in sent)
+
+    statements = [s for s in finished if "db.statement" in s.attributes]
+    assert any(s.attributes["db.statement"].startswith("INSERT INTO comments") for s in statements)
+    # Whatever is still pending at commit time is flushed inside the commit span.
+    commit = by_name["db.commit"]
+    assert any(s.parent.span_id == commit.context.span_id for s in statements)
+
+
+def test_failed_statement_span_is_marked_as_error(db_session, spans):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    with pytest.raises(OperationalError):
+        db_session.execute(text("SELECT * FROM no_such_table"))
+
+    failed = [s for s in spans.get_finished_spans() if s.name == "SELECT"]
+    assert failed and not failed[-1].status.is_ok
@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils import upstream as upstream_mod
+from app.utils.upstream import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture()
+def fresh_breakers(monkeypatch):
+    for service in (upstream_mod.recipes, upstream_mod.users):
+        monkeypatch.setattr(service, "breaker", CircuitBreaker(service.name, failure_threshold=2, reset_seconds=60))
+    upstream_mod.pending_checks.clear()
+    yield
+    upstream_mod.pending_checks.clear()
+
+
+class _TimeoutClient:
+    calls = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, *args, **kwargs):
+        type(self).calls += 1
+        raise httpx.ReadTimeout("slow")
+
+
+def test_breaker_half_open_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    breaker.opened_at -= 61
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_open_circuit_fails_fast_or_accepts_per_policy(client, db_session, auth_headers, monkeypatch, fresh_breakers):
+    monkeypatch.setattr(httpx, "AsyncClient", _TimeoutClient)
+
+    for _ in range(2):
+        assert client.post("/comments/3", json={"content": "hi"}, headers=auth_headers(1)).status_code == 502
+    assert upstream_mod.recipes.breaker.state == OPEN
+
+    calls = _TimeoutClient.calls
+    assert client.post("/comments/3", json={"content": "hi"}, headers=auth_headers(1)).status_code == 502
+    assert _TimeoutClient.calls == calls
+
+    # Likes are accepted optimistically and queued for reconciliation.
+    assert client.post("/likes/3", headers=auth_headers(1)).status_code == 201
+    assert ("recipe_service", 3) in upstream_mod.pending_checks
+
+
+def test_reconcile_purges_missing_recipe(client, db_session, upstream, auth_headers, fresh_breakers):
+    assert client.post("/likes/4", headers=auth_headers(1)).status_code == 201
+    upstream_mod.pending_checks.add(("recipe_service", 4))
+
+    upstream.status_code = 404
+    asyncio.run(upstream_mod.reconcile_pending())
+
+    assert not upstream_mod.pending_checks
+    assert client.get("/likes/count/4").json()["like_count"] == 0
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 429])
+def test_reconcile_keeps_rows_when_upstream_refuses(client, db_session, upstream, auth_headers, fresh_breakers, status_code):
+    assert client.post("/likes/4", headers=auth_headers(1)).status_code == 201
+    upstream_mod.pending_checks.add(("recipe_service", 4))
+
+    upstream.status_code = status_code
+    asyncio.run(upstream_mod.reconcile_pending())
+
+    assert ("recipe_service", 4) in upstream_mod.pending_checks
+    assert client.get("/likes/count/4").json()["like_count"] == 1
+    assert upstream_mod.recipes.breaker.failures == 1
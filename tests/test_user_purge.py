@@ -0,0 +1,88 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from app import models
+from app.cli import main
+from app.workers import purge
+
+
+def _seed(db, user_id, rows):
+    for recipe_id in range(1, rows + 1):
+        db.add(models.Like(user_id=user_id, recipe_id=recipe_id))
+        db.add(models.SavedRecipe(user_id=user_id, recipe_id=recipe_id))
+        db.add(models.Comment(user_id=user_id, recipe_id=recipe_id, content="hi"))
+        db.add(models.Follow(follower_id=user_id, following_id=1000 + recipe_id))
+    db.add(models.Follow(follower_id=42, following_id=user_id))
+    db.add(models.Like(user_id=99, recipe_id=1))
+    db.commit()
+
+
+def test_purge_endpoint_runs_job_and_reports_progress(client, db_session, internal_headers):
+    _seed(db_session, 7, 5)
+
+    response = client.post("/internal/users/7/purge", headers=internal_headers())
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    job = client.get(f"/internal/purges/{job_id}", headers=internal_headers()).json()
+    assert job["status"] == "done"
+    assert job["deleted"] == {"likes": 5, "comments": 5, "saved": 5, "follows": 6}
+    assert db_session.query(models.Like).count() == 1
+    assert client.get("/internal/purges/missing", headers=internal_headers()).status_code == 404
+
+
+def test_purge_cli_commits_in_chunks(db_session, capsys):
+    _seed(db_session, 8, 5)
+
+    main(["purge-user", "8", "--chunk-size", "2"])
+
+    output = capsys.readouterr().out
+    assert "likes=2" in output and "likes=4" in output and "likes=5" in output
+    job = db_session.query(models.PurgeJob).filter_by(user_id=8).one()
+    assert job.status == "done"
+    assert db_session.query(models.Comment).filter_by(user_id=8).count() == 0
+
+
+def test_abandoned_jobs_are_resumed_after_their_lease(db_session, caplog):
+    _seed(db_session, 9, 3)
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    db_session.add_all([
+        models.PurgeJob(job_id="abandoned", user_id=9, status="running", deleted='{"likes": 2}', updated_at=stale),
+        models.PurgeJob(job_id="live", user_id=10, status="running", deleted="{}"),
+    ])
+    db_session.commit()
+
+    assert purge.resume_stale_jobs(lease_seconds=60) == ["abandoned"]
+    db_session.expire_all()
+    job = purge.get_job(db_session, "abandoned")
+    assert job.status == "done"
+    assert json.loads(job.deleted)["likes"] == 5  # two from before the restart, three now
+    assert purge.get_job(db_session, "live").status == "running"
+    assert purge.claim_stale_jobs(lease_seconds=60) == []
+
+    purge.run_job_in_background("missing")
+    assert "Purge job missing failed" in caplog.text
+
+
+def test_purge_keeps_other_users_replies_under_tombstones(client, db_session, upstream, auth_headers, internal_headers):
+    def post(content, user_id, parent_id=None):
+        payload = {"content": content, **({"parent_id": parent_id} if parent_id else {})}
+        return client.post("/comments/10", json=payload, headers=auth_headers(user_id)).json()["comment_id"]
+
+    root = post("root", 7)
+    own_reply = post("own", 7, root)
+    theirs = post("theirs", 8, root)
+    leaf = post("leaf", 7)
+    nested = post("nested", 7, theirs)
+
+    assert client.post("/internal/users/7/purge", headers=internal_headers()).status_code == 202
+
+    remaining = {c.comment_id: c for c in db_session.query(models.Comment)}
+    assert set(remaining) == {root, theirs}
+    assert remaining[root].content == "" and remaining[root].deleted_at is not None
+    assert own_reply not in remaining and leaf not in remaining and nested not in remaining
+    thread = client.get("/comments/recipe/10/threads").json()["threads"]
+    assert [t["comment_id"] for t in thread] == [root]
+    assert [r["comment_id"] for r in thread[0]["replies"]] == [theirs]
+    assert client.get("/comments/count/10").json()["comment_count"] == 1
+    assert sum(r.comments for r in db_session.query(models.EngagementRollup)) == 1